@@ -5,6 +5,7 @@ from fastapi import APIRouter, Response, Query
 from pydantic import BaseModel
 
 from bdd.Analytics import ANALYTICS
+from utils.executors import run_in, sql_executor
 
 router = APIRouter(
     prefix="/analytics",
@@ -20,14 +21,16 @@ p = ANALYTICS()
 
 
 @router.get("/")
-async def applications_get(
+@run_in(sql_executor)
+def applications_get(
         Name: List[str] = Query(default=[])):
     return Response(p.get_applications(Name).to_json(orient="records", date_format="iso"),
                     media_type="application/json")
 
 
 @router.post("/count", include_in_schema=False)
-async def applications_count(
+@run_in(sql_executor)
+def applications_count(
         identifier: str = Query(),
         title: str = Query(),
         version: str = Query(),
@@ -40,7 +43,8 @@ async def applications_count(
 
 
 @router.get("/isValidPassword", include_in_schema=False)
-async def isValidPassword(
+@run_in(sql_executor)
+def isValidPassword(
         UserName: str = Query(),
         PasswordHash: str = Query()):
     r = p.isValidPassword(UserName, PasswordHash)
@@ -50,7 +54,8 @@ async def isValidPassword(
 
 
 @router.get("/getUserType", include_in_schema=False)
-async def getUserType(
+@run_in(sql_executor)
+def getUserType(
         UserName: str = Query(),
         Application: str = Query()):
     r = p.getUserType(UserName, Application)
@@ -338,7 +338,7 @@ class CATANA(BASEBDD):
         select = list()
         self._select(select, t.RUNINFOVIEW, ['RunUID'])
         self._select(select, t.LAPINFO, [
-            'LapNumber', 'StartTime', 'Description'])
+            'LapNumber', 'StartTime', 'EndTime', 'Description'])
         self._select(select, t.LAPTYPE, ['NominalLap', 'Type'])
 
         query = self._create_query(select)
@@ -1,5 +1,6 @@
 from time import sleep
 import json
+import pandas as pd
 import yaml
 
 from cache.RedisInteractor import RedisInteractor
@@ -70,7 +71,9 @@ class CacheLiveData():
             if var in cached_data['non_cached_variables']:   # create new field
                 cached_lapdata = add_none_missing_laps({}, 0, lap_nb)
             else:   # load redis return 
-                cached_lapdata = json.loads(cached_data['cached_results'][i])
+                cached_table = cached_data['cached_results'][i]
+                cached_lapdata = {lap: {'0': values[0]} for lap, values
+                                  in cached_table.to_pydict().items()}
                 nb_cached_laps = len(cached_lapdata)
                 cached_lapdata = add_none_missing_laps(cached_lapdata, 
                                                        nb_cached_laps, 
@@ -88,7 +91,7 @@ class CacheLiveData():
 
 
         hash_ = run_uid + '+' + str(data_type)   # ok python 3.10 & 3.12
-        formatted_insert = [(hash_, var, json.dumps(lapdata[var]))
+        formatted_insert = [(hash_, var, pd.DataFrame(lapdata[var]))
                             for var in variables]
         
         inserted = self.redis.insert_ressource(formatted_insert, update=True)
@@ -96,4 +99,4 @@ class CacheLiveData():
         return inserted
         
 
-            
\ No newline at end of file
+            
\ No newline at end of file
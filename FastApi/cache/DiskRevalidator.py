@@ -0,0 +1,101 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+
+class DiskRevalidator:
+    """
+    Checks cached variables against the modification time of their parquet files.
+
+    The modification time of the file is stored with the cached variable when it is computed, and compared with
+    the current one: only the clock of the file server is involved. The files of a run directory are listed with a
+    single os.scandir, and a cached variable is checked at most once every interval seconds in the process: between
+    two checks, it is served as is. The checks older than the interval are forgotten, so that only the variables
+    checked during the last interval are kept in memory.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        # key -> time of the last check, from the oldest
+        self._last_checks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_enabled(self) -> bool:
+        """
+        Check if the cached variables are revalidated against the disk.
+
+        Returns:
+            bool: True if the interval is positive, False otherwise.
+        """
+        return self.interval > 0
+
+    def is_due(self, key: tuple) -> bool:
+        """
+        Check if a cached variable has to be checked, and if so marks it as checked now.
+
+        Args:
+            key (tuple): The (competition, data type, runuid, variable) key of the cached variable.
+
+        Returns:
+            bool: True if the last check of the variable is older than the interval, False otherwise.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last_check = self._last_checks.get(key)
+            if last_check is not None and now - last_check < self.interval:
+                return False
+            self._last_checks[key] = now
+            self._last_checks.move_to_end(key)
+            while self._last_checks and next(iter(self._last_checks.values())) <= now - self.interval:
+                self._last_checks.popitem(last=False)
+            return True
+
+    def expire(self, key: tuple):
+        """
+        Forgets the last check of a cached variable, so that the next is_due is True.
+
+        Args:
+            key (tuple): The (competition, data type, runuid, variable) key of the cached variable.
+        """
+        with self._lock:
+            self._last_checks.pop(key, None)
+
+    @staticmethod
+    def get_modified_times(directory: str) -> dict[str, float]:
+        """
+        Lists the modification times of the variable files of a run directory.
+
+        Args:
+            directory (str): The directory of the parquet files of a run and a data type.
+
+        Returns:
+            dict[str, float]: A dictionary mapping variables to the modification time of their file, empty if the
+            directory doesn't exist. The compacted files (starting with '_') are not variables.
+        """
+        modified_times = dict()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.parquet') and not entry.name.startswith('_'):
+                        modified_times[entry.name[:-len('.parquet')]] = entry.stat().st_mtime
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return modified_times
+
+    def get_stale_variables(self, directory: str, cached_times: dict[str, float | None]) -> list[str]:
+        """
+        Retrieves the variables whose parquet file was modified since they were cached.
+
+        Args:
+            directory (str): The directory of the parquet files of a run and a data type.
+            cached_times (dict[str, float | None]): A dictionary mapping the cached variables to the modification
+                time of their file when they were computed (their `_mtime`).
+
+        Returns:
+            list[str]: The variables to read again. A variable without `_mtime` is stale, a variable without
+            file is not.
+        """
+        modified_times = self.get_modified_times(directory)
+        return [variable for variable, cached_time in cached_times.items()
+                if variable in modified_times and modified_times[variable] != cached_time]
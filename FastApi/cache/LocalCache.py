@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import threading
+import time
+
+import pyarrow as pa
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache of decoded payloads, in front of Redis.
+
+    Entries are keyed on (competition, data type, runuid, variable) and keep the `_timestamp` of the Redis field
+    they were read from. An entry checked against Redis less than revalidate_interval seconds ago is served
+    directly, an older one has to be revalidated by comparing its timestamp with the one in Redis.
+    """
+
+    def __init__(self, max_bytes: int, revalidate_interval: float):
+        self.max_bytes = max_bytes
+        self.revalidate_interval = revalidate_interval
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_enabled(self) -> bool:
+        """
+        Check if the cache can hold entries.
+
+        Returns:
+            bool: True if the size limit is positive, False otherwise.
+        """
+        return self.max_bytes > 0
+
+    def get(self, key: tuple) -> tuple[pa.Table, int, bool] | None:
+        """
+        Retrieves an entry and marks it as recently used.
+
+        Args:
+            key (tuple): The (competition, data type, runuid, variable) key.
+
+        Returns:
+            tuple[pa.Table, int, bool] | None: The table, its Redis timestamp and whether it has to be revalidated,
+            or None if the key is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        table, timestamp, checked_at = entry
+        return table, timestamp, time.monotonic() - checked_at >= self.revalidate_interval
+
+    def put(self, key: tuple, table: pa.Table, timestamp: int | None):
+        """
+        Inserts or replaces an entry, then evicts the least recently used entries above the size limit.
+
+        Args:
+            key (tuple): The (competition, data type, runuid, variable) key.
+            table (pa.Table): The decoded payload.
+            timestamp (int | None): The `_timestamp` of the Redis field.
+        """
+        nbytes = table.nbytes
+        if nbytes > self.max_bytes:
+            self.invalidate(key)
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[0].nbytes
+            self._entries[key] = (table, timestamp, time.monotonic())
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def touch(self, key: tuple):
+        """
+        Marks an entry as revalidated now.
+
+        Args:
+            key (tuple): The (competition, data type, runuid, variable) key.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], entry[1], time.monotonic())
+
+    def invalidate(self, key: tuple):
+        """
+        Removes an entry if it exists.
+
+        Args:
+            key (tuple): The (competition, data type, runuid, variable) key.
+        """
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[0].nbytes
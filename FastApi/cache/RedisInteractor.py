@@ -1,15 +1,21 @@
 import os
+import threading
 import time
 from datetime import timedelta
 
+import pandas as pd
+import pyarrow as pa
 import redis
 import yaml
 
+from cache.payload_codec import decode_payload, encode_payload
 from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
-from utils import singleton
 
 ADD_TTL = timedelta(weeks=8)
 DEFAULT_TTL = timedelta(weeks=4)
+DEFAULT_MAX_CONNECTIONS = 50
+DEFAULT_HEALTH_CHECK_INTERVAL = 30   # seconds
+POOL_TIMEOUT = 10   # seconds waited for a free connection
 
 
 # Get the directory of the current script
@@ -22,12 +28,52 @@ with open(PATH_TO_CONF_FILE_MAPPING, 'r') as file:
     db_mapping = yaml.safe_load(file)
 
 
-class RedisInteractor(metaclass=singleton._Singleton):
+# one connection pool per (host, port, database) shared by the whole process
+_connection_pools = dict()
+_connection_pools_lock = threading.Lock()
 
-    def __init__(self, host, port, database):
+
+def get_connection_pool(host: str, port: int, database: int,
+                        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                        health_check_interval: int = DEFAULT_HEALTH_CHECK_INTERVAL) -> redis.BlockingConnectionPool:
+    """
+    Returns the connection pool of a Redis database, creates it on first use.
+
+    The pool is thread safe: when all the connections are checked out, a thread waits for one to be
+    released instead of opening a new one. Connections idle for more than health_check_interval seconds
+    are checked with a PING before being used.
+
+    Args:
+        host (str): The Redis host.
+        port (int): The Redis port.
+        database (int): The Redis database number.
+        max_connections (int, optional): The maximum number of connections of the pool.
+        health_check_interval (int, optional): The idle time in seconds after which a connection is checked.
+
+    Returns:
+        redis.BlockingConnectionPool: The connection pool shared by every RedisInteractor of this database.
+    """
+    key = (host, port, database)
+    with _connection_pools_lock:
+        if key not in _connection_pools:
+            _connection_pools[key] = redis.BlockingConnectionPool(
+                host=host, port=port, db=database,
+                max_connections=max_connections,
+                timeout=POOL_TIMEOUT,
+                health_check_interval=health_check_interval)
+        return _connection_pools[key]
+
+
+class RedisInteractor:
+
+    def __init__(self, host, port, database,
+                 max_connections=DEFAULT_MAX_CONNECTIONS,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL):
         self.host = host
         self.port = port
         self.database = db_mapping[database]
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
         self.isConnected = False
         self.insertion_success = 0
         self.insertion_error = 0
@@ -37,21 +83,27 @@ class RedisInteractor(metaclass=singleton._Singleton):
             """
             Connects to the Redis server.
 
+            The client uses the process-wide connection pool of the database, no TCP connection is opened
+            if a pooled connection is available.
+
             Returns:
                 bool: True if the connection is successful, False otherwise.
             """
-            self.connexion = redis.Redis(host=self.host, port=self.port, db=self.database, decode_responses=True)
+            pool = get_connection_pool(self.host, self.port, self.database,
+                                       self.max_connections, self.health_check_interval)
+            self.connexion = redis.Redis(connection_pool=pool)
             self.isConnected = True
             return self.is_connected()
 
     def close(self) -> bool:
         """
-        Closes the connection to the Redis server.
+        Closes the client. The pooled connections stay open for the other clients of the database.
 
         Returns:
             bool: True if the connection is successfully closed, False otherwise.
         """
-        self.isConnected = not (self.connexion.quit())
+        self.connexion.close()
+        self.isConnected = False
         return self.is_connected()
 
     def is_connected(self) -> bool:
@@ -63,32 +115,59 @@ class RedisInteractor(metaclass=singleton._Singleton):
             """
             return self.isConnected
 
-    def insert_ressource(self, ressources: list[str, str, str], update: bool = False) -> bool:
+    def insert_ressource(self, ressources: list[str, str, str], update: bool = False,
+                         timestamp: int | None = None,
+                         modified_times: dict[tuple[str, str], float] | None = None) -> bool:
         """
         Inserts a list of resources into Redis cache.
 
         Args:
             ressources (list[str, str, str]): A list of tuples containing the runuid, variable, and data for each resource.
+                The data is encoded as an Arrow IPC stream if it is a DataFrame or an Arrow table.
+                All the resources are written in a single pipeline.
             update (bool, optional): Specifies whether to update existing resources. Defaults to False.
+            timestamp (int, optional): The timestamp written in the `_timestamp` fields. Defaults to now.
+            modified_times (dict[tuple[str, str], float], optional): The modification time of the parquet file of
+                each (runuid, variable) when it was read, written in the `_mtime` fields. Defaults to None.
 
         Returns:
             bool: True if the resources were successfully inserted or updated, False otherwise.
         """
         if not self.is_connected(): return False
-        # get the current timestamp
-        counter = 0
-        ruuids = []
+        if not ressources: return True
+        # every field of a runuid and its timestamp are written with one HSET
+        timestamp = str(round(time.time()) if timestamp is None else timestamp)
+        mappings = dict()
         for runuid, variable, data in ressources:
-            variable_write = self.connexion.hset(name=runuid, key=variable, value=data)
-            timestamp_write = self.connexion.hset(name=runuid, key=f"{variable}_timestamp",
-                                                  value=str(round(time.time())))
-            counter += bool(variable_write) + bool(timestamp_write)
-            ruuids += [runuid]
+            mapping = mappings.setdefault(runuid, dict())
+            mapping[variable] = encode_payload(data)
+            mapping[f"{variable}_timestamp"] = timestamp
+            if modified_times and (runuid, variable) in modified_times:
+                mapping[f"{variable}_mtime"] = repr(modified_times[(runuid, variable)])
+
+        # all the runuids and their TTL are sent in a single pipeline
+        pipeline = self.connexion.pipeline(transaction=False)
+        for runuid, mapping in mappings.items():
+            pipeline.hset(name=runuid, mapping=mapping)
+            pipeline.expire(runuid, time=DEFAULT_TTL)
+        replies = pipeline.execute()
+
+        # HSET returns the number of new fields (variable, timestamp and modification time)
+        counter = sum(replies[::2])
+        return True if update else counter == sum(len(mapping) for mapping in mappings.values())
+
+    def lock(self, name: str, timeout: float) -> redis.lock.Lock:
+        """
+        Returns a lock shared by every process using this database.
+
+        Args:
+            name (str): The key of the lock.
+            timeout (float): The time in seconds after which the lock expires if it is not released.
 
-        unique_runuids = set(ruuids)
-        for runuid in unique_runuids:
-            _ = self.connexion.expire(runuid, time=DEFAULT_TTL)
-        return True if update else (counter / 2) == len(ressources)
+        Returns:
+            redis.lock.Lock: The lock, not acquired yet.
+        """
+        return self.connexion.lock(name, timeout=timeout, sleep=0.05)
 
     def delete_ressources(self, list_elements: list[str]) -> bool:
         """
@@ -199,55 +278,180 @@ class RedisInteractor(metaclass=singleton._Singleton):
             update (bool, optional): If True, forces an update of the cached variables. Defaults to False.
 
         Returns:
-            dict: A dictionary containing the cached variables, cached results, and non-cached variables.
+            dict: A dictionary containing the cached variables, cached results (decoded as Arrow tables),
+            and non-cached variables.
 
         """
-        return_dict = {
-            "cached_variables": [],
-            "cached_results": [],
-            "non_cached_variables": []
-        }
-
-        id_ = self.__get_id_from_runuid(runuid, data_type)
-        # if runuid doesn't exist return dict in current state
-        if update or not self.connexion.exists(id_):
-            return_dict["non_cached_variables"] = variables.copy()
-            return return_dict
-        # update the ttl because the data is being used
-        _ = self.connexion.expire(id_, time=ADD_TTL)
-        # request redis for variables of runuid
-        results = self.connexion.hmget(name=id_, keys=variables)
-        # update return dict based on retrieved values
-        for var_name, var_result in zip(variables, results):
-            if var_result == None:
-                return_dict["non_cached_variables"] += [var_name]
-            else:
-                return_dict["cached_variables"] += [var_name]
-                return_dict["cached_results"] += [var_result]
-                
-        return return_dict
+        return self.get_cached_variable_from_multiple_runuid(data_type, {runuid: variables}, update)[runuid]
 
     def get_cached_variable_from_multiple_runuid(self, data_type: CatanaDataTypeEnum, dict_runUID: dict[str, list[str]], update: bool = False) -> dict:
         """
         Retrieves cached variables from multiple runuids.
 
+        All the runuids are requested in a single pipeline: one round trip to Redis whatever the number of runs.
+        The TTL of every existing runuid is extended because the data is being used, the return value of
+        EXPIRE tells if the runuid exists.
+
         Args:
             data_type (CatanaDataTypeEnum): The data type of the variables to retrieve.
             dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to lists of variables.
             update (bool, optional): Whether to update the cached variables. Defaults to False.
 
         Returns:
-            dict: A dictionary mapping runuids to the cached variables.
+            dict: A dictionary mapping runuids to the cached variables, cached results (decoded as Arrow tables),
+            their `_timestamp` and non-cached variables.
         """
-        return_dict = dict()
+        return_dict = {runuid: {"cached_variables": [],
+                                "cached_results": [],
+                                "cached_timestamps": [],
+                                "non_cached_variables": []} for runuid in dict_runUID}
+        # if update, nothing is read from the cache
+        if update:
+            for runuid, variables in dict_runUID.items():
+                return_dict[runuid]["non_cached_variables"] = variables.copy()
+            return return_dict
+
+        requested = {runuid: variables for runuid, variables in dict_runUID.items() if variables}
+        pipeline = self.connexion.pipeline(transaction=False)
+        for runuid, variables in requested.items():
+            id_ = self.__get_id_from_runuid(runuid, data_type)
+            pipeline.expire(id_, time=ADD_TTL)
+            pipeline.hmget(name=id_, keys=variables + [f"{var}_timestamp" for var in variables])
+        replies = pipeline.execute()
+
+        for (runuid, variables), exists, results in zip(requested.items(), replies[::2], replies[1::2]):
+            # if runuid doesn't exist all the variables need to be computed
+            if not exists:
+                return_dict[runuid]["non_cached_variables"] = variables.copy()
+                continue
+            # update return dict based on retrieved values
+            timestamps = results[len(variables):]
+            for var_name, var_result, var_timestamp in zip(variables, results, timestamps):
+                if var_result is None:
+                    return_dict[runuid]["non_cached_variables"] += [var_name]
+                else:
+                    return_dict[runuid]["cached_variables"] += [var_name]
+                    return_dict[runuid]["cached_results"] += [decode_payload(var_result)]
+                    return_dict[runuid]["cached_timestamps"] += [self.__parse_timestamp(var_timestamp)]
+
+        return return_dict
+
+    def get_timestamps_from_multiple_runuid(self, data_type: CatanaDataTypeEnum,
+                                            dict_runUID: dict[str, list[str]]) -> dict[str, dict[str, int]]:
+        """
+        Retrieves the `_timestamp` fields of the variables of multiple runuids in a single pipeline,
+        without transferring the payloads.
+
+        Args:
+            data_type (CatanaDataTypeEnum): The data type of the variables.
+            dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to lists of variables.
+
+        Returns:
+            dict[str, dict[str, int]]: A dictionary mapping runuids to their variables and timestamps.
+            The timestamp is None if the variable is not cached.
+        """
+        return self.__get_fields_from_multiple_runuid(data_type, dict_runUID, "_timestamp",
+                                                     self.__parse_timestamp)
+
+    def get_modified_times_from_multiple_runuid(self, data_type: CatanaDataTypeEnum,
+                                                dict_runUID: dict[str, list[str]]) -> dict[str, dict[str, float]]:
+        """
+        Retrieves the `_mtime` fields of the variables of multiple runuids in a single pipeline: the modification
+        time of the parquet file of each variable when it was cached.
+
+        Args:
+            data_type (CatanaDataTypeEnum): The data type of the variables.
+            dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to lists of variables.
+
+        Returns:
+            dict[str, dict[str, float]]: A dictionary mapping runuids to their variables and modification times.
+            The modification time is None if the variable is not cached or was cached without it.
+        """
+        return self.__get_fields_from_multiple_runuid(data_type, dict_runUID, "_mtime",
+                                                     lambda mtime: None if mtime is None else float(mtime))
+
+    def __get_fields_from_multiple_runuid(self, data_type: CatanaDataTypeEnum, dict_runUID: dict[str, list[str]],
+                                          suffix: str, parse) -> dict[str, dict]:
+        """
+        Retrieves a metadata field of the variables of multiple runuids in a single pipeline.
+
+        Args:
+            data_type (CatanaDataTypeEnum): The data type of the variables.
+            dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to lists of variables.
+            suffix (str): The suffix of the fields, after the variable.
+            parse: The function converting a raw field, None if the field doesn't exist.
 
-        for runuid in dict_runUID:
-            variables = dict_runUID[runuid]
-            cashed_result = self.get_cached_variable_from_runuid(data_type, runuid, variables, update)
-            return_dict[runuid] = cashed_result
+        Returns:
+            dict[str, dict]: A dictionary mapping runuids to their variables and parsed fields.
+        """
+        requested = {runuid: variables for runuid, variables in dict_runUID.items() if variables}
+        pipeline = self.connexion.pipeline(transaction=False)
+        for runuid, variables in requested.items():
+            id_ = self.__get_id_from_runuid(runuid, data_type)
+            pipeline.hmget(name=id_, keys=[f"{var}{suffix}" for var in variables])
+        replies = pipeline.execute()
 
+        return_dict = {runuid: dict() for runuid in dict_runUID}
+        for (runuid, variables), fields in zip(requested.items(), replies):
+            return_dict[runuid] = {var: parse(field) for var, field in zip(variables, fields)}
         return return_dict
 
+    def get_aggregates(self, ids: list[str]) -> list[tuple[pa.Table | None, str | None]]:
+        """
+        Retrieves aggregated results and their fingerprint in a single pipeline.
+
+        The TTL of every existing aggregate is extended because it is being used.
+
+        Args:
+            ids (list[str]): The keys of the aggregates.
+
+        Returns:
+            list[tuple[pa.Table | None, str | None]]: The decoded result (None if the aggregate had no data) and the
+            fingerprint of each aggregate, in the same order. The fingerprint is None if the aggregate is not cached.
+        """
+        pipeline = self.connexion.pipeline(transaction=False)
+        for id_ in ids:
+            pipeline.expire(id_, time=ADD_TTL)
+            pipeline.hmget(name=id_, keys=["data", "fingerprint"])
+        replies = pipeline.execute()
+
+        return [(decode_payload(data) if data else None, None if fingerprint is None else fingerprint.decode())
+                for data, fingerprint in replies[1::2]]
+
+    def insert_aggregates(self, ressources: list[tuple[str, pd.DataFrame | None, str]]) -> bool:
+        """
+        Inserts aggregated results in a single pipeline.
+
+        Args:
+            ressources (list[tuple[str, pd.DataFrame | None, str]]): A list of tuples containing the key, the result
+                (None if there is no data) and the fingerprint of each aggregate.
+
+        Returns:
+            bool: True if the aggregates were inserted, False otherwise.
+        """
+        if not self.is_connected(): return False
+        if not ressources: return True
+        pipeline = self.connexion.pipeline(transaction=False)
+        for id_, data, fingerprint in ressources:
+            pipeline.hset(name=id_, mapping={"data": b"" if data is None else encode_payload(data),
+                                             "fingerprint": fingerprint})
+            pipeline.expire(id_, time=DEFAULT_TTL)
+        pipeline.execute()
+        return True
+
+    @staticmethod
+    def __parse_timestamp(timestamp: bytes | None) -> int | None:
+        """
+        Converts a `_timestamp` field read from Redis.
+
+        Args:
+            timestamp (bytes | None): The raw field.
+
+        Returns:
+            int | None: The timestamp, or None if the field doesn't exist.
+        """
+        return None if timestamp is None else int(timestamp)
+
     def get_last_modified(self, runuid: str, variables: list[str], data_type: CatanaDataTypeEnum) -> dict[str, int]:
             """
             Retrieves the last modified dates for the specified variables.
@@ -0,0 +1,70 @@
+import threading
+
+
+class _Call:
+    """
+    A computation in flight and its outcome, shared by the threads waiting for it.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent computations within the process.
+
+    The first thread calling do with a key runs the computation, the threads calling do with the same key
+    while it runs wait for it and get the same result (or exception). Nothing is kept once the computation
+    has ended: a later call with the same key runs the computation again.
+    """
+
+    def __init__(self):
+        self._calls = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key: tuple, func) -> tuple[object, bool]:
+        """
+        Runs func, or waits for the computation in flight with the same key.
+
+        Args:
+            key (tuple): The key identifying the computation.
+            func: The function computing the result, without arguments.
+
+        Returns:
+            tuple[object, bool]: The result and whether it was computed by another thread.
+
+        Raises:
+            Exception: The exception raised by func, in every waiting thread.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        """
+        Returns the number of computations in flight.
+        """
+        with self._lock:
+            return len(self._calls)
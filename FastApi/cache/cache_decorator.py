@@ -1,9 +1,19 @@
+import copy
+import hashlib
+import json
 import os
 import time  # temporaire
 
+import pandas as pd
+import redis
 import yaml
 
-from cache.RedisInteractor import RedisInteractor, CatanaDataTypeEnum
+from cache.LocalCache import LocalCache
+from cache.RedisInteractor import (RedisInteractor, CatanaDataTypeEnum, DEFAULT_HEALTH_CHECK_INTERVAL,
+                                   DEFAULT_MAX_CONNECTIONS)
+from cache.SingleFlight import SingleFlight
+from cache.DiskRevalidator import DiskRevalidator
+from parquet.CatanaAggregationEnum import CatanaAggregationEnum
 
 # CONFIGURATION ##########################################################################################################################################
 
@@ -19,86 +29,322 @@ with open(PATH_TO_CONF_FILE, 'r') as file:
 redis_params = {
     "host": conf_file["host"],
     "port": conf_file["port"],
+    "max_connections": conf_file.get("max_connections", DEFAULT_MAX_CONNECTIONS),
+    "health_check_interval": conf_file.get("health_check_interval", DEFAULT_HEALTH_CHECK_INTERVAL),
 }
 # "database": conf_file["database"]
-mapping_data_type_to_path = {
-    CatanaDataTypeEnum.CDCDATA: "cdcdata",
-    CatanaDataTypeEnum.HISTO2D: "histo2ddata",
-    CatanaDataTypeEnum.HISTO: "histodata",
-    CatanaDataTypeEnum.LAPDATA: "lapdata",
-    CatanaDataTypeEnum.OTHER: "otherdata",
-    CatanaDataTypeEnum.RUNDATA: "rundata"
-}
+# in-process cache of decoded payloads, in front of Redis (0 bytes to disable it)
+local_cache = LocalCache(max_bytes=conf_file.get("local_cache_max_bytes", 0),
+                         revalidate_interval=conf_file.get("local_cache_revalidate_interval", 0))
+# identical requests missing the cache are computed once: within the process by single_flight, across the
+# workers by a Redis lock held while computing (expires after lock_timeout, waited at most lock_wait_timeout)
+single_flight = SingleFlight()
+lock_timeout = conf_file.get("single_flight_lock_timeout", 120)
+lock_wait_timeout = conf_file.get("single_flight_wait_timeout", 60)
+# cached variables are checked against the modification time of their parquet file, at most once every
+# disk_revalidation_interval seconds per variable (0 to disable it)
+disk_revalidator = DiskRevalidator(interval=conf_file.get("disk_revalidation_interval", 0))
+# aggregated results of the histogram types, invalidated when the `_timestamp` of a run they use changes
+aggregate_cache_enabled = conf_file.get("aggregate_cache", False)
 
 
 # FUNCTIONS ################################################################################################################################################
-def get_variable_tu_update(timestamps: dict, runuid: str, year: str, data_type: CatanaDataTypeEnum, path: str):
+def get_run_directory(instance, runuid: str, year: int, data_type: CatanaDataTypeEnum) -> str | None:
     """
-    Retrieves the variables that need to be updated based on their timestamps.
+    Returns the directory of the parquet files of a runuid for a data type.
 
     Args:
-        timestamps (dict): A dictionary containing the timestamps of the variables.
+        instance: The PARQUET object whose method is decorated.
         runuid (str): The unique identifier for the run.
-        year (str): The year of the data.
+        year (int): The year of the run.
         data_type (CatanaDataTypeEnum): The type of data.
-        path (str): The path to the data storage.
 
     Returns:
-        list: A list of variables that need to be updated.
-    """
-    path_header = path if path[-1] == "/" else path + "/"
-    variable_to_decache = []
-    for cache_variable in timestamps:
-        variable_timestamp = timestamps[cache_variable]
-        path_to_variable_parquet_storage = f"{path_header}{year}/{runuid}/computed_data/{mapping_data_type_to_path[data_type]}/{cache_variable}.parquet"
-        start_time = time.time()
-        last_modified_on_disk = os.path.getmtime(
-            path_to_variable_parquet_storage)
-        end_time = time.time()
-        print(
-            f"({runuid}, {variable_timestamp} -> timestamp={last_modified_on_disk} -> time_to_access={round(end_time - start_time, 5)}  path='{path_to_variable_parquet_storage}' ")
-        if last_modified_on_disk > variable_timestamp:
-            variable_to_decache.append(cache_variable)
-    return variable_to_decache
+        str | None: The directory, or None if the object doesn't read parquet files.
+    """
+    parquet_path = getattr(instance, "parquet_path", None)
+    folder = getattr(instance, "folder_datatype", dict()).get(data_type)
+    if parquet_path is None or folder is None:
+        return None
+    return f"{parquet_path}{year}/{runuid}/{folder}"
+
+
+def get_modified_times(instance, dict_runUID: dict[str, list[str]], years: list,
+                       data_type: CatanaDataTypeEnum) -> dict[str, dict[str, float]]:
+    """
+    Lists the modification times of the parquet files of the variables of runuids, one os.scandir per runuid.
+
+    Args:
+        instance: The PARQUET object whose method is decorated.
+        dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to lists of variables.
+        years (list): The years of the runuids, in the same order.
+        data_type (CatanaDataTypeEnum): The type of data.
+
+    Returns:
+        dict[str, dict[str, float]]: The modification time of the file of each runuid and variable, without the
+        variables that have no file.
+    """
+    modified_times = dict()
+    for (runuid, variables), year in zip(dict_runUID.items(), years):
+        directory = get_run_directory(instance, runuid, year, data_type)
+        files = disk_revalidator.get_modified_times(directory) if directory is not None else dict()
+        modified_times[runuid] = {variable: files[variable] for variable in variables if variable in files}
+    return modified_times
 
 
-def update_variable_to_check(redis_return_dict: dict, runuid: str, year: str, data_type: CatanaDataTypeEnum,
-                             db_interactor: RedisInteractor, path: str):
+def get_variable_tu_update(db_interactor: RedisInteractor, competition: str, data_type: CatanaDataTypeEnum,
+                           dict_runUID: dict[str, list[str]], years: list, instance) -> dict[str, list[str]]:
     """
-    Update the variables to check in the cache.
+    Retrieves the cached variables whose parquet file changed since they were computed.
+
+    Each variable is checked at most once per revalidation interval. The `_mtime` fields of the variables due are
+    read with a single pipeline, and the files of each run directory are listed with a single os.scandir.
+
+    Args:
+        db_interactor (RedisInteractor): An object for interacting with the database.
+        competition (str): The competition of the runuids.
+        data_type (CatanaDataTypeEnum): The type of data.
+        dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to their cached variables.
+        years (list): The years of the runuids, in the same order.
+        instance: The PARQUET object whose method is decorated.
+
+    Returns:
+        dict[str, list[str]]: The variables that need to be updated, by runuid.
+    """
+    directories, due = dict(), dict()
+    for (runuid, variables), year in zip(dict_runUID.items(), years):
+        directory = get_run_directory(instance, runuid, year, data_type)
+        if directory is None:
+            continue
+        variables = [variable for variable in variables
+                     if disk_revalidator.is_due((competition, data_type, runuid, variable))]
+        if variables:
+            directories[runuid], due[runuid] = directory, variables
+    if not due:
+        return dict()
+
+    cached_times = db_interactor.get_modified_times_from_multiple_runuid(data_type, due)
+    stale = {runuid: disk_revalidator.get_stale_variables(directory, cached_times[runuid])
+             for runuid, directory in directories.items()}
+    return {runuid: variables for runuid, variables in stale.items() if variables}
+
+
+def update_variable_to_check(redis_return_dict: dict, runuid: str, variable_to_decache: list[str]) -> list[str]:
+    """
+    Moves cached variables whose parquet file changed to the variables to compute.
 
     Args:
         redis_return_dict (dict): A dictionary containing the cached variables.
         runuid (str): The unique identifier for the current run.
-        year (str): The year for which the variables are being updated.
-        data_type (CatanaDataTypeEnum): The type of data being updated.
-        db_interactor (RedisInteractor): An object for interacting with the database.
-        path (str): The path to the variables.
+        variable_to_decache (list[str]): The cached variables to compute again.
 
     Returns:
         list: A list of variables that were updated.
-
     """
-    # interact with the database to get the list of variables with their timestamp
-    local_variables = redis_return_dict[runuid]["cached_variables"]
-    variables_timestamp = db_interactor.get_last_modified(
-        runuid=runuid, variables=local_variables, data_type=data_type)
-    variable_to_decache = get_variable_tu_update(
-        variables_timestamp, runuid, year, data_type, path)
+    redis_runuid = redis_return_dict[runuid]
     if variable_to_decache == []:
         return variable_to_decache
     # remove the variable from the cache
-    redis_return_dict[runuid]["cached_variables"] = [x for x in redis_return_dict[runuid]["cached_variables"] if
-                                                     x not in variable_to_decache]
-    redis_return_dict[runuid]["non_cached_variables"] += variable_to_decache
+    kept = [i for i, x in enumerate(redis_runuid["cached_variables"]) if x not in variable_to_decache]
+    for field in ("cached_variables", "cached_results", "cached_timestamps"):
+        redis_runuid[field] = [redis_runuid[field][i] for i in kept]
+    redis_runuid["non_cached_variables"] += variable_to_decache
     return variable_to_decache
 
 
+def get_local_cached_variables(db_interactor: RedisInteractor, competition: str, data_type: CatanaDataTypeEnum,
+                               dict_runUID: dict[str, list[str]]) -> tuple[dict, dict]:
+    """
+    Looks up the requested variables in the in-process cache.
+
+    Entries checked against Redis recently are served directly. The others are revalidated with a single
+    pipeline that only reads their `_timestamp` fields: if the timestamp in Redis changed, the entry is dropped.
+
+    Args:
+        db_interactor (RedisInteractor): An object for interacting with the database.
+        competition (str): The competition of the runuids.
+        data_type (CatanaDataTypeEnum): The type of data being retrieved.
+        dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to lists of variables.
+
+    Returns:
+        tuple[dict, dict]: The (table, timestamp) found for each runuid and variable, and the runuids with the
+        variables still to be read from Redis.
+    """
+    local_results = {runuid: dict() for runuid in dict_runUID}
+    to_revalidate = {runuid: dict() for runuid in dict_runUID}
+    remaining = {runuid: [] for runuid in dict_runUID}
+    for runuid, variables in dict_runUID.items():
+        for variable in variables:
+            entry = local_cache.get((competition, data_type, runuid, variable))
+            if entry is None:
+                remaining[runuid].append(variable)
+            elif entry[2]:
+                to_revalidate[runuid][variable] = entry
+            else:
+                local_results[runuid][variable] = entry[:2]
+
+    if any(to_revalidate.values()):
+        timestamps = db_interactor.get_timestamps_from_multiple_runuid(
+            data_type, {runuid: list(entries) for runuid, entries in to_revalidate.items()})
+        for runuid, entries in to_revalidate.items():
+            for variable, (table, timestamp, _) in entries.items():
+                key = (competition, data_type, runuid, variable)
+                if timestamps[runuid].get(variable) == timestamp:
+                    local_cache.touch(key)
+                    local_results[runuid][variable] = (table, timestamp)
+                else:
+                    local_cache.invalidate(key)
+                    remaining[runuid].append(variable)
+
+    return local_results, remaining
+
+
+def get_lock_name(data_type: CatanaDataTypeEnum, dict_runUID: dict[str, list[str]], update: bool) -> str:
+    """
+    Returns the name of the Redis lock of a computation.
+
+    Args:
+        data_type (CatanaDataTypeEnum): The type of data being computed.
+        dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to lists of variables.
+        update (bool): Whether the cache is being updated.
+
+    Returns:
+        str: The lock name, the same for the same runuids and variables in any order.
+    """
+    content = json.dumps([update, sorted((runuid, sorted(variables)) for runuid, variables in dict_runUID.items())])
+    return f"lock+{data_type}+{hashlib.sha1(content.encode()).hexdigest()}"
+
+
+def compute_non_cached_variables(func, args: tuple, db_interactor: RedisInteractor, competition: str,
+                                 data_type: CatanaDataTypeEnum, dict_runUID: dict[str, list[str]], years: list,
+                                 update: bool) -> list[tuple]:
+    """
+    Computes the variables missing from the cache and writes them to Redis.
+
+    The computation holds a Redis lock: when another worker is already computing the same variables, it
+    waits for it and reads the variables it wrote from Redis, then only computes what is still missing.
+
+    Args:
+        func: The decorated function.
+        args (tuple): The positional arguments of the decorated function.
+        db_interactor (RedisInteractor): An object for interacting with the database.
+        competition (str): The competition of the runuids.
+        data_type (CatanaDataTypeEnum): The type of data being computed.
+        dict_runUID (dict[str, list[str]]): A dictionary mapping runuids to the variables to compute.
+        years (list): The years of the runuids, in the same order.
+        update (bool): Whether the cache is being updated.
+
+    Returns:
+        list[tuple]: A list of (runuid, variable, data, timestamp).
+    """
+    output = []
+    lock = db_interactor.lock(get_lock_name(data_type, dict_runUID, update), timeout=lock_timeout)
+    acquired = lock.acquire(blocking=False)
+    if not acquired:
+        acquired = lock.acquire(blocking=True, blocking_timeout=lock_wait_timeout)
+        if not update:
+            redis_return_dict = db_interactor.get_cached_variable_from_multiple_runuid(
+                data_type=data_type, dict_runUID=dict_runUID)
+            remaining, remaining_years = dict(), []
+            for runuid, year in zip(dict_runUID, years):
+                redis_runuid = redis_return_dict[runuid]
+                output += [(runuid, variable, data, timestamp) for variable, data, timestamp in
+                           zip(redis_runuid["cached_variables"], redis_runuid["cached_results"],
+                               redis_runuid["cached_timestamps"])]
+                if redis_runuid["non_cached_variables"]:
+                    remaining[runuid] = redis_runuid["non_cached_variables"]
+                    remaining_years.append(year)
+            dict_runUID, years = remaining, remaining_years
+
+    try:
+        if dict_runUID:
+            local_parameters = {
+                "data_type": data_type,
+                'dict_runUID': dict_runUID,
+                "years": years,
+                "update": update,
+                "competition": competition
+            }
+            # listed before reading: a file written during the read is read again at the next check
+            file_times = dict()
+            if disk_revalidator.is_enabled() and args:
+                file_times = get_modified_times(args[0], dict_runUID, years, data_type)
+            # retrieve the data by calling the function
+            computed_data = func(*args, **local_parameters)
+
+            # format the computed data to a list of tuple (runuid+datatype, variable, variable_data)
+            formatted_output = db_interactor.format_get_data_response(computed_data, data_type)
+
+            # write the computed data to the database if needed, with the modification time of the files read
+            insertion_timestamp = round(time.time())
+            if computed_data:
+                modified_times = dict()
+                for id_, variable, _ in formatted_output:
+                    file_time = file_times.get(db_interactor.get_runuid_from_id(id_), dict()).get(variable)
+                    if file_time is not None:
+                        modified_times[(id_, variable)] = file_time
+                all_inserted = db_interactor.insert_ressource(formatted_output, timestamp=insertion_timestamp,
+                                                              modified_times=modified_times)
+            output += [(db_interactor.get_runuid_from_id(id_), variable, data, insertion_timestamp)
+                       for id_, variable, data in formatted_output]
+    finally:
+        if acquired:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                pass   # expired during a long computation
+    return output
+
+
+def get_aggregate_id(data_type: CatanaDataTypeEnum, runuids: list[str], variable: str,
+                     aggregations: list[CatanaAggregationEnum], laps: dict[str, list[int]] | None = None) -> str:
+    """
+    Returns the Redis key of an aggregated result.
+
+    Args:
+        data_type (CatanaDataTypeEnum): The type of data aggregated.
+        runuids (list[str]): The runuids aggregated, without duplicates, in the order of the request.
+        variable (str): The variable aggregated.
+        aggregations (list[CatanaAggregationEnum]): The aggregation functions, in the order of the columns.
+        laps (dict[str, list[int]] | None): The laps selected for each runuid, or None for every lap.
+
+    Returns:
+        str: The key, a hash of the parameters.
+    """
+    parameters = [runuids, variable, [a.value for a in aggregations]]
+    if laps is not None:
+        parameters.append({runuid: sorted(laps[runuid]) for runuid in runuids if runuid in laps})
+    content = json.dumps(parameters, sort_keys=True)
+    return f"agg+{data_type}+{hashlib.sha1(content.encode()).hexdigest()}"
+
+
+def get_aggregate_fingerprint(timestamps: dict[str, dict[str, int | None]], runuids: list[str],
+                              fields: list[str]) -> str | None:
+    """
+    Returns the fingerprint of the run data an aggregated result is computed from.
+
+    Args:
+        timestamps (dict[str, dict[str, int | None]]): The `_timestamp` of the fields of each runuid.
+        runuids (list[str]): The runuids aggregated, without duplicates, in the order of the request.
+        fields (list[str]): The variable and its axes.
+
+    Returns:
+        str | None: A hash of the timestamps, or None if a field is not cached.
+    """
+    values = [timestamps[runuid].get(field) for runuid in runuids for field in fields]
+    if None in values:
+        return None
+    return hashlib.sha1(json.dumps(values).encode()).hexdigest()
+
+
 # DECORATOR ################################################################################################################################################
 def rediscache(func):
     """
     A decorator function that caches the results of a function using Redis.
 
+    Decoded payloads are also kept in a bounded in-process cache, so repeated hits on the same runs skip
+    both the network and the decoding.
+
     Args:
         func: The function to be decorated.
 
@@ -125,9 +371,8 @@ def rediscache(func):
         if not list_of_runuids or not variables_of_runuids[list_of_runuids[0]]:
             return dict()
 
-        db_params = redis_params
-        db_params["database"] = "Catana" + kwargs["competition"]
-        # create an object to interact with Redis and connect to Redis
+        db_params = {**redis_params, "database": "Catana" + kwargs["competition"]}
+        # create an object to interact with Redis and connect to Redis (uses the pool of the database)
         db_interactor = RedisInteractor(**db_params)
         connected = db_interactor.connect()
 
@@ -136,18 +381,46 @@ def rediscache(func):
             raise Exception("Database connection error")
 
         # if connected, get known info from cache
+        competition = kwargs["competition"]
         data_type = kwargs["data_type"]
         years_of_runuids = kwargs["years"]
 
         # check if we need to update the cache
         update = kwargs["update"] if "update" in kwargs else False
 
+        # first look in the in-process cache, then in Redis for the remaining variables
+        local_results = {runuid: dict() for runuid in kwargs["dict_runUID"]}
+        dict_runUID_to_read = kwargs["dict_runUID"]
+        if local_cache.is_enabled() and not update:
+            local_results, dict_runUID_to_read = get_local_cached_variables(
+                db_interactor, competition, data_type, kwargs["dict_runUID"])
+
         redis_return_dict = db_interactor.get_cached_variable_from_multiple_runuid(
             data_type=data_type,
-            dict_runUID=kwargs["dict_runUID"],
+            dict_runUID=dict_runUID_to_read,
             update=update
         )
 
+        for runuid, redis_runuid in redis_return_dict.items():
+            if local_cache.is_enabled():
+                for variable, data, timestamp in zip(redis_runuid["cached_variables"],
+                                                     redis_runuid["cached_results"],
+                                                     redis_runuid["cached_timestamps"]):
+                    local_cache.put((competition, data_type, runuid, variable), data, timestamp)
+            redis_runuid["cached_variables"] += list(local_results[runuid].keys())
+            redis_runuid["cached_results"] += [table for table, _ in local_results[runuid].values()]
+            redis_runuid["cached_timestamps"] += [timestamp for _, timestamp in local_results[runuid].values()]
+
+        # read again the variables whose parquet file changed since they were cached
+        if disk_revalidator.is_enabled() and not update and args:
+            stale = get_variable_tu_update(
+                db_interactor, competition, data_type,
+                {runuid: redis_runuid["cached_variables"] for runuid, redis_runuid in redis_return_dict.items()},
+                years_of_runuids, args[0])
+            for runuid, variables in stale.items():
+                for variable in update_variable_to_check(redis_return_dict, runuid, variables):
+                    local_cache.invalidate((competition, data_type, runuid, variable))
+
         # get the missing variables for each runuid
         updated_dict_runUID = dict()
         updated_years = []
@@ -158,35 +431,108 @@ def rediscache(func):
             updated_dict_runUID[runuid] = redis_return_dict[runuid]["non_cached_variables"]
             updated_years.append(y_runuid)
 
-        local_parameters = {
-            "data_type": kwargs["data_type"],
-            'dict_runUID': updated_dict_runUID,
-            "years": updated_years,
-            "update": update,
-            "competition": kwargs["competition"]
-        }
-
-        # retrieve the data by calling the function
-        computed_data = func(*args, **local_parameters)
-
-        # format the computed data to a list of tuple (runuid+datatype, variable, variable_data)
-        formatted_output = db_interactor.format_get_data_response(computed_data, kwargs["data_type"])
-
-        # write the computed data to the database if needed
-        if computed_data:
-            all_inserted = db_interactor.insert_ressource(formatted_output)
+        # identical concurrent requests wait for the same computation
+        computed_output = []
+        if updated_dict_runUID:
+            flight_key = (competition, data_type, update,
+                          tuple((runuid, tuple(sorted(variables))) for runuid, variables in updated_dict_runUID.items()))
+            computed_output, _ = single_flight.do(flight_key, lambda: compute_non_cached_variables(
+                func, args, db_interactor, competition, data_type, updated_dict_runUID, updated_years, update))
 
         # update Redis dict to add the new computed && cached variable
-        for id_, variable, data in formatted_output:
-            runuid_extracted = db_interactor.get_runuid_from_id(id_)
+        for runuid_extracted, variable, data, timestamp in computed_output:
             redis_return_dict[runuid_extracted]["cached_variables"] += [variable]
             redis_return_dict[runuid_extracted]["cached_results"] += [data]
             redis_return_dict[runuid_extracted]["non_cached_variables"] = [x for x in
                                                                            redis_return_dict[runuid_extracted][
                                                                                "non_cached_variables"] if x != variable]
+            if local_cache.is_enabled():
+                local_cache.put((competition, data_type, runuid_extracted, variable), data, timestamp)
 
         # reformat the dict with all cached and computed to the corresponding format based on the data_type
         final_output = db_interactor.prepare_get_data_output(redis_return_dict)
         return final_output
 
     return wrapper
+
+
+def aggregatecache(func):
+    """
+    A decorator caching the aggregated results of process_data in Redis, for the histogram types.
+
+    Each variable is cached under a hash of the data type, the runuids in the order of the request, the variable and
+    the aggregation functions (FIRST, LAST and the floating-point sums depend on the order of the runs), with a fingerprint of the `_timestamp` of the run data it was computed from: the result is served
+    as long as the cached runs didn't change. The cached run data is first checked against its parquet files like
+    in rediscache: a variable whose files changed is computed again, which reads them again. Only the variables
+    missing from the cache are computed. Requests updating the cache or without aggregation are not cached.
+
+    Args:
+        func: The process_data method to be decorated, of a class defining axis_suffixes.
+
+    Returns:
+        The decorated function.
+    """
+
+    def wrapper(self, update: bool, agg: list[CatanaAggregationEnum] | CatanaAggregationEnum = None):
+        aggregations = agg if isinstance(agg, list) else [agg]
+        if not aggregate_cache_enabled or update or not agg or CatanaAggregationEnum.NONE in aggregations:
+            return func(self, update, agg)
+
+        db_interactor = RedisInteractor(**redis_params, database="Catana" + self.competition)
+        if not db_interactor.connect():
+            raise Exception("Database connection error")
+
+        runuids = list(dict.fromkeys(self.run_uid))
+        fields = {var: [var] + [var + suffix for suffix in self.axis_suffixes] for var in self.variables}
+        all_fields = [field for var_fields in fields.values() for field in var_fields]
+
+        def get_fingerprints(variables: list[str]) -> dict[str, str | None]:
+            timestamps = db_interactor.get_timestamps_from_multiple_runuid(
+                self.data_type, {runuid: all_fields for runuid in runuids})
+            return {var: get_aggregate_fingerprint(timestamps, runuids, fields[var]) for var in variables}
+
+        fingerprints = get_fingerprints(self.variables)
+        # the variables computed from run data whose parquet files changed are not served from the cache
+        if disk_revalidator.is_enabled():
+            years = dict(zip(self.run_uid, self.years))
+            stale = get_variable_tu_update(db_interactor, self.competition, self.data_type,
+                                           {runuid: all_fields for runuid in runuids},
+                                           [years[runuid] for runuid in runuids], self)
+            stale_fields = set()
+            for runuid, variables in stale.items():
+                for field in variables:
+                    # checked again, and read again, by rediscache during the computation
+                    disk_revalidator.expire((self.competition, self.data_type, runuid, field))
+                    stale_fields.add(field)
+            fingerprints.update({var: None for var in self.variables if stale_fields.intersection(fields[var])})
+        ids = {var: get_aggregate_id(self.data_type, runuids, var, aggregations, self.laps)
+               for var in self.variables}
+        cached = dict()
+        for var, (table, fingerprint) in zip(self.variables, db_interactor.get_aggregates(list(ids.values()))):
+            if fingerprint is not None and fingerprint == fingerprints[var]:
+                cached[var] = table
+
+        missing = [var for var in self.variables if var not in cached]
+        computed = dict()
+        if missing:
+            instance = copy.copy(self)
+            instance.variables = missing
+            computed = func(instance, update, agg)
+            # runs read for the first time have no fingerprint before the computation
+            if any(fingerprints[var] is None for var in missing):
+                fingerprints.update({var: fingerprint for var, fingerprint in get_fingerprints(missing).items()
+                                     if fingerprints[var] is None})
+            db_interactor.insert_aggregates([
+                (ids[var], computed.get(var), fingerprints[var]) for var in missing
+                if fingerprints[var] is not None
+                and all(isinstance(column, str) for column in computed.get(var, pd.DataFrame()).columns)])
+
+        result = dict()
+        for var in self.variables:
+            if var in computed:
+                result[var] = computed[var]
+            elif cached.get(var) is not None:
+                result[var] = cached[var].to_pandas()
+        return result
+
+    return wrapper
@@ -0,0 +1,65 @@
+import json
+
+import pandas as pd
+import pyarrow as pa
+
+# Every Arrow IPC stream starts with the continuation marker, a JSON
+# payload (written before the binary format) always starts with '{'.
+IPC_CONTINUATION = b'\xff\xff\xff\xff'
+
+
+def to_table(data: pd.DataFrame | pa.Table) -> pa.Table:
+    """
+    Converts the data read from a parquet file to an Arrow table.
+
+    Args:
+        data (pd.DataFrame | pa.Table): The data to convert.
+
+    Returns:
+        pa.Table: The data as an Arrow table, without the pandas index.
+    """
+    if isinstance(data, pa.Table):
+        return data
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    # the pandas metadata is often bigger than the data itself
+    return table.replace_schema_metadata(None)
+
+
+def encode_payload(data: pd.DataFrame | pa.Table | bytes | str) -> bytes | str:
+    """
+    Encodes a payload before writing it to Redis.
+
+    Args:
+        data (pd.DataFrame | pa.Table | bytes | str): The data to encode. Already encoded payloads are left untouched.
+
+    Returns:
+        bytes | str: The payload as an Arrow IPC stream.
+    """
+    if isinstance(data, (bytes, str)):
+        return data
+    table = to_table(data)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_payload(payload: bytes | str) -> pa.Table:
+    """
+    Decodes a payload read from Redis.
+
+    The Arrow buffers point directly into the payload, nothing is parsed
+    or copied. Payloads written with DataFrame.to_json are still accepted
+    until they expire.
+
+    Args:
+        payload (bytes | str): The payload read from Redis.
+
+    Returns:
+        pa.Table: The decoded data.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if payload.startswith(IPC_CONTINUATION):
+        return pa.ipc.open_stream(payload).read_all()
+    return to_table(pd.DataFrame(json.loads(payload)))
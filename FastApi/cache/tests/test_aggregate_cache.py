@@ -0,0 +1,32 @@
+import unittest
+
+from cache.cache_decorator import get_aggregate_fingerprint, get_aggregate_id
+from parquet.CatanaAggregationEnum import CatanaAggregationEnum
+
+
+class TestAggregateCache(unittest.TestCase):
+    def test_get_aggregate_id(self):
+        key = get_aggregate_id('Histo', ['a', 'b'], 'x', [CatanaAggregationEnum.SUM, CatanaAggregationEnum.MEAN])
+        self.assertTrue(key.startswith('agg+Histo+'))
+        self.assertEqual(key, get_aggregate_id('Histo', ['a', 'b'], 'x',
+                                               [CatanaAggregationEnum.SUM, CatanaAggregationEnum.MEAN]))
+        self.assertNotEqual(key, get_aggregate_id('Histo', ['a', 'b'], 'x',
+                                                  [CatanaAggregationEnum.MEAN, CatanaAggregationEnum.SUM]))
+        self.assertNotEqual(key, get_aggregate_id('Histo', ['a'], 'x',
+                                                  [CatanaAggregationEnum.SUM, CatanaAggregationEnum.MEAN]))
+        self.assertNotEqual(key, get_aggregate_id('Histo', ['a', 'b'], 'x',
+                                                  [CatanaAggregationEnum.SUM, CatanaAggregationEnum.MEAN],
+                                                  {'a': [2, 1], 'b': []}))
+
+    def test_get_aggregate_fingerprint(self):
+        timestamps = {'a': {'x': 1, 'x_xAxis': 1}, 'b': {'x': 2, 'x_xAxis': None}}
+        fields = ['x', 'x_xAxis']
+        self.assertIsNone(get_aggregate_fingerprint(timestamps, ['a', 'b'], fields))
+        fingerprint = get_aggregate_fingerprint(timestamps, ['a'], fields)
+        self.assertIsNotNone(fingerprint)
+        timestamps['a']['x'] = 3
+        self.assertNotEqual(fingerprint, get_aggregate_fingerprint(timestamps, ['a'], fields))
+
+
+if __name__ == '__main__':
+    unittest.main()
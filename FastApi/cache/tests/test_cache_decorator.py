@@ -0,0 +1,180 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+import pyarrow as pa
+import redis
+
+from cache import cache_decorator
+from cache.DiskRevalidator import DiskRevalidator
+from cache.LocalCache import LocalCache
+from cache.RedisInteractor import CatanaDataTypeEnum
+from cache.cache_decorator import aggregatecache, rediscache
+from parquet.CatanaAggregationEnum import CatanaAggregationEnum
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+DATA_TYPE = CatanaDataTypeEnum.RUNDATA
+
+
+class FakeParquet:
+    """Reads the version of each variable file of the runs."""
+
+    def __init__(self, directory: str):
+        self.parquet_path = directory + '/'
+        self.folder_datatype = {DATA_TYPE: 'rundata/'}
+        self.versions = dict()
+        self.reads = []
+
+    @rediscache
+    def cached_read_files(self, data_type, dict_runUID, years, update, competition):
+        self.reads.append({runuid: sorted(variables) for runuid, variables in dict_runUID.items()})
+        return {runuid: {variable: pa.table({'Value': [self.versions[(runuid, variable)]]})
+                         for variable in variables}
+                for runuid, variables in dict_runUID.items()}
+
+
+class FakeHisto(FakeParquet):
+    """Sums the version of a variable over the runs, or takes the version of the first run."""
+
+    axis_suffixes = ['_xAxis']
+
+    def __init__(self, directory: str, run_uid: list[str]):
+        super().__init__(directory)
+        self.competition = 'F1'
+        self.data_type = DATA_TYPE
+        self.run_uid = run_uid
+        self.years = [2024] * len(run_uid)
+        self.variables = ['x']
+        self.laps = None
+        self.computed = []   # shared with the copies made by aggregatecache
+
+    @aggregatecache
+    def process_data(self, update, agg):
+        self.computed.append(list(self.variables))
+        fields = [field for var in self.variables for field in [var] + [var + s for s in self.axis_suffixes]]
+        data = self.cached_read_files(data_type=self.data_type, dict_runUID={u: fields for u in self.run_uid},
+                                      years=self.years, update=update, competition=self.competition)
+        values = {var: [data[u][var].column('Value')[0].as_py() for u in self.run_uid] for var in self.variables}
+        return {var: pd.DataFrame({a.value: [sum(values[var]) if a is CatanaAggregationEnum.SUM else values[var][0]]
+                                   for a in agg})
+                for var in self.variables}
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis is not installed')
+class TestCacheDecorator(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.server = fakeredis.FakeServer()
+        pool = redis.ConnectionPool(connection_class=fakeredis.FakeRedisConnection, server=self.server)
+        for target, value in (('cache.RedisInteractor.get_connection_pool', lambda *args: pool),
+                              ('cache.cache_decorator.local_cache', LocalCache(0, 0)),
+                              ('cache.cache_decorator.disk_revalidator', DiskRevalidator(interval=60)),
+                              ('cache.cache_decorator.aggregate_cache_enabled', True)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.redis = redis.Redis(connection_pool=pool)
+        self.parquet = FakeParquet(self.directory.name)
+
+    def write_file(self, runuid: str, variable: str, version: float, mtime: float):
+        directory = os.path.join(self.directory.name, '2024', runuid, 'rundata')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{variable}.parquet')
+        open(path, 'wb').close()
+        os.utime(path, (mtime, mtime))
+        self.parquet.versions[(runuid, variable)] = version
+
+    def read(self, variables: list[str]) -> dict:
+        result = self.parquet.cached_read_files(data_type=DATA_TYPE, dict_runUID={'r1': variables}, years=[2024],
+                                                update=False, competition='F1')
+        return {variable: table.column('Value')[0].as_py() for variable, table in result['r1'].items()}
+
+    def test_modified_file(self):
+        # the clock of the file server is an hour ahead of the local clock
+        future = time.time() + 3600
+        self.write_file('r1', 'x', 1., future)
+        self.assertEqual(self.read(['x']), {'x': 1.})
+        self.assertEqual(float(self.redis.hget(f'r1+{DATA_TYPE}', 'x_mtime')), future)
+        self.assertEqual(self.read(['x']), {'x': 1.})
+        self.assertEqual(len(self.parquet.reads), 1)
+
+        # rewritten with an older modification time
+        cache_decorator.disk_revalidator.expire(('F1', DATA_TYPE, 'r1', 'x'))
+        self.write_file('r1', 'x', 2., future - 7200)
+        self.assertEqual(self.read(['x']), {'x': 2.})
+        self.assertEqual(self.parquet.reads, [{'r1': ['x']}, {'r1': ['x']}])
+
+    def test_variables_checked_separately(self):
+        self.write_file('r1', 'x', 1., 1000)
+        self.write_file('r1', 'y', 1., 1000)
+        self.read(['x', 'y'])
+        self.read(['x'])   # checks x only
+        self.write_file('r1', 'y', 2., 2000)
+        self.assertEqual(self.read(['x', 'y']), {'x': 1., 'y': 2.})
+        self.assertEqual(self.parquet.reads, [{'r1': ['x', 'y']}, {'r1': ['y']}])
+
+    def histo(self, run_uid: list[str]) -> FakeHisto:
+        histo = FakeHisto(self.directory.name, run_uid)
+        histo.versions, histo.reads = self.parquet.versions, self.parquet.reads
+        return histo
+
+    def aggregate(self, histo: FakeHisto, agg: CatanaAggregationEnum = CatanaAggregationEnum.SUM) -> float:
+        return histo.process_data(False, [agg])['x'][agg.value].iloc[0]
+
+    def test_aggregate(self):
+        for runuid in ('r1', 'r2'):
+            self.write_file(runuid, 'x', 1., 1000)
+            self.write_file(runuid, 'x_xAxis', 0., 1000)
+        self.assertEqual(self.aggregate(self.histo(['r2', 'r1'])), 2.)
+        # hit: the same runs in the same order, without computing nor reading the runs
+        histo = self.histo(['r2', 'r1'])
+        self.assertEqual(self.aggregate(histo), 2.)
+        self.assertEqual(histo.computed, [])
+        self.assertEqual(len(self.parquet.reads), 1)
+        # miss: another set of runs
+        self.assertEqual(self.aggregate(self.histo(['r1'])), 1.)
+        # not cached without aggregation
+        histo.process_data(False, [CatanaAggregationEnum.NONE])
+        self.assertEqual(histo.computed, [['x']])
+
+    def test_aggregate_order(self):
+        for runuid, version in (('r1', 1.), ('r2', 2.)):
+            self.write_file(runuid, 'x', version, 1000)
+            self.write_file(runuid, 'x_xAxis', 0., 1000)
+        self.assertEqual(self.aggregate(self.histo(['r1', 'r2']), CatanaAggregationEnum.FIRST), 1.)
+        histo = self.histo(['r2', 'r1'])
+        self.assertEqual(self.aggregate(histo, CatanaAggregationEnum.FIRST), 2.)
+        self.assertEqual(histo.computed, [['x']])
+
+    def test_aggregate_invalidation(self):
+        for runuid in ('r1', 'r2'):
+            self.write_file(runuid, 'x', 1., 1000)
+            self.write_file(runuid, 'x_xAxis', 0., 1000)
+        self.assertEqual(self.aggregate(self.histo(['r1', 'r2'])), 2.)
+
+        # the run data changed in Redis
+        self.redis.hset(f'r1+{DATA_TYPE}', 'x_timestamp', 1)
+        histo = self.histo(['r1', 'r2'])
+        self.assertEqual(self.aggregate(histo), 2.)
+        self.assertEqual(histo.computed, [['x']])
+
+        # the parquet file of a run changed: the run is read again
+        for key in [('F1', DATA_TYPE, runuid, field) for runuid in ('r1', 'r2') for field in ('x', 'x_xAxis')]:
+            cache_decorator.disk_revalidator.expire(key)
+        self.write_file('r2', 'x', 5., 2000)
+        histo = self.histo(['r1', 'r2'])
+        self.assertEqual(self.aggregate(histo), 6.)
+        self.assertEqual(self.parquet.reads[1:], [{'r2': ['x']}])
+        self.assertEqual(self.aggregate(self.histo(['r1', 'r2'])), 6.)
+
+
+if __name__ == '__main__':
+    unittest.main()
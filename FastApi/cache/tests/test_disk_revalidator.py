@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from cache.DiskRevalidator import DiskRevalidator
+
+
+class TestDiskRevalidator(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        for name, mtime in (('x.parquet', 100), ('y.parquet', 200), ('_run.parquet', 300)):
+            path = os.path.join(self.directory.name, name)
+            open(path, 'wb').close()
+            os.utime(path, (mtime, mtime))
+        self.revalidator = DiskRevalidator(interval=60)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_modified_times(self):
+        self.assertEqual(self.revalidator.get_modified_times(self.directory.name), {'x': 100, 'y': 200})
+        self.assertEqual(self.revalidator.get_modified_times(os.path.join(self.directory.name, 'missing')), {})
+
+    def test_get_stale_variables(self):
+        # any change of the modification time, even backwards
+        cached_times = {'x': 100, 'y': 250, 'z': 150, '_run': 150}
+        self.assertEqual(self.revalidator.get_stale_variables(self.directory.name, cached_times), ['y'])
+        self.assertEqual(self.revalidator.get_stale_variables(self.directory.name, {'x': None}), ['x'])
+
+    def test_is_due(self):
+        self.assertTrue(self.revalidator.is_due(('F1', 'LAPDATA', 'a', 'x')))
+        self.assertFalse(self.revalidator.is_due(('F1', 'LAPDATA', 'a', 'x')))
+        self.assertTrue(self.revalidator.is_due(('F1', 'LAPDATA', 'a', 'y')))
+        self.revalidator.expire(('F1', 'LAPDATA', 'a', 'x'))
+        self.assertTrue(self.revalidator.is_due(('F1', 'LAPDATA', 'a', 'x')))
+        self.assertFalse(DiskRevalidator(interval=0).is_enabled())
+
+    def test_forget_old_checks(self):
+        with patch('cache.DiskRevalidator.time.monotonic', return_value=1000):
+            self.revalidator.is_due(('F1', 'LAPDATA', 'a', 'x'))
+            self.revalidator.is_due(('F1', 'LAPDATA', 'a', 'y'))
+        with patch('cache.DiskRevalidator.time.monotonic', return_value=1065):
+            self.assertTrue(self.revalidator.is_due(('F1', 'LAPDATA', 'a', 'x')))
+        with patch('cache.DiskRevalidator.time.monotonic', return_value=1070):
+            self.assertTrue(self.revalidator.is_due(('F1', 'LAPDATA', 'b', 'x')))
+        self.assertEqual(list(self.revalidator._last_checks),
+                         [('F1', 'LAPDATA', 'a', 'x'), ('F1', 'LAPDATA', 'b', 'x')])
+
+
+if __name__ == '__main__':
+    unittest.main()
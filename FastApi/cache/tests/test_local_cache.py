@@ -0,0 +1,40 @@
+import unittest
+
+import pyarrow as pa
+
+from cache.LocalCache import LocalCache
+
+
+class TestLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.table = pa.table({'Run': [1.0, 2.0]})   # 16 bytes
+        self.cache = LocalCache(max_bytes=40, revalidate_interval=60)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.put('a', self.table, 10)
+        table, timestamp, to_revalidate = self.cache.get('a')
+        self.assertIs(table, self.table)
+        self.assertEqual(timestamp, 10)
+        self.assertFalse(to_revalidate)
+
+    def test_lru_eviction(self):
+        self.cache.put('a', self.table, 1)
+        self.cache.put('b', self.table, 1)
+        self.cache.get('a')   # 'b' becomes the least recently used
+        self.cache.put('c', self.table, 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertEqual(self.cache.size, 32)
+
+    def test_revalidation(self):
+        cache = LocalCache(max_bytes=40, revalidate_interval=0)
+        cache.put('a', self.table, 1)
+        self.assertTrue(cache.get('a')[2])
+        cache.invalidate('a')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cache.payload_codec import decode_payload, encode_payload
+
+
+class TestPayloadCodec(unittest.TestCase):
+    def test_roundtrip_dataframe(self):
+        df = pd.DataFrame({'Run': [1.5, np.nan, 3.0]}, index=[4, 5, 6])
+        payload = encode_payload(df)
+        self.assertIsInstance(payload, bytes)
+
+        table = decode_payload(payload)
+        self.assertEqual(table.column_names, ['Run'])
+        np.testing.assert_array_equal(table.column('Run').to_numpy(),
+                                      [1.5, np.nan, 3.0])
+
+    def test_empty_dataframe(self):
+        table = decode_payload(encode_payload(pd.DataFrame()))
+        self.assertEqual(table.num_columns, 0)
+
+    def test_legacy_json_payload(self):
+        df = pd.DataFrame({'Lap1': [10.0], 'Lap2': [None]})
+        table = decode_payload(df.to_json())
+        self.assertEqual(table.column_names, ['Lap1', 'Lap2'])
+        self.assertEqual(table.column('Lap1')[0].as_py(), 10.0)
+        self.assertEqual(decode_payload('{}').num_columns, 0)
+
+    def test_encoded_payload_untouched(self):
+        payload = encode_payload(pa.table({'Value': [0.0, 1.0]}))
+        self.assertIs(encode_payload(payload), payload)
+
+
+if __name__ == "__main__":
+    unittest.main()
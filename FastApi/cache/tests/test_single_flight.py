@@ -0,0 +1,48 @@
+import threading
+import time
+import unittest
+
+from cache.SingleFlight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return 'result'
+
+    def test_concurrent_calls_share_the_computation(self):
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.flight.do('key', self.compute)))
+        leader.start()
+        self.started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(self.flight.do('key', self.compute)))
+                     for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        time.sleep(0.2)   # the followers wait for the leader
+        self.assertEqual(self.flight.in_flight(), 1)
+        self.release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(results), [('result', False)] + [('result', True)] * 3)
+        self.assertEqual(self.flight.in_flight(), 0)
+
+    def test_error_is_raised_and_not_kept(self):
+        def fail():
+            raise ValueError('failed')
+        with self.assertRaises(ValueError):
+            self.flight.do('key', fail)
+        self.assertEqual(self.flight.do('key', lambda: 1), (1, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -296,8 +296,7 @@ if __name__ == '__main__':
     logger.info(f"List of runuids: \n{format_list_to_print(list_of_ruuid, 5)}")
     all_variables_dict = get_variables_from_path(args.path)
     
-    db_params = redis_params
-    db_params["database"] = "Catana" + args.competition
+    db_params = {**redis_params, "database": "Catana" + args.competition}
     # create an object to interact with Redis and connect to Redis
     rd_interactor = RedisInteractor(**db_params)
     _ = rd_interactor.connect()
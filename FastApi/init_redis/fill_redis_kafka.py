@@ -20,7 +20,7 @@ path = r'/mnt/o/Symphony_tools/Webappauto/templates'
 server = "vlt-k8s-master.provider.rsv.dir:9095"
 topic = "dev_fill_redis"
 group_id = "test_0"
-db_params = redis_params
+db_params = dict(redis_params)
 
 logging.setLoggerClass(CustomLogger)
 logger : CustomLogger = logging.getLogger("J'aime les mandarines")
@@ -5,6 +5,7 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+import time
 import traceback
 
 logger = logging.getLogger('main_log')
@@ -31,6 +32,7 @@ logger.info('Starting FastAPI')
 from Analytics import applications
 from modules import run, catana, fiav6#, push
 from Analytics.applications import ANALYTICS
+from utils.executors import executors
 app = FastAPI(
     responses={404: {"description": "Not found"}}
 )
@@ -50,6 +52,34 @@ app.include_router(run.router)
 app.include_router(applications.router)
 app.include_router(fiav6.router)
 
+# Above this size a response body is logged as a warning.
+MAX_TOLERATED_SIZE = 50 * 1e6
+
+
+@app.middleware("http")
+async def log_response(request: Request, call_next):
+    """
+        Logs the time spent and the size of a response once its body,
+        possibly streamed, has been sent.
+    """
+    start = time.time()
+    response = await call_next(request)
+    ip, func = request.client.host, request.url.path
+
+    async def body_iterator(chunks):
+        size = 0
+        async for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+        end = time.time() - start
+        if size > MAX_TOLERATED_SIZE:
+            logger.warning(f" {ip} | {func} | Response body is "
+                           f"{size/1e6:.3f}Mo")
+        logger.info(f' {ip} | {func} done [{end:.3f}s]\n')
+
+    response.body_iterator = body_iterator(response.body_iterator)
+    return response
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request,
                                        exc: RequestValidationError):
@@ -98,7 +128,14 @@ async def root(request: Request):
     logger.debug(f' Ping from {request.client.host}')
     return {"message": "Documentation is available at /docs"}
 
+@app.get("/executors")
+async def executors_stats():
+    """
+        Queue depth and latencies of the executors of the blocking work.
+    """
+    return {name: executor.stats() for name, executor in executors.items()}
+
 logger.info('FastAPI Started')
 
 if __name__ == '__main__':
-    print("test")
\ No newline at end of file
+    print("test")
\ No newline at end of file
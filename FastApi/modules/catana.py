@@ -1,10 +1,9 @@
 from enum import Enum
-from functools import wraps
+from functools import partial, wraps
 import json
 import logging
-import time
+import inspect
 from typing import List, Dict
-import sys
 
 from fastapi import APIRouter, Response, Request, Query
 from fastapi.responses import JSONResponse, StreamingResponse
@@ -13,6 +12,7 @@ from pydantic import BaseModel, Field
 
 from bdd.CATANA import CATANA, RUNFILTER
 from parquet.CatanaAggregationEnum import CatanaAggregationEnum
+from parquet.CatanaDecimationEnum import CatanaDecimationEnum
 from parquet.PARQUET import CatanaDataTypeEnum
 from parquet.LapData import LapData
 from parquet.HistoData import HistoData
@@ -22,9 +22,18 @@ from parquet.RunData import RunData
 from parquet.CDCData import CDCData
 from parquet.Histo2DData import Histo2DData
 from parquet.Channel import ChannelData
+from utils.executors import disk_executor, run_in, sql_executor
+from utils.serialization import (ARROW_MEDIA_TYPE, COMPACT_SEPARATORS,
+                                 PARQUET_MEDIA_TYPE, iter_arrow_stream,
+                                 iter_dataframes, iter_json_object,
+                                 iter_response, iter_split_json,
+                                 to_parquet_bytes)
 
 logger = logging.getLogger('main_log')
 
+# continuation token of the paginated get_channels
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
 router = APIRouter(
     prefix="/catana",
     tags=["catana"],
@@ -46,6 +55,11 @@ class SourceEnum(str, Enum):
     CATANA_FE = "FE"
     LMDh = "LMDh"
 
+class ResponseFormatEnum(str, Enum):
+    JSON = "json"
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
 class ListElements(BaseModel):
     Competition: CompetitionEnum = "F1"
     Element : str = "EngineType"
@@ -59,10 +73,28 @@ class CATANADATA(BaseModel):
     RunUID: list[str] | str
     Years: list[int] | int
     Update: bool = Field(default=False, include_in_schema=False)
+    Format: ResponseFormatEnum | None = None
 
 class AGGCATANA(CATANADATA):
     AggregationFunction: list[CatanaAggregationEnum] | CatanaAggregationEnum
 
+class LAPFILTER(BaseModel):
+    StartTime: float | None = None
+    EndTime: float | None = None
+    Laps: list[int] | int | None = None
+
+class LAPCATANADATA(CATANADATA, LAPFILTER):
+    pass
+
+class AGGLAPCATANA(AGGCATANA, LAPFILTER):
+    pass
+
+class CHANNELDATA(CATANADATA, LAPFILTER):
+    MaxRows: int | None = Field(default=None, gt=0)
+    Cursor: str | None = None
+    MaxPoints: int | None = Field(default=None, gt=0)
+    Decimation: CatanaDecimationEnum = CatanaDecimationEnum.LTTB
+
 
 
 class LAPMETA(BaseModel):
@@ -97,89 +129,75 @@ class VARIABLES(BaseModel):
     Years: list[int] | int
 
 
-def parse_df(df:pd.DataFrame) -> dict:
+def _data_response(request: Request, response_format: ResponseFormatEnum | None,
+                   result: dict[str, pd.DataFrame] | pd.DataFrame,
+                   json_iterator) -> Response:
     """
-        Function to parse a dataframe from PARQUET in the correct orient
-        without using the (slower) build-in functions.
+        Serializes the output of process_data in the format asked by the
+        Format parameter or else by the Accept header, JSON by default.
+        Arrow and parquet responses hold one record batch (or row group)
+        per variable. The beginning of the streamed responses is
+        serialized before they start (see iter_response).
     """
-    res = {}
-    res['columns'] = list(df.columns)
-    res['index'] = list(range(df.shape[0]))
-    res['data'] = df.values.tolist()
-    return res
+    if response_format is None:
+        accept = request.headers.get('accept', '')
+        if ARROW_MEDIA_TYPE in accept:
+            response_format = ResponseFormatEnum.ARROW
+        elif PARQUET_MEDIA_TYPE in accept:
+            response_format = ResponseFormatEnum.PARQUET
+        else:
+            response_format = ResponseFormatEnum.JSON
+
+    if response_format is ResponseFormatEnum.ARROW:
+        return StreamingResponse(iter_response(iter_arrow_stream(result)),
+                                 media_type=ARROW_MEDIA_TYPE)
+    if response_format is ResponseFormatEnum.PARQUET:
+        return Response(to_parquet_bytes(result),
+                        media_type=PARQUET_MEDIA_TYPE)
+    return StreamingResponse(iter_response(json_iterator(result)),
+                             media_type="application/json")
 
-def json_dumps_iterator(large_dict):
+def _channels_response(request: Request,
+                       response_format: ResponseFormatEnum | None,
+                       result: dict[str, pd.DataFrame],
+                       next_cursor: str | None) -> Response:
     """
-    Itère sur un très grand dictionnaire et renvoie petit à petit
-    des fragments de la version JSON sérialisée.
-
-    :param large_dict: Dictionnaire à sérialiser en JSON.
-    :return: Un itérateur qui renvoie des fragments JSON.
+        Serializes the channels like _data_response. When the channels
+        are read by pages and some rows are left, the token of the next
+        page is sent in the X-Next-Cursor header. The JSON documents keep
+        the compact separators of the objects of this endpoint.
     """
+    response = _data_response(request, response_format, result,
+                              partial(iter_dataframes,
+                                      separators=COMPACT_SEPARATORS))
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
 
-    # Commence avec la première accolade ouvrante '{'
-    yield '{'
-
-    # Itère sur les clés/valeurs du dictionnaire
-    iterator = iter(large_dict.items())
-    first_item = True
-
-    for key, value in iterator:
-        if not first_item:
-            # Ajoute une virgule avant chaque nouvel élément sauf le premier
-            yield ','
-        first_item = False
-
-        # Sérialiser la clé et la valeur en JSON
-        key_json = json.dumps(key)
-
-        nelement_max = 100000
-        if isinstance(value, dict):
-            yield f"{key_json}:"
-            for val in json_dumps_iterator(value):
-                yield val
-        elif isinstance(value, list):
-
-            yield f"{key_json}:"
-            yield '['
-            for i in range(0, len(value), nelement_max):
-                yield json.dumps(value[i:i + nelement_max])[1:-1]
-                if i + nelement_max < len(value):
-                    yield ", "
-                # print(value[i:i+5])
-
-            yield ']'
-        else:
-            value_json = json.dumps(value)
-            yield f"{key_json}: {value_json}"
-
-        # value_json = json.dumps(value)
-
-        # Renvoyer le fragment JSON clé:valeur
-        # yield f"{key_json}: {value_json}"
-
-    # Termine avec l'accolade fermante '}'
-    yield '}'
- 
 def logger_decorator(func):
+    """
+        Logs the start of a request. The size of the response and the time
+        spent are logged by the middleware of main.py once the response,
+        possibly streamed, has been sent.
+    """
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            ip = kwargs['request'].client.host
+            logger.debug(f' {ip} | Starting {func.__name__}')
+            return await func(*args, **kwargs)
+        return async_wrapper
+
     @wraps(func)
     def wrapper(*args, **kwargs):
         ip = kwargs['request'].client.host
-        func_name = func.__name__
-        logger.debug(f' {ip} | Starting {func_name}')
-        start = time.time()
-        my_result = func(*args, **kwargs)
-        end = time.time() - start
-        max_tolerated_size, res_size = 50 * 1e6, sys.getsizeof(my_result.body)
-        if res_size > max_tolerated_size:
-            logger.warning(f"""{ip} | {func_name} | Response body is """
-                           f"""{res_size/1e6:.3f}Mo""")
-        logger.info(f' {ip} | {func_name} done [{end:.3f}s]\n')
-        return my_result
+        logger.debug(f' {ip} | Starting {func.__name__}')
+        return func(*args, **kwargs)
     return wrapper
 
 @router.post("/")
 @logger_decorator
+@run_in(sql_executor)
 def run_post(request: Request,
              runmeta: RUNMETA):
     run_filter = RUNFILTER()
@@ -193,6 +211,7 @@ def run_post(request: Request,
 
 @router.get("/")
 @logger_decorator
+@run_in(sql_executor)
 def run(request: Request,
         EngineType: List[str] = Query(default=[]),  # run_filter
         Track: List[str] = Query(default=[]),  # run_filter
@@ -218,6 +237,7 @@ def run(request: Request,
 
 @router.get("/list_element")
 @logger_decorator
+@run_in(sql_executor)
 def list_element(request: Request,
                  Competition: SourceEnum = Query(default="F1")):
     p = CATANA()
@@ -228,6 +248,7 @@ def list_element(request: Request,
 
 @router.get("/list_value")
 @logger_decorator
+@run_in(sql_executor)
 def get_list_value(request: Request,
                    Competition: SourceEnum = Query(default="F1"),
                    Element: str = Query(default='EngineType'),
@@ -242,6 +263,7 @@ def get_list_value(request: Request,
 
 @router.post("/list_value")
 @logger_decorator
+@run_in(sql_executor)
 def post_list_value(request: Request,
                     data : ListElements):
     p = CATANA()
@@ -254,6 +276,7 @@ def post_list_value(request: Request,
 
 
 @router.get("/list_cdc")
+@run_in(sql_executor)
 def get_list_cdc(
         Competition: CompetitionEnum = Query(default="F1"),
         EngineType: str = Query(default=None),
@@ -265,6 +288,7 @@ def get_list_cdc(
 
 
 @router.get("/list_laptype")
+@run_in(sql_executor)
 def list_laptype():
     p = CATANA()
     result = p.laptype_get()
@@ -274,6 +298,7 @@ def list_laptype():
 
 @router.get("/cdc")
 @logger_decorator
+@run_in(sql_executor)
 def get_cdc(request: Request, CDCListUID: List[str] = Query(default=[]),
             CDCUID: List[str] = Query(default=[]),
             Identifier: List[str] = Query(default=[]),
@@ -302,6 +327,7 @@ def get_cdc(request: Request, CDCListUID: List[str] = Query(default=[]),
 
 @router.get('/get_run_cdcinfo')
 @logger_decorator
+@run_in(disk_executor)
 def get_run_cdcinfo(request: Request,
                     Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                     Variables: List[str] = Query(default=[]),
@@ -309,25 +335,25 @@ def get_run_cdcinfo(request: Request,
                     Years: List[int] = Query(default=[])):
     p = CDCData(Competition, Variables, RunUID, Years)
     result = p.get_CDCINFO_from_parquet()
-    res = {k: json.loads(v.to_json(orient="split", date_format="iso",
-                                   default_handler=str)) for k, v in result.items()}
-    return Response(json.dumps(res),
-                    media_type="application/json")
+    res = {k: iter_split_json(v, reencode=True) for k, v in result.items()}
+    return StreamingResponse(iter_response(iter_json_object(res)),
+                             media_type="application/json")
 
 
 @router.post('/get_run_cdcinfo')
 @logger_decorator
+@run_in(disk_executor)
 def post_run_cdcinfo(request: Request, data: CATANADATA):
     p = CDCData(data.Competition, data.Variables, data.RunUID, data.Years)
     result = p.get_CDCINFO_from_parquet()
-    res = {k: json.loads(v.to_json(orient="split", date_format="iso",
-                                   default_handler=str)) for k, v in result.items()}
-    return Response(json.dumps(res),
-                    media_type="application/json")
+    res = {k: iter_split_json(v, reencode=True) for k, v in result.items()}
+    return StreamingResponse(iter_response(iter_json_object(res)),
+                             media_type="application/json")
 
 
 @router.get("/alias")
 @logger_decorator
+@run_in(sql_executor)
 def get_alias(request: Request, BeginDate: str = Query(default="2000"),
               EndDate: str = Query(default="3000"),
               Competition: CompetitionEnum = Query(default="F1"),
@@ -341,6 +367,7 @@ def get_alias(request: Request, BeginDate: str = Query(default="2000"),
 
 @router.get("/lap_metadata")
 @logger_decorator
+@run_in(sql_executor)
 def get_lap_meta(request: Request, RunUID: List[str] | str = Query(default="")):
     p = CATANA()
     result = p.lap_meta_get(RunUID)
@@ -350,6 +377,7 @@ def get_lap_meta(request: Request, RunUID: List[str] | str = Query(default="")):
 
 @router.post("/lap_metadata")
 @logger_decorator
+@run_in(sql_executor)
 def post_lap_meta(request: Request, RunUID: LAPMETA):
     p = CATANA()
     result = p.lap_meta_get(RunUID.RunUID)
@@ -362,6 +390,7 @@ def post_lap_meta(request: Request, RunUID: LAPMETA):
 
 @router.get("/get_cdcdata")
 @logger_decorator
+@run_in(disk_executor)
 def get_cdcdata(request: Request,
                 Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                 Variables: List[str] = Query(default=[]),
@@ -371,164 +400,176 @@ def get_cdcdata(request: Request,
                 Update: bool = Query(default=False, include_in_schema=True)):
     p = CDCData(Competition, Variables, RunUID, Years)
     result = p.process_data(Update, AggregationFunction)
-    cdc_info = {k: parse_df(v) for k, v in result[0].items()}
+    cdc_info = iter_dataframes(result[0])
+    # the data is sent as a JSON string inside the JSON document
     cdc_data = result[1].to_json(orient="split", date_format="iso",
                             default_handler=str)
-    res = json.dumps({'cdc_info': cdc_info, 'cdc_data': cdc_data})
-    return Response(res, media_type="application/json")
+    res = {'cdc_info': cdc_info, 'cdc_data': cdc_data}
+    return StreamingResponse(iter_response(iter_json_object(res)),
+                             media_type="application/json")
 
 @router.post("/get_cdcdata")
 @logger_decorator
+@run_in(disk_executor)
 def post_cdcdata(request: Request, data: AGGCATANA):
     p = CDCData(data.Competition, data.Variables, data.RunUID, data.Years)
     result = p.process_data(data.Update, data.AggregationFunction)
-    cdc_info = {k: json.loads(v.to_json(orient="split", date_format="iso",
-                                   default_handler=str)) for k, v in result[0].items()}
-    cdc_data = result[1].to_json(orient="split", date_format="iso",
-                            default_handler=str)
-    res = json.dumps({'cdc_info': cdc_info, 'cdc_data': json.loads(cdc_data)})
-    return Response(res, media_type="application/json")
+    cdc_info = iter_json_object({k: iter_split_json(v, reencode=True)
+                                 for k, v in result[0].items()})
+    cdc_data = iter_split_json(result[1], reencode=True)
+    res = {'cdc_info': cdc_info, 'cdc_data': cdc_data}
+    return StreamingResponse(iter_response(iter_json_object(res)),
+                             media_type="application/json")
 
 @router.get("/get_histo2ddata")
 @logger_decorator
+@run_in(disk_executor)
 def get_histo2ddata(request: Request, Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                     Variables: List[str] = Query(default=[]),
                     AggregationFunction : List[CatanaAggregationEnum] = Query(default=[CatanaAggregationEnum.SUM]),
                     RunUID: List[str] = Query(default=[]),
                     Years: List[int] = Query(default=[]),
+                    Format: ResponseFormatEnum = Query(default=None),
                     Update: bool = Query(default=False, include_in_schema=True)):
     p = Histo2DData(Competition, Variables, RunUID, Years)
     result = p.process_data(Update, AggregationFunction)
-    res = {k: parse_df(v) for k, v in result.items()}
-    return Response(json.dumps(res), media_type="application/json")
+    return _data_response(request, Format, result, iter_dataframes)
 
 
 @router.post("/get_histo2ddata")
 @logger_decorator
+@run_in(disk_executor)
 def post_histo2ddata(request: Request, data: AGGCATANA):
     p = Histo2DData(data.Competition, data.Variables, data.RunUID, data.Years)
     result = p.process_data(data.Update, data.AggregationFunction)
-    res = {k: parse_df(v) for k, v in result.items()}
-    res = json.dumps(res)
-    return Response(res, media_type="application/json")
+    return _data_response(request, data.Format, result, iter_dataframes)
 
 
 @router.get("/get_histodata")
 @logger_decorator
+@run_in(disk_executor)
 def get_histodata(request: Request, Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                   Variables: List[str] = Query(default=[]),
                   AggregationFunction: List[CatanaAggregationEnum] = Query(default=[CatanaAggregationEnum.SUM]),
                   RunUID: List[str] = Query(default=[]),
                   Years: List[int] = Query(default=[]),
+                  Format: ResponseFormatEnum = Query(default=None),
                   Update: bool = Query(default=False, include_in_schema=True)):
     p = HistoData(Competition, Variables, RunUID, Years)
     result = p.process_data(Update, AggregationFunction)
-    res = {k: parse_df(v) for k, v in result.items()}
-    return Response(json.dumps(res), media_type="application/json")
+    return _data_response(request, Format, result, iter_dataframes)
 
 
 @router.post("/get_histodata")
 @logger_decorator
+@run_in(disk_executor)
 def post_histodata(request: Request, data: AGGCATANA):
     p = HistoData(data.Competition, data.Variables, data.RunUID, data.Years)
     result = p.process_data(data.Update, data.AggregationFunction)
-    res = {k: parse_df(v) for k, v in result.items()}
-    return Response(json.dumps(res), media_type="application/json")
+    return _data_response(request, data.Format, result, iter_dataframes)
 
 
 @router.get("/get_histolapdata")
 @logger_decorator
+@run_in(disk_executor)
 def get_histolapdata(request: Request, Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                      Variables: List[str] = Query(default=[]),
                      AggregationFunction: List[CatanaAggregationEnum] = Query(default=[CatanaAggregationEnum.SUM]),
                      RunUID: List[str] = Query(default=[]),
                      Years: List[int] = Query(default=[]),
-                     Update: bool = Query(default=False, include_in_schema=True)):
+                     Format: ResponseFormatEnum = Query(default=None),
+                     Update: bool = Query(default=False, include_in_schema=True),
+                     StartTime: float = Query(default=None),
+                     EndTime: float = Query(default=None),
+                     Laps: List[int] = Query(default=[])):
     p = HistoLapData(Competition, Variables, RunUID, Years)
+    p.select_laps(Laps, StartTime, EndTime)
     result = p.process_data(Update, AggregationFunction)
-    res = {k: parse_df(v) for k, v in result.items()}
-    return Response(json.dumps(res), media_type="application/json")
+    return _data_response(request, Format, result, iter_dataframes)
 
 
 @router.post("/get_histolapdata")
 @logger_decorator
-def post_histolapdata(request: Request, data: AGGCATANA):
+@run_in(disk_executor)
+def post_histolapdata(request: Request, data: AGGLAPCATANA):
     p = HistoLapData(data.Competition, data.Variables, data.RunUID, data.Years)
+    p.select_laps(data.Laps, data.StartTime, data.EndTime)
     result = p.process_data(data.Update, data.AggregationFunction)
-    res = {k: parse_df(v) for k, v in result.items()}
-    res = json.dumps(res)
-    # res_size = sys.getsizeof(res)
-    # if res_size > 100 * 1e6:
-    #     logger.warning(f"Response size is {res_size / 1e6:.2f}Mo")
-
-
-    return Response(res, media_type="application/json")
+    return _data_response(request, data.Format, result, iter_dataframes)
 
 
 @router.get("/get_lapdata")
 @logger_decorator
+@run_in(disk_executor)
 def get_lapdata(request: Request, Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                 Variables: List[str] = Query(default=[]),
                 RunUID: List[str] = Query(default=[]),
                 Years: List[int] = Query(default=[]),
-                Update: bool = Query(default=False, include_in_schema=True)):
+                Format: ResponseFormatEnum = Query(default=None),
+                Update: bool = Query(default=False, include_in_schema=True),
+                StartTime: float = Query(default=None),
+                EndTime: float = Query(default=None),
+                Laps: List[int] = Query(default=[])):
     p = LapData(Competition, Variables, RunUID, Years)
+    p.select_laps(Laps, StartTime, EndTime)
     result = p.process_data(Update)
-    return Response(result.to_json(orient="split", date_format="iso", default_handler=str),
-                    media_type="application/json")
+    return _data_response(request, Format, result, iter_split_json)
 
 
 @router.post("/get_lapdata")
 @logger_decorator
-def post_lapdata(request: Request, data: CATANADATA):
+@run_in(disk_executor)
+def post_lapdata(request: Request, data: LAPCATANADATA):
     p = LapData(data.Competition, data.Variables, data.RunUID, data.Years)
+    p.select_laps(data.Laps, data.StartTime, data.EndTime)
     result = p.process_data(data.Update)
-    return Response(result.to_json(orient="split", date_format="iso", default_handler=str),
-                    media_type="application/json")
+    return _data_response(request, data.Format, result, iter_split_json)
 
 
 @router.get("/get_otherdata")
 @logger_decorator
+@run_in(disk_executor)
 def get_otherdata(request: Request, Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                   Variables: List[str] = Query(default=[]),
                   RunUID: List[str] = Query(default=[]),
                   Years: List[int] = Query(default=[]),
+                  Format: ResponseFormatEnum = Query(default=None),
                   Update: bool = Query(default=False, include_in_schema=True)):
     p = OtherData(Competition, Variables, RunUID, Years)
     result = p.process_data(Update)
-    res = {k: parse_df(v) for k, v in result.items()}
-    return Response(json.dumps(res), media_type="application/json")
+    return _data_response(request, Format, result, iter_dataframes)
 
 
 @router.post("/get_otherdata")
 @logger_decorator
+@run_in(disk_executor)
 def post_otherdata(request: Request, data: CATANADATA):
     p = OtherData(data.Competition, data.Variables, data.RunUID, data.Years)
     result = p.process_data(data.Update)
-    res = {k: parse_df(v) for k, v in result.items()}
-    return Response(json.dumps(res), media_type="application/json")
+    return _data_response(request, data.Format, result, iter_dataframes)
 
 
 @router.get("/get_rundata")
 @logger_decorator
+@run_in(disk_executor)
 def get_rundata(request: Request, Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                 Variables: List[str] = Query(default=[]),
                 RunUID: List[str] = Query(default=[]),
                 Years: List[int] = Query(default=[]),
+                Format: ResponseFormatEnum = Query(default=None),
                 Update: bool = Query(default=False, include_in_schema=True)):
     p = RunData(Competition, Variables, RunUID, Years)
     result = p.process_data(Update)
-    return Response(result.to_json(orient="split", date_format="iso", default_handler=str),
-                    media_type="application/json")
+    return _data_response(request, Format, result, iter_split_json)
 
 
 @router.post("/get_rundata")
 @logger_decorator
+@run_in(disk_executor)
 def post_rundata(request: Request, data: CATANADATA):
     p = RunData(data.Competition, data.Variables, data.RunUID, data.Years)
     result = p.process_data(data.Update)
-    return Response(result.to_json(orient="split", date_format="iso", default_handler=str),
-                    media_type="application/json")
+    return _data_response(request, data.Format, result, iter_split_json)
 
 def _get_correct_entity(competition: CompetitionEnum,
                         data_type: CatanaDataTypeEnum,
@@ -549,6 +590,7 @@ def _get_correct_entity(competition: CompetitionEnum,
 
 @router.get("/get_availabledata")
 @logger_decorator
+@run_in(disk_executor)
 def get_avaliabledata(request: Request,
                       Competition: CompetitionEnum = Query(
                           default=CompetitionEnum.PUAS3),
@@ -563,6 +605,7 @@ def get_avaliabledata(request: Request,
 
 @router.post("/get_availabledata")
 @logger_decorator
+@run_in(disk_executor)
 def post_avaliabledata(request: Request, data: VARIABLES):
     p = _get_correct_entity(
         data.Competition, data.DataType, data.RunUID, data.Years)
@@ -572,23 +615,32 @@ def post_avaliabledata(request: Request, data: VARIABLES):
 
 @router.get("/get_channels")
 @logger_decorator
-async def get_channels(request: Request, Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
+@run_in(disk_executor)
+def get_channels(request: Request, Competition: CompetitionEnum = Query(default=CompetitionEnum.PUAS3),
                  Variables: List[str] = Query(default=[]),
                  RunUID: List[str] = Query(default=[]),
-                 Years: List[int] = Query(default=[])):
+                 Years: List[int] = Query(default=[]),
+                 Format: ResponseFormatEnum = Query(default=None),
+                 StartTime: float = Query(default=None),
+                 EndTime: float = Query(default=None),
+                 MaxRows: int = Query(default=None, gt=0),
+                 Cursor: str = Query(default=None),
+                 Laps: List[int] = Query(default=[]),
+                 MaxPoints: int = Query(default=None, gt=0),
+                 Decimation: CatanaDecimationEnum = Query(default=CatanaDecimationEnum.LTTB)):
     p = ChannelData(Competition, Variables, RunUID, Years)
-    result = p.process_data()
-    res = {k: parse_df(v) for k,v in result.items()} 
-    return StreamingResponse(json_dumps_iterator(res),
-                             media_type="application/json")
+    result = p.process_data(StartTime, EndTime, MaxRows, Cursor, Laps,
+                            MaxPoints, Decimation)
+    return _channels_response(request, Format, result, p.next_cursor)
 
 
 @router.post("/get_channels")
-async def post_channels(request: Request, data: CATANADATA):
+@run_in(disk_executor)
+def post_channels(request: Request, data: CHANNELDATA):
     ip = request.client.host
     logger.info(f' {ip} | Starting post_channels\n')
     p = ChannelData(data.Competition, data.Variables, data.RunUID, data.Years)
-    result = p.process_data()
-    res = {k: parse_df(v) for k,v in result.items()} 
-    return StreamingResponse(json_dumps_iterator(res),
-                             media_type="application/json")
+    result = p.process_data(data.StartTime, data.EndTime, data.MaxRows,
+                            data.Cursor, data.Laps, data.MaxPoints,
+                            data.Decimation)
+    return _channels_response(request, data.Format, result, p.next_cursor)
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Response, Query
 from pydantic import BaseModel
 
 from bdd.FIAV6 import FIAV6
+from utils.executors import run_in, sql_executor
 
 router = APIRouter(
     prefix="/fiav6",
@@ -18,7 +19,8 @@ class FIAMODEL(BaseModel):
 
 
 @router.get("/fia_monitoring")
-async def fia_monitoring(ssn_list: list[str] = Query(default=None)):
+@run_in(sql_executor)
+def fia_monitoring(ssn_list: list[str] = Query(default=None)):
     p = FIAV6()
     result = p.fia_get(ssn_list)
     r = result.to_json(orient="split")
@@ -26,6 +28,7 @@ async def fia_monitoring(ssn_list: list[str] = Query(default=None)):
 
 
 @router.post("/fia_monitoring")
-async def fia_monitoring_post(fiamodel: FIAMODEL):
+@run_in(sql_executor)
+def fia_monitoring_post(fiamodel: FIAMODEL):
     p = FIAV6()
     return Response(p.fia_get(fiamodel.__dict__.get("ssn_list")).to_json(orient="split"), media_type="application/json")
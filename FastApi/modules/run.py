@@ -5,6 +5,7 @@ from fastapi import APIRouter, Response, Query
 from pydantic import BaseModel
 
 from bdd.PUAS import PUAS3, RUNFILTER
+from utils.executors import run_in, sql_executor
 
 router = APIRouter(
     prefix="/run",
@@ -43,7 +44,8 @@ class RUNMETA(BaseModel):
 
 
 @router.get("/")
-async def run(
+@run_in(sql_executor)
+def run(
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
         EngineType: List[str] = Query(default=[]),  # run_filter
@@ -75,7 +77,8 @@ class RunModel(RUNMETA, RunAddModel):
     pass
 
 @router.post("/")
-async def runpost(runmodel: RunModel):
+@run_in(sql_executor)
+def runpost(runmodel: RunModel):
     run_filter = RUNFILTER()
     run_filter.from_dict(runmodel.__dict__)
 
@@ -90,7 +93,8 @@ class SourcesEnum(str, Enum):
 
 
 @router.get("/variablelist")
-async def variable_list(
+@run_in(sql_executor)
+def variable_list(
         Source: SourcesEnum = Query(default=""),
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
@@ -117,7 +121,8 @@ async def variable_list(
 
 
 @router.get("/lapdata")
-async def lapdata(
+@run_in(sql_executor)
+def lapdata(
         Variables: List[str] = Query(default=[]),
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
@@ -152,7 +157,8 @@ class LapDataModel(RUNMETA, LapDataAddModel):
     pass
 
 @router.post("/lapdata")
-async def lapdatapost(lapdata: LapDataModel):
+@run_in(sql_executor)
+def lapdatapost(lapdata: LapDataModel):
     run_filter = RUNFILTER()
     run_filter.from_dict(lapdata.__dict__)
 
@@ -164,7 +170,8 @@ async def lapdatapost(lapdata: LapDataModel):
 
 
 @router.get("/rundata")
-async def rundata(
+@run_in(sql_executor)
+def rundata(
         Variables: List[str] = Query(default=[]),
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
@@ -198,7 +205,8 @@ class RunDataModel(RUNMETA, RunDataAddModel):
 
 
 @router.post("/rundata")
-async def rundatapost(rundatamodel: RunDataModel,
+@run_in(sql_executor)
+def rundatapost(rundatamodel: RunDataModel,
                       ):
     run_filter = RUNFILTER()
     run_filter.from_dict(rundatamodel.__dict__)
@@ -217,7 +225,8 @@ class aggregationfunctionEnum(str, Enum):
 
 
 @router.get("/histodata")
-async def histodata(
+@run_in(sql_executor)
+def histodata(
         Variables: List[str] = Query(default=[]),
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
@@ -253,7 +262,8 @@ class HistodataModel(RUNMETA, HistodataAddModel):
     pass
     
 @router.post("/histodata")
-async def histodatapost(histomodel: HistodataModel):
+@run_in(sql_executor)
+def histodatapost(histomodel: HistodataModel):
     run_filter = RUNFILTER()
     run_filter.from_dict(histomodel.__dict__)
 
@@ -265,7 +275,8 @@ async def histodatapost(histomodel: HistodataModel):
 
 
 @router.get("/histolapdata")
-async def histolapdata(
+@run_in(sql_executor)
+def histolapdata(
         Variables: List[str] = Query(default=[]),
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
@@ -303,7 +314,8 @@ class HistolapModel(RUNMETA, HistolapAddModel):
     pass
 
 @router.post("/histolapdata")
-async def histolapdatapost(histolap: HistolapModel):
+@run_in(sql_executor)
+def histolapdatapost(histolap: HistolapModel):
     run_filter = RUNFILTER()
     run_filter.from_dict(histolap.__dict__)
 
@@ -316,7 +328,8 @@ async def histolapdatapost(histolap: HistolapModel):
 
 
 @router.get("/cdcinfo")
-async def cdcinfo(
+@run_in(sql_executor)
+def cdcinfo(
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
         EngineType: List[str] = Query(default=[]),  # run_filter
@@ -349,7 +362,8 @@ class CdcinfoModel(RUNMETA, CdcinfoAddModel):
     pass
 
 @router.post("/cdcinfo")
-async def cdcinfopost(cdcinfo: CdcinfoModel):
+@run_in(sql_executor)
+def cdcinfopost(cdcinfo: CdcinfoModel):
     run_filter = RUNFILTER()
     run_filter.from_dict(cdcinfo.__dict__)
 
@@ -360,7 +374,8 @@ async def cdcinfopost(cdcinfo: CdcinfoModel):
 
 
 @router.get("/cdcdata")
-async def get_cdcdata(
+@run_in(sql_executor)
+def get_cdcdata(
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
         EngineType: List[str] = Query(default=[]),  # run_filter
@@ -394,7 +409,8 @@ class CdcdataModel(RUNMETA, CdcdataAddModel):
     pass
 
 @router.post("/cdcdata")
-async def cdcdatapost(cdcdata: CdcdataModel):
+@run_in(sql_executor)
+def cdcdatapost(cdcdata: CdcdataModel):
     run_filter = RUNFILTER()
     run_filter.from_dict(cdcdata.__dict__)
 
@@ -405,7 +421,8 @@ async def cdcdatapost(cdcdata: CdcdataModel):
 
 
 @router.get("/matrixdata")
-async def get_matrixdata(
+@run_in(sql_executor)
+def get_matrixdata(
         Chassis: List[str] = Query(default=[]),  # run_filter
         ChassisNumber: List[str] = Query(default=[]),  # run_filter
         EngineType: List[str] = Query(default=[]),  # run_filter
@@ -436,7 +453,8 @@ class MatrixdataModel(RUNMETA, MatrixdataAddModel):
     pass
 
 @router.post("/matrixdata")
-async def matrixdatapost(matrixdata: MatrixdataModel):
+@run_in(sql_executor)
+def matrixdatapost(matrixdata: MatrixdataModel):
     run_filter = RUNFILTER()
     run_filter.from_dict(matrixdata.__dict__)
 
@@ -446,21 +464,24 @@ async def matrixdatapost(matrixdata: MatrixdataModel):
 
 
 @router.get("/enginetype")
-async def get_enginetype(Competition: CompetitionEnum = Query(default="F1")):
+@run_in(sql_executor)
+def get_enginetype(Competition: CompetitionEnum = Query(default="F1")):
     p = PUAS3(Competition.name)
     return Response(p.get_enginetype().to_json(orient="split", date_format="iso"),
                     media_type="application/json")
 
 
 @router.get("/element")
-async def get_element(Competition: CompetitionEnum = Query(default="F1")):
+@run_in(sql_executor)
+def get_element(Competition: CompetitionEnum = Query(default="F1")):
     p = PUAS3(Competition.name)
     return Response(p.get_element().to_json(orient="split", date_format="iso"),
                     media_type="application/json")
 
 
 @router.get("/reference")
-async def get_reference(EngineType: List[str] = Query(default=[]),
+@run_in(sql_executor)
+def get_reference(EngineType: List[str] = Query(default=[]),
                         Element: List[str] = Query(default=[]),
                         Competition: CompetitionEnum = Query(default="F1")):
     p = PUAS3(Competition.name)
@@ -0,0 +1,94 @@
+from collections import OrderedDict
+import hashlib
+import threading
+
+import numpy as np
+
+
+class Axis:
+    """The edges of the bins of a histogram axis, as read-only arrays.
+
+    Attributes:
+        key: The (axis variable, hash of the edges) key of the axis.
+        left: The left edge of each bin.
+        right: The right edge of each bin.
+    """
+
+    def __init__(self, key: tuple[str, str], edges: np.ndarray):
+        self.key = key
+        edges = np.array(edges, dtype=float)
+        edges.flags.writeable = False
+        self.left = edges[:-1]
+        self.right = edges[1:]
+
+    def __len__(self) -> int:
+        return len(self.left)
+
+
+class AxisRegistry:
+    """Process-wide cache of the histogram axes.
+
+    The axes almost never change between the runs of a season: an axis is
+    built once per distinct (axis variable, edges) and shared by every
+    request, as well as the grid of the bins of each pair of Histo2D axes.
+    The least recently used entries are dropped above max_entries.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._axes = OrderedDict()
+        self._grids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, entries: OrderedDict, key: tuple, build):
+        """Get an entry, building it if needed, and marks it as recently
+        used.
+        """
+        with self._lock:
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                return entry
+        entry = build()
+        with self._lock:
+            entry = entries.setdefault(key, entry)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        return entry
+
+    def get_axis(self, var: str, edges: np.ndarray) -> Axis:
+        """Get the axis of a run.
+
+        Args:
+            var: The axis variable (ie. 'var_xAxis').
+            edges: The 'Value' column of the axis variable.
+
+        Returns:
+            The axis, the same object for every run with the same edges.
+        """
+        edges = np.ascontiguousarray(edges, dtype=float)
+        key = (var, hashlib.blake2b(edges.tobytes(), digest_size=16).hexdigest())
+        return self._get(self._axes, key, lambda: Axis(key, edges))
+
+    def get_grid(self, y_axis: Axis, x_axis: Axis) -> np.ndarray:
+        """Get the bins of a Histo2D, the y axis first then the x axis.
+
+        Args:
+            y_axis: The y axis of the matrix.
+            x_axis: The x axis of the matrix.
+
+        Returns:
+            A read-only (bins, 4) array with the columns y_Left, y_Right,
+            x_Left and x_Right, in the order of itertools.product on the
+            y bins then the x bins.
+        """
+        def build() -> np.ndarray:
+            grid = np.column_stack([
+                np.repeat(y_axis.left, len(x_axis)),
+                np.repeat(y_axis.right, len(x_axis)),
+                np.tile(x_axis.left, len(y_axis)),
+                np.tile(x_axis.right, len(y_axis))])
+            grid.flags.writeable = False
+            return grid
+
+        return self._get(self._grids, (y_axis.key, x_axis.key), build)
@@ -1,5 +1,4 @@
 from datetime import datetime
-import json
 import logging
 import time
 
@@ -43,49 +42,48 @@ class CDCData(PARQUET):
             data: the data for a given run retrieved either from parquet or cache.
         """
         t0 = time.time()
-        runvar = {'Duration': np.empty(0, dtype=float), 'Occurrences': np.empty(0, dtype=float),
-                  'LapCount': np.empty(0, dtype=float), 'Identifier': np.empty(0),
-                  'CDCLimitUID': np.empty(0, dtype=np.dtype('U36')),
-                  'CDCUID': np.empty(0, dtype=np.dtype('U36'))}
-        
-        if not agg_requested:
-            runvar['RunUID'] = np.empty(0, dtype=np.dtype('U36'))
-
-        for id_, var, limitUID in zip(run_cdc_data['Identifier'],
-                                      run_cdc_data['CDCUID'],
-                                      run_cdc_data['CDCLimitUID']):
-            
+        # first pass: keep the CDCs with data and count their laps
+        present = []
+        for position, var in enumerate(run_cdc_data['CDCUID']):
             if not var in data:
                 continue
-            js = json.loads(data[var])
-            if not js:
+            table = data[var]
+            if self._is_empty(table):
                 continue
-            lap_count = len(js) - 1
-            runvar['Duration'] = np.append(runvar['Duration'], np.array(
-                [js[i]['0'] for i in js][1:], dtype=float))
-
-            runvar['Occurrences'] = np.append(runvar['Occurrences'],
-                                             np.array([js[i]['1'] for i in js][1:], dtype=float))
-
-            runvar['LapCount'] = np.append(
-                runvar['LapCount'], np.arange(1, lap_count + 1, dtype=int))
-
-            runvar['Identifier'] = np.append(
-                runvar['Identifier'], np.full(lap_count, id_))
-
-            runvar['CDCUID'] = np.append(runvar['CDCUID'], np.full(
-                lap_count, var, dtype=np.dtype('U36')))
-
-            runvar['CDCLimitUID'] = np.append(runvar['CDCLimitUID'], np.full(
-                lap_count, limitUID, dtype=np.dtype('U36')))
+            present.append((position, table))
+
+        lap_counts = np.array([table.num_columns - 1 for _, table in present],
+                              dtype=int)
+        positions = np.array([position for position, _ in present], dtype=int)
+        total = lap_counts.sum()
+
+        # second pass: fill the preallocated arrays, one slice per CDC
+        duration = np.empty(total, dtype=float)
+        occurrences = np.empty(total, dtype=float)
+        ends = np.cumsum(lap_counts)
+        for (_, table), end in zip(present, ends):
+            values = self._table_values(table, skip=1)
+            duration[end - values.shape[1]:end] = values[0]
+            occurrences[end - values.shape[1]:end] = values[1]
+
+        # lap number inside each CDC: 1..lap_count
+        lap_count = np.arange(total, dtype=float) + 1
+        lap_count -= np.repeat(ends - lap_counts, lap_counts)
+
+        # UIDs are integer-coded, the categories are shared by all the runs
+        rows = np.repeat(positions, lap_counts)
+        runvar = {'Duration': duration, 'Occurrences': occurrences,
+                  'LapCount': lap_count,
+                  'Identifier': run_cdc_data['Identifier'].to_numpy()[rows],
+                  'CDCLimitUID': self._categorical(
+                      run_cdc_data['CDCLimitUID'], rows),
+                  'CDCUID': self._categorical(run_cdc_data['CDCUID'], rows)}
 
         if agg_requested:
-            runvar['RunUID_index'] = np.full(runvar['CDCUID'].size,
-                                             0, dtype=int)
+            runvar['RunUID_index'] = np.full(total, 0, dtype=int)
         else:
-              runvar['RunUID'] = np.full(runvar['CDCUID'].size,
-                                         uid, dtype=np.dtype('U36'))
-        
+            runvar['RunUID_index'] = self._run_index([uid], [total])
+
         t1 = time.time()
         limit, duration = 0.5, t1-t0
         if duration > limit:
@@ -93,6 +91,23 @@ class CDCData(PARQUET):
                             f"""[{duration:.3f}s]""", stacklevel=2)
         return runvar
 
+    @staticmethod
+    def _categorical(column: pd.Series, rows: np.ndarray) -> pd.Categorical:
+        """Select rows of a CDC info column as a categorical.
+
+        The categories are the sorted unique values of the column, so the
+        runs sharing the same CDC list can be concatenated without decoding
+        the UIDs, and the groupby of the aggregation keeps the order of
+        the strings.
+
+        Args:
+            column: A column of the CDC informations of the run.
+            rows: The positions of the rows to select.
+        """
+        categories = pd.Index(pd.unique(column.to_numpy())).sort_values()
+        codes = categories.get_indexer(column.to_numpy())
+        return pd.Categorical.from_codes(codes[rows], categories=categories)
+
     def process_data(self, update: bool,
                      agg: CatanaAggregationEnum | list[CatanaAggregationEnum]) -> tuple[pd.DataFrame, pd.DataFrame]:
         """Process the data for a CDCData instance.
@@ -180,12 +195,14 @@ class CDCData(PARQUET):
         
         latest_run = {'run_date': 0}
         for u in dict_runUID:
-            meta_file = json.loads(meta_files[u]['detailed_meta_file'])
-            if not meta_file:
+            meta_file = meta_files[u]['detailed_meta_file']
+            if self._is_empty(meta_file):
                 cdc[u] = pd.DataFrame()
                 continue
 
-            run_start = meta_file['StartTime']['0']
+            run_start = self._first_value(meta_file, 'StartTime')
+            if isinstance(run_start, datetime):   # epoch in ms, as in JSON
+                run_start = pd.Timestamp(run_start).value // 1_000_000
             if run_start < 1262304000000: #   01/01/2010 00:00:00.000
                 start_time = datetime.fromtimestamp(run_start/1_000)\
                         .isoformat('T', 'milliseconds')
@@ -193,9 +210,11 @@ class CDCData(PARQUET):
                              f""" [{start_time}]""")
             if run_start > latest_run['run_date']:
                 latest_run['run_date'] = run_start
-                latest_run['run_tag'] = meta_file['Type']['0']
-                latest_run['engine_type'] = meta_file['EngineType']['0']
-                latest_run['competition'] = meta_file['Competition']['0']
+                latest_run['run_tag'] = self._first_value(meta_file, 'Type')
+                latest_run['engine_type'] = self._first_value(meta_file,
+                                                              'EngineType')
+                latest_run['competition'] = self._first_value(meta_file,
+                                                              'Competition')
 
         if latest_run['run_date'] == 0:   # no run in the request
             return cdc
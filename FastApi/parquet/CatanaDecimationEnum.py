@@ -0,0 +1,10 @@
+from enum import Enum
+
+
+class CatanaDecimationEnum(str, Enum):
+    """
+        Enum of the downsampling methods of the channels.
+    """
+    LTTB = 'lttb'
+    MINMAX = 'minmax'
+    STRIDE = 'stride'
@@ -1,7 +1,160 @@
+import base64
+import json
+import os
+
+from fastapi import HTTPException
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
-from parquet.PARQUET import PARQUET
+from parquet.CatanaDecimationEnum import CatanaDecimationEnum
+from parquet.Decimation import decimate
+from parquet.PARQUET import (PARQUET, drop_pandas_index, get_disk_semaphore,
+                             io_pool, parquet_conf)
+
+# Folder of the min/max envelopes of the channels of a run, next to the
+# channels folder, with one sub-folder per decimation factor.
+PYRAMID_FOLDER = 'channels_pyramid'
+
+
+def get_pyramid_path(path: str, factor: int) -> str:
+    """Get the path of a level of the pyramid of a channel file.
+
+    Args:
+        path: The parquet file of the channel.
+        factor: The decimation factor of the level.
+
+    Returns:
+        The path of the envelope of the channel for this factor.
+    """
+    run_directory = os.path.dirname(os.path.dirname(path))
+    return os.path.join(run_directory, PYRAMID_FOLDER, f'x{factor}',
+                        os.path.basename(path))
+
+
+def select_pyramid_level(path: str, max_points: int) -> str:
+    """Choose the file to read for a channel downsampled to max_points.
+
+    The coarsest level of the pyramid with at least max_points rows is
+    chosen. The levels older than the channel file are ignored, they are
+    written again by the next ChannelPyramid job.
+
+    Args:
+        path: The parquet file of the channel.
+        max_points: The number of points requested.
+
+    Returns:
+        The path of the chosen level, or path if no level is fine enough.
+    """
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return path
+    for factor in sorted(parquet_conf['channel_pyramid_factors'], reverse=True):
+        level = get_pyramid_path(path, factor)
+        try:
+            if os.stat(level).st_mtime < mtime:
+                continue
+            if pq.read_metadata(level).num_rows >= max_points:
+                return level
+        except FileNotFoundError:
+            continue
+    return path
+
+
+def channel_time(column: pa.Array | pa.ChunkedArray) -> np.ndarray:
+    """Convert the Time column of a channel to the values sent to users.
+
+    Args:
+        column: The Time column, as stored in the parquet file.
+
+    Returns:
+        The times, in seconds.
+    """
+    return (column.to_pandas().astype(int)/1e3).to_numpy()
+
+
+def _time_overlaps(statistics: pq.Statistics | None, time_type: pa.DataType,
+                   windows: list[tuple[float | None, float | None]]) -> bool:
+    """Tell if a row group may hold times of the windows, from the
+    statistics of its Time column.
+    """
+    if statistics is None or not statistics.has_min_max:
+        return True
+    low, high = channel_time(pa.array([statistics.min, statistics.max],
+                                      type=time_type))
+    return any(not ((end_time is not None and low > end_time) or
+                    (start_time is not None and high < start_time))
+               for start_time, end_time in windows)
+
+
+def _time_mask(time: np.ndarray,
+               windows: list[tuple[float | None, float | None]]) -> np.ndarray:
+    """Tell which times are in at least one of the windows."""
+    mask = np.zeros(time.size, dtype=bool)
+    for start_time, end_time in windows:
+        window_mask = np.ones(time.size, dtype=bool)
+        if start_time is not None:
+            window_mask &= time >= start_time
+        if end_time is not None:
+            window_mask &= time <= end_time
+        mask |= window_mask
+    return mask
+
+
+def read_channel_page(path: str, offset: int, max_rows: int | None,
+                      windows: list[tuple[float | None, float | None]]) -> tuple[pa.Table, int | None]:
+    """Read a page of a channel file.
+
+    Only the row groups after the offset whose Time statistics overlap one
+    of the time windows are read.
+
+    Args:
+        path: The parquet file of the channel.
+        offset: The row of the file the page starts from.
+        max_rows: The maximum number of rows of the page, no limit if None.
+        windows: A list of (start, end) time windows in seconds, either
+        bound being None if the window is open.
+
+    Returns:
+        A 2-uplet (rows of the page within the window, row of the file
+        the next page starts from or None if the file has been read up to
+        the end).
+    """
+    tables = []
+    nb_rows = 0
+    with pq.ParquetFile(path, pre_buffer=True) as parquet_file:
+        metadata = parquet_file.metadata
+        schema = parquet_file.schema_arrow
+        time_index = schema.get_field_index('Time')
+        time_type = schema.field('Time').type
+        group_end = 0
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            group_start, group_end = group_end, group_end + row_group.num_rows
+            if group_end <= offset:
+                continue
+            if not _time_overlaps(row_group.column(time_index).statistics,
+                                  time_type, windows):
+                continue
+
+            skip = max(offset - group_start, 0)
+            table = parquet_file.read_row_group(i, use_threads=False).slice(skip)
+            rows = np.flatnonzero(_time_mask(channel_time(table.column('Time')),
+                                             windows))
+            if max_rows is not None and nb_rows + rows.size >= max_rows:
+                rows = rows[:max_rows - nb_rows]
+                tables.append(table.take(rows))
+                return (drop_pandas_index(pa.concat_tables(tables)),
+                        group_start + skip + int(rows[-1]) + 1)
+            tables.append(table.take(rows))
+            nb_rows += rows.size
+
+        if not tables:
+            tables.append(schema.empty_table())
+    return drop_pandas_index(pa.concat_tables(tables)), None
 
 
 class ChannelData(PARQUET):
@@ -10,6 +163,10 @@ class ChannelData(PARQUET):
     Specialized in treating raw Channels. This type of data is not cached.
     Getting the data might be longer than for other cached data types.
 
+    The channels can be restricted to time windows or laps, and read by
+    pages: after each page, next_cursor holds the continuation token to
+    pass to the next call, or None once every channel has been read.
+
     Raises:
         NotImplementedError: If an object of this class is created.
         HTTPException: If the competition passed when creating an object is unknown.
@@ -17,9 +174,12 @@ class ChannelData(PARQUET):
     def __init__(self, competition, variables, run_uid, years):
         data_type = CatanaDataTypeEnum.CHANNEL
         super().__init__(competition, variables, run_uid, years, data_type)
+        self.next_cursor = None
 
-    def _process_var(self, var: str, data: dict[str, pd.DataFrame], 
-                     dict_runUID: dict[str, list[str]]) -> list[pd.DataFrame]:
+    def _process_var(self, var: str, data: dict[str, pa.Table],
+                     dict_runUID: dict[str, list[str]],
+                     max_points: int | None = None,
+                     decimation: CatanaDecimationEnum = CatanaDecimationEnum.LTTB) -> list[pd.DataFrame]:
         """Process data from one var.
 
         The data is split by variables to be processed one by one.
@@ -27,23 +187,202 @@ class ChannelData(PARQUET):
         Args:
             var: The variable processed for this call.
             data: Channels data retreived either from the parquet files or the cache.
+            max_points: The maximum number of points of the channel of
+            each run, no downsampling if None.
+            decimation: The downsampling method, on the first column after
+            Time.
         """
         var_data = []
         for u in dict_runUID:
-            df = pd.DataFrame(data[u][var])
-            if df.empty:
+            table = data[u][var]
+            if self._is_empty(table):
                 continue
 
+            if max_points is not None and table.num_rows > max_points:
+                value_columns = [col for col in table.column_names if col != 'Time']
+                values = None
+                if value_columns:
+                    values = np.asarray(table.column(value_columns[0]).to_numpy(),
+                                        dtype=float)
+                table = table.take(decimate(channel_time(table.column('Time')),
+                                            values, max_points, decimation))
+
+            df = table.to_pandas()
             df['Time'] = df['Time'].astype(int)/1e3
-            df['RunUID'] = u
+            df['RunUID_index'] = self._run_index([u], [len(df)])
             var_data.append(df)
         return var_data
 
-    def process_data(self) -> dict[str, pd.DataFrame]:
+    @staticmethod
+    def _encode_cursor(offsets: dict[str, dict[str, int]],
+                       windows: dict[str, list[tuple[float | None, float | None]]],
+                       max_rows: int | None) -> str:
+        """Create the continuation token of the next page.
+
+        Args:
+            offsets: The row each channel of each run continues from, the
+            channels read up to the end are not listed.
+            windows: The time windows of each run.
+            max_rows: The maximum number of rows of a page, or None.
+
+        Returns:
+            An URL-safe token.
+        """
+        page = {'Offsets': offsets, 'MaxRows': max_rows,
+                'Windows': {uid: windows[uid] for uid in offsets}}
+        return base64.urlsafe_b64encode(json.dumps(page).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> dict:
+        """Read a continuation token created by _encode_cursor.
+
+        Raises:
+            HTTPException: If the token is invalid.
+        """
+        try:
+            page = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            offsets = {uid: {var: int(offset) for var, offset in variables.items()}
+                       for uid, variables in page['Offsets'].items()}
+            windows = {uid: [(start, end) for start, end in page['Windows'][uid]]
+                       for uid in offsets}
+            return {'Offsets': offsets, 'Windows': windows,
+                    'MaxRows': page['MaxRows']}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise HTTPException(status_code=400, detail='Invalid cursor.')
+
+    def read_channel_pages(self, dict_runUID: dict[str, list[str]],
+                           windows: dict[str, list[tuple[float | None, float | None]]] | None = None,
+                           max_rows: int | None = None,
+                           cursor: str | None = None) -> dict[str, dict[str, pa.Table]]:
+        """Read a page of each channel of each run, and set next_cursor.
+
+        The time windows and the size of the pages of a cursor replace the
+        ones passed as arguments.
+
+        Args:
+            dict_runUID: a dict {runUID: list(channels requested)}
+            windows: The (start, end) time windows of each run, in
+            seconds, or None for the whole runs. A run without window is
+            not read.
+            max_rows: The maximum number of rows of each channel of each
+            run, or None.
+            cursor: The token returned with the previous page, or None for
+            the first page.
+
+        Returns:
+            A dict where the keys are runUIDs and the values is a dict with
+            keys and values are Arrow tables of the page of each channel.
+
+        Raises:
+            HTTPException: If there is a different number of runUIDs and
+            Years, or if the cursor is invalid.
+        """
+        if len(dict_runUID) != len(self.years):
+            raise HTTPException(
+                status_code=400,
+                detail='RunUID and Years do not have the same lenght.')
+
+        offsets = None
+        if cursor is not None:
+            page = self._decode_cursor(cursor)
+            offsets, windows = page['Offsets'], page['Windows']
+            max_rows = page['MaxRows']
+        if windows is None:
+            windows = {uid: [(None, None)] for uid in dict_runUID}
+
+        files = [file for file in
+                 self._get_files_names(self.data_type, dict_runUID, self.years)
+                 if windows.get(file[0])
+                 and (offsets is None or file[1] in offsets.get(file[0], {}))]
+
+        def read_page(file: tuple[str, str, str]) -> tuple[str, str, pa.Table, int | None]:
+            uid, var, path = file
+            if not os.path.exists(path):
+                return uid, var, pa.table({}), None
+            offset = 0 if offsets is None else offsets[uid][var]
+            with get_disk_semaphore(self.disk):
+                table, next_offset = read_channel_page(path, offset, max_rows,
+                                                       windows[uid])
+            return uid, var, table, next_offset
+
+        result = {uid: {var: pa.table({}) for var in variables}
+                  for uid, variables in dict_runUID.items()}
+        next_offsets = {}
+        for uid, var, table, next_offset in io_pool.map(read_page, files):
+            result[uid][var] = table
+            if next_offset is not None:
+                next_offsets.setdefault(uid, {})[var] = next_offset
+
+        self.next_cursor = None
+        if next_offsets:
+            self.next_cursor = self._encode_cursor(next_offsets, windows,
+                                                   max_rows)
+        return result
+
+    def read_pyramid_files(self, dict_runUID: dict[str, list[str]],
+                           max_points: int) -> dict[str, dict[str, pa.Table]]:
+        """Read each channel of each run from the coarsest level of its
+        pyramid holding at least max_points rows (see
+        select_pyramid_level), or from the channel file.
+
+        Args:
+            dict_runUID: a dict {runUID: list(channels requested)}
+            max_points: The number of points requested.
+
+        Returns:
+            A dict where the keys are runUIDs and the values is a dict with
+            keys and values are Arrow tables of the data of each channel.
+
+        Raises:
+            HTTPException: If there is a different number of runUIDs and
+            Years.
+        """
+        if len(dict_runUID) != len(self.years):
+            raise HTTPException(
+                status_code=400,
+                detail='RunUID and Years do not have the same lenght.')
+
+        def read_level(file: tuple[str, str, str]) -> tuple[str, str, pa.Table]:
+            uid, var, path = file
+            return self.read_parquet_file(
+                (uid, var, select_pyramid_level(path, max_points)))
+
+        files = self._get_files_names(self.data_type, dict_runUID, self.years)
+        result = {uid: {} for uid in dict_runUID}
+        for uid, var, table in io_pool.map(read_level, files):
+            result[uid][var] = table
+        return result
+
+    def process_data(self, start_time: float | None = None,
+                     end_time: float | None = None,
+                     max_rows: int | None = None,
+                     cursor: str | None = None,
+                     laps: list[int] | int | None = None,
+                     max_points: int | None = None,
+                     decimation: CatanaDecimationEnum | None = None) -> dict[str, pd.DataFrame]:
         """Process the data for a ChannelData instance.
 
         Gets the data from the parquet files.
-        Regroups data in a dict where keys are variables and values are pd.DataFrame. 
+        Regroups data in a dict where keys are variables and values are pd.DataFrame.
+
+        With a time window, laps, a maximum number of rows or a cursor,
+        only the matching rows of a page of each channel are read (see
+        read_channel_pages).
+
+        Args:
+            start_time: The first time of the window (in seconds), or None.
+            end_time: The last time of the window (in seconds), or None.
+            max_rows: The maximum number of rows of each channel of each
+            run, or None.
+            cursor: The token of the page to read, next_cursor after the
+            previous page.
+            laps: The LapCounts to read, converted to time windows with
+            the lap informations, or None.
+            max_points: The maximum number of points of each channel of
+            each run (of each page), after reading. No downsampling if
+            None. Without time window nor pages, the channels are read
+            from their pyramid when possible (see read_pyramid_files).
+            decimation: The downsampling method, lttb by default.
 
         Return:
             A dict with the channels names as keys and a pd.DataFrame with the channels data.
@@ -53,10 +392,30 @@ class ChannelData(PARQUET):
         """
         dict_runUID = self.create_dict_runUID()
 
-        data = self.read_files(data_type=self.data_type, dict_runUID=dict_runUID,
-                               years=self.years)
+        laps = self._check_if_list(laps) if laps else None
+        if laps is not None:
+            windows = {uid: [(start, end) for _, start, end in run_windows]
+                       for uid, run_windows in
+                       self._get_lap_windows(laps, start_time, end_time).items()}
+        elif start_time is not None or end_time is not None:
+            windows = {uid: [(start_time, end_time)] for uid in dict_runUID}
+        else:
+            windows = None
+
+        if windows is None and max_rows is None and cursor is None:
+            if max_points is None:
+                data = self.read_files(data_type=self.data_type,
+                                       dict_runUID=dict_runUID, years=self.years)
+            else:
+                data = self.read_pyramid_files(dict_runUID, max_points)
+        else:
+            data = self.read_channel_pages(dict_runUID, windows, max_rows,
+                                           cursor)
 
-        res = {var: self._process_var(var, data, dict_runUID) for var in self.variables}
+        decimation = decimation or CatanaDecimationEnum.LTTB
+        res = {var: self._process_var(var, data, dict_runUID, max_points,
+                                      decimation)
+               for var in self.variables}
         if not any(res.values()):
             return dict()
         res = {var: pd.concat(l, axis='index', ignore_index=True).copy()
@@ -0,0 +1,88 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+
+from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
+from parquet.Channel import get_pyramid_path
+from parquet.CompactRun import CompactRun
+from parquet.Decimation import envelope_indices
+from parquet.PARQUET import io_pool, parquet_conf
+
+logger = logging.getLogger('main_log')
+
+
+class ChannelPyramid(CompactRun):
+    """Job writing the multi-resolution versions of the channels of runs.
+
+    For each decimation factor of parquet_conf.yml, the level keeps the
+    samples holding the minimum and the maximum of each bucket of factor
+    consecutive samples (on the first column after Time), so the extrema
+    of the channel are exact at every level. ChannelData reads the
+    coarsest level fine enough for the MaxPoints requested. The job has to
+    be run again once the channels are updated, the levels older than
+    their channel are ignored.
+    """
+
+    def __init__(self, competition, run_uid, years):
+        super().__init__(competition, run_uid, years, CatanaDataTypeEnum.CHANNEL)
+
+    def process_data(self) -> list[tuple[str, int]]:
+        """Write the pyramid of every channel of every run of the instance.
+
+        Returns:
+            A list of 2-uplet (level file path, number of rows).
+        """
+        dict_runUID = self.create_dict_runUID()
+        folder = self.folder_datatype[self.data_type]
+        for uid, year in zip(dict_runUID, self.years):
+            dict_runUID[uid] = self._list_files(f'{self.parquet_path}{str(year)}/{uid}/{folder}')
+        files = self._get_files_names(self.data_type, dict_runUID, self.years)
+
+        written = []
+        for levels in io_pool.map(self._write_levels, files):
+            written.extend(levels)
+        return written
+
+    def _write_levels(self, file: tuple[str, str, str]) -> list[tuple[str, int]]:
+        """Write the levels of the pyramid of one channel.
+
+        Args:
+            file: A 3-uplet (runUID, variable, file_path).
+
+        Returns:
+            A list of 2-uplet (level file path, number of rows), without
+            the levels which would not be smaller than the channel.
+        """
+        _, _, path = file
+        _, _, table = self.read_parquet_file(file)
+        value_columns = [col for col in table.column_names if col != 'Time']
+        if not value_columns:
+            return []
+        values = np.asarray(table.column(value_columns[0]).to_numpy(), dtype=float)
+
+        written = []
+        for factor in sorted(parquet_conf['channel_pyramid_factors']):
+            if table.num_rows <= 2 * factor:
+                break
+            level = table.take(envelope_indices(values, factor))
+            level_path = get_pyramid_path(path, factor)
+            os.makedirs(os.path.dirname(level_path), exist_ok=True)
+            self.write_compacted_file(level_path, level)
+            written.append((level_path, level.num_rows))
+        return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--competition', type=str, help='Competition of the runs', required=True)
+    parser.add_argument('-r', '--runuids', type=str, nargs='+', help='RunUIDs to process', required=True)
+    parser.add_argument('-y', '--years', type=int, nargs='+', help='Years of the RunUIDs, in the same order',
+                        required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    job = ChannelPyramid(args.competition, args.runuids, list(args.years))
+    for path, nb_rows in job.process_data():
+        logger.info(f' {nb_rows} rows written in {path}')
@@ -0,0 +1,100 @@
+import argparse
+import logging
+import os
+
+import pyarrow.parquet as pq
+
+from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
+from parquet.PARQUET import COMPACTED_FILE_NAME, compact_tables, io_pool
+from parquet.WRITEPARQUET import WRITEPARQUET
+
+logger = logging.getLogger('main_log')
+
+
+class CompactRun(WRITEPARQUET):
+    """Compaction job of the parquet files of a data type.
+
+    Merges the per-variable files of each run in one file read with a
+    single open by PARQUET.read_files. The per-variable files are kept,
+    they stay the reference written by the computations: a variable
+    updated after the compaction is read from its own file until the job
+    is run again.
+    """
+
+    def __init__(self, competition, run_uid, years, data_type):
+        super().__init__(competition, [], run_uid, years, data_type)
+
+    def process_data(self) -> list[tuple[str, int]]:
+        """Compact the files of every run of the instance.
+
+        Returns:
+            A list of 2-uplet (compacted file path, number of variables).
+        """
+        dict_runUID = self.create_dict_runUID()
+        folder = self.folder_datatype[self.data_type]
+        for uid, year in zip(dict_runUID, self.years):
+            dict_runUID[uid] = self._list_files(f'{self.parquet_path}{str(year)}/{uid}/{folder}')
+        files = self._get_files_names(self.data_type, dict_runUID, self.years)
+        # always from the per-variable files, never from a previous compaction
+        tables = {uid: {} for uid in dict_runUID}
+        for uid, var, table in io_pool.map(self.read_parquet_file, files):
+            tables[uid][var] = table
+
+        written = []
+        for uid, year in zip(dict_runUID, self.years):
+            if not tables[uid]:
+                continue
+            path = f'{self.parquet_path}{str(year)}/{uid}/{folder}{COMPACTED_FILE_NAME}'
+            self.write_compacted_file(path, compact_tables(tables[uid]))
+            written.append((path, len(tables[uid])))
+        return written
+
+    @staticmethod
+    def _list_files(directory: str) -> list[str]:
+        """List the variables written in a folder, axes included (unlike
+        list_variables).
+
+        Args:
+            directory: The data type folder of a run.
+
+        Returns:
+            The variables with a per-variable file in the folder.
+        """
+        try:
+            entries = [entry.name for entry in os.scandir(directory)]
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.parquet')] for name in entries
+                      if name.endswith('.parquet') and not name.startswith('_'))
+
+    @staticmethod
+    def write_compacted_file(path: str, table):
+        """Write a compacted file without exposing a partial file to the
+        readers.
+
+        Args:
+            path: The compacted file path.
+            table: The table returned by compact_tables.
+        """
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--competition', type=str, help='Competition of the runs', required=True)
+    parser.add_argument('-r', '--runuids', type=str, nargs='+', help='RunUIDs to compact', required=True)
+    parser.add_argument('-y', '--years', type=int, nargs='+', help='Years of the RunUIDs, in the same order',
+                        required=True)
+    parser.add_argument('-t', '--data-types', type=str, nargs='+', help='Data types to compact',
+                        default=[CatanaDataTypeEnum.LAPDATA.value, CatanaDataTypeEnum.RUNDATA.value,
+                                 CatanaDataTypeEnum.OTHER.value, CatanaDataTypeEnum.HISTO.value,
+                                 CatanaDataTypeEnum.HISTO2D.value, CatanaDataTypeEnum.HISTOLAPDATA.value])
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    for data_type in args.data_types:
+        job = CompactRun(args.competition, args.runuids, list(args.years), CatanaDataTypeEnum(data_type))
+        for path, nb_variables in job.process_data():
+            logger.info(f' {nb_variables} variables compacted in {path}')
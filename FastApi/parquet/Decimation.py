@@ -0,0 +1,136 @@
+import numpy as np
+
+from parquet.CatanaDecimationEnum import CatanaDecimationEnum
+
+
+def stride_indices(nb_points: int, max_points: int) -> np.ndarray:
+    """Select evenly spaced points, the first and the last ones included.
+
+    Args:
+        nb_points: The number of points of the channel.
+        max_points: The maximum number of points to keep.
+
+    Returns:
+        The sorted positions of the points kept.
+    """
+    if nb_points <= max_points:
+        return np.arange(nb_points)
+    return np.unique(np.linspace(0, nb_points - 1, max_points).round().astype(int))
+
+
+def envelope_indices(values: np.ndarray, bucket_size: int) -> np.ndarray:
+    """Keep the minimum and the maximum of each bucket of bucket_size
+    consecutive points, and the first and last points.
+
+    NaN values are never selected unless a bucket only holds NaN values.
+
+    Args:
+        values: The values of the channel.
+        bucket_size: The number of points of each bucket.
+
+    Returns:
+        The sorted positions of the points kept.
+    """
+    nb_points = values.size
+    if nb_points == 0:
+        return np.arange(0)
+    nb_buckets = -(-nb_points // bucket_size)   # ceil
+    padded = np.full(nb_buckets * bucket_size, np.nan)
+    padded[:nb_points] = values
+    padded = padded.reshape(nb_buckets, bucket_size)
+    starts = np.arange(nb_buckets) * bucket_size
+    nan = np.isnan(padded)
+    mins = np.where(nan, np.inf, padded).argmin(axis=1) + starts
+    maxs = np.where(nan, -np.inf, padded).argmax(axis=1) + starts
+    indices = np.concatenate([[0, nb_points - 1], mins, maxs])
+    return np.unique(indices[indices < nb_points])
+
+
+def minmax_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """Keep the minimum and the maximum of buckets of consecutive points.
+
+    The extrema of the channel are always kept, as well as its first and
+    last points (see envelope_indices).
+
+    Args:
+        values: The values of the channel.
+        max_points: The maximum number of points to keep, at least 4.
+
+    Returns:
+        The sorted positions of the points kept.
+    """
+    nb_points = values.size
+    if nb_points <= max_points:
+        return np.arange(nb_points)
+    if max_points < 4:
+        return stride_indices(nb_points, max_points)
+
+    nb_buckets = (max_points - 2) // 2
+    return envelope_indices(values, -(-nb_points // nb_buckets))
+
+
+def lttb_indices(time: np.ndarray, values: np.ndarray,
+                 max_points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are kept. The other points are split in
+    max_points - 2 buckets, and the point of each bucket forming the
+    largest triangle with the point kept in the previous bucket and the
+    mean of the next bucket is kept.
+
+    Args:
+        time: The times of the channel, in ascending order.
+        values: The values of the channel.
+        max_points: The number of points to keep, at least 3.
+
+    Returns:
+        The sorted positions of the points kept.
+    """
+    nb_points = values.size
+    if nb_points <= max_points:
+        return np.arange(nb_points)
+    if max_points < 3:
+        return stride_indices(nb_points, max_points)
+
+    # bucket i is [edges[i], edges[i + 1]), the last one being the last point
+    edges = np.linspace(1, nb_points - 1, max_points - 1).astype(int)
+    edges = np.append(edges, nb_points)
+    # mean of each bucket, the point following the last bucket is the last point
+    with np.errstate(invalid='ignore'):
+        sizes = np.diff(edges)
+        mean_time = np.add.reduceat(time, edges[:-1]) / sizes
+        mean_values = np.add.reduceat(np.nan_to_num(values), edges[:-1]) / sizes
+
+    indices = np.empty(max_points, dtype=int)
+    indices[0] = 0
+    indices[-1] = nb_points - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        area = np.abs((time[a] - mean_time[i + 1]) * (values[start:stop] - values[a])
+                      - (time[a] - time[start:stop]) * (mean_values[i + 1] - values[a]))
+        area[np.isnan(area)] = -1
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def decimate(time: np.ndarray, values: np.ndarray | None, max_points: int,
+             decimation: CatanaDecimationEnum) -> np.ndarray:
+    """Select the points of a channel to send for a plot.
+
+    Args:
+        time: The times of the channel, in ascending order.
+        values: The values of the channel, or None if it has no value
+        column (stride is then used).
+        max_points: The maximum number of points to keep.
+        decimation: The downsampling method.
+
+    Returns:
+        The sorted positions of the points kept.
+    """
+    if values is None or decimation is CatanaDecimationEnum.STRIDE:
+        return stride_indices(time.size, max_points)
+    if decimation is CatanaDecimationEnum.MINMAX:
+        return minmax_indices(values, max_points)
+    return lttb_indices(time, values, max_points)
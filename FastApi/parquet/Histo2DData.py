@@ -1,18 +1,20 @@
-from itertools import chain, product
-import json
+from itertools import chain
 import logging
 import time
 
 import numpy as np
 import pandas as pd
 
+from cache.cache_decorator import aggregatecache
 from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
 from parquet.CatanaAggregationEnum import CatanaAggregationEnum
-from parquet.PARQUET import PARQUET
+from parquet.PARQUET import PARQUET, axis_registry
 
 logger = logging.getLogger('main_log')
 
 class Histo2DData(PARQUET):
+    axis_suffixes = ('_xAxis', '_yAxis')
+
     def __init__(self, competition, variables, run_uid, years):
         data_type = CatanaDataTypeEnum.HISTO2D
         super().__init__(competition, variables, run_uid, years, data_type)
@@ -32,46 +34,46 @@ class Histo2DData(PARQUET):
 
         """
         var_data = {}
-        data_len = 0
         has_data = []
+        axes = []
+        runs_values = []
         for u in dict_runUID:
             if not var in data[u]:
                 continue
 
-            js = json.loads(data[u][var])
+            table = data[u][var]
 
-            if not js:
+            if self._is_empty(table):
                 continue
 
             has_data.append(u)
-            if not var_data:
-                (x_left, x_right) = self._create_interval(
-                    data, u, var + '_xAxis')
-                (y_left, y_right) = self._create_interval(
-                    data, u, var + '_yAxis')
-                data_len = len(x_left) * len(y_left)
-                var_data[var] = np.empty(0, dtype=float)
-
-            var_run_data = np.array(list(js['Run'].values()), dtype=float)
-            var_data[var] = np.append(var_data[var], var_run_data)
-
-        if var_data:
+            axes.append((self._get_axis(data, u, var + '_yAxis'),
+                         self._get_axis(data, u, var + '_xAxis')))
+            runs_values.append(self._column_values(table, 'Run'))
+
+        if has_data:
+            var_data[var] = np.concatenate(runs_values, dtype=float)
+            grids = [axis_registry.get_grid(y_axis, x_axis)
+                     for y_axis, x_axis in axes]
+            same_y = self._check_axes(var + '_yAxis', has_data,
+                                      [y_axis for y_axis, _ in axes])
+            same_x = self._check_axes(var + '_xAxis', has_data,
+                                      [x_axis for _, x_axis in axes])
+            if same_y and same_x:
+                grid = np.tile(grids[0], (len(grids), 1))
+            else:   # each run keeps its own bins
+                grid = np.concatenate(grids)
+            var_data['y_Left'] = grid[:, 0]
+            var_data['y_Right'] = grid[:, 1]
+            var_data['x_Left'] = grid[:, 2]
+            var_data['x_Right'] = grid[:, 3]
             if not to_agg:
-                uid_list = [u_ for u_ in has_data for _ in range(data_len)]
-                var_data['RunUID'] = np.array(uid_list, dtype=np.dtype('U36'))
-
-            var_size = var_data[var].size
-            times_repeat = var_size // data_len
-            grid = np.array(
-                list(product(zip(y_left, y_right), zip(x_left, x_right))),
-                dtype=float)
-            var_data['y_Left'] = np.tile(grid[:, 0, 0], times_repeat)
-            var_data['y_Right'] = np.tile(grid[:, 0, 1], times_repeat)
-            var_data['x_Left'] = np.tile(grid[:, 1, 0], times_repeat)
-            var_data['x_Right'] = np.tile(grid[:, 1, 1], times_repeat)
+                var_data['RunUID_index'] = self._run_index(
+                    has_data, [len(grid) for grid in grids])
 
         return var_data
 
+    @aggregatecache
     def process_data(self, update: bool,
                      agg: list[CatanaAggregationEnum]|CatanaAggregationEnum) -> dict[str, pd.DataFrame]:
         """
@@ -89,7 +91,7 @@ class Histo2DData(PARQUET):
             agg = [CatanaAggregationEnum.SUM]
 
         variables_with_axes = list(chain.from_iterable(
-            (var, var + '_xAxis', var + '_yAxis') for var in self.variables))
+            (var, *(var + suffix for suffix in self.axis_suffixes)) for var in self.variables))
         dict_runUID = self.create_dict_runUID(variables=variables_with_axes)
 
         data = self.cached_read_files(data_type=self.data_type,
@@ -120,10 +122,15 @@ class Histo2DData(PARQUET):
             if df.empty:
                 continue
             if agg_requested:
-                dict_agg = {var: [a.value for a in agg],
-                            'y_Right': 'first', 'x_Right': 'first'}
-                df = self._aggregate_df(df, by = ['y_Left', 'x_Left'],
-                                                agg_=dict_agg)
+                aggregated = self._aggregate_bins(
+                    df, var, by=['y_Left', 'x_Left'],
+                    firsts=['y_Right', 'x_Right'], agg=agg)
+                if aggregated is None:
+                    dict_agg = {var: [a.value for a in agg],
+                                'y_Right': 'first', 'x_Right': 'first'}
+                    aggregated = self._aggregate_df(df, by = ['y_Left', 'x_Left'],
+                                                    agg_=dict_agg)
+                df = aggregated
             else:
                 df = self._encode_run_uid(df)
 
@@ -1,11 +1,11 @@
 from itertools import chain
-import json
 import logging
 import time
 
 import numpy as np
 import pandas as pd
 
+from cache.cache_decorator import aggregatecache
 from parquet.CatanaAggregationEnum import CatanaAggregationEnum
 from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
 from parquet.PARQUET import PARQUET
@@ -13,6 +13,8 @@ from parquet.PARQUET import PARQUET
 logger = logging.getLogger('main_log')
 
 class HistoData(PARQUET):
+    axis_suffixes = ('_xAxis',)
+
     def __init__(self, competition, variables, run_uid, years):
         data_type = CatanaDataTypeEnum.HISTO
         super().__init__(competition, variables, run_uid, years, data_type)
@@ -32,42 +34,37 @@ class HistoData(PARQUET):
 
         """
         var_data = {}
-        data_len = 0
         runs_with_data = []
+        axes = []
+        runs_values = []
         for u in dict_runUID:
             if not var in data[u]:
                 continue
 
-            js = json.loads(data[u][var])
+            table = data[u][var]
 
-            if not js:
+            if self._is_empty(table):
                 continue
             
             runs_with_data.append(u)
-            if not var_data:  # une variable à toujours le même axis, pas besoin de le regarder à chaque fois
-                (x_left, x_right) = self._create_interval(
-                    data, u, var + '_xAxis')
-                data_len = len(x_left)
-                var_data[var] = np.empty(0, dtype=float)
-                # var_data['RunUID'] = np.empty(0, dtype=np.dtype('U36'))
-
-            var_run_data = np.array(list(js['Run'].values()))
-            var_data[var] = np.append(var_data[var], var_run_data)
-            # var_data['RunUID'] = np.append(
-            #     var_data['RunUID'], np.full(data_len, u, dtype=np.dtype('U36')))
-
-        if var_data:
+            axes.append(self._get_axis(data, u, var + '_xAxis'))
+            runs_values.append(self._column_values(table, 'Run'))
+
+        if runs_with_data:
+            var_data[var] = np.concatenate(runs_values, dtype=float)
+            if self._check_axes(var + '_xAxis', runs_with_data, axes):
+                var_data['Left'] = np.tile(axes[0].left, len(axes))
+                var_data['Right'] = np.tile(axes[0].right, len(axes))
+            else:   # each run keeps its own bins
+                var_data['Left'] = np.concatenate([axis.left for axis in axes])
+                var_data['Right'] = np.concatenate([axis.right for axis in axes])
             if not agg_requested:
-                uids = [u_ for u_ in runs_with_data for _ in range(data_len)]
-                var_data['RunUID'] = np.array(uids, dtype=np.dtype('U36'))
-            var_size = var_data[var].size
-            times_to_add = (var_size // data_len)
-
-            var_data['Left'] = np.tile(x_left, times_to_add)
-            var_data['Right'] = np.tile(x_right, times_to_add)
+                var_data['RunUID_index'] = self._run_index(
+                    runs_with_data, [len(axis) for axis in axes])
 
         return var_data
 
+    @aggregatecache
     def process_data(self, update: bool,
                      agg: list[CatanaAggregationEnum]|CatanaAggregationEnum) -> dict[str, pd.DataFrame]:
         """
@@ -86,7 +83,7 @@ class HistoData(PARQUET):
             agg = [CatanaAggregationEnum.SUM]
 
         variables_with_axes = list(chain.from_iterable(
-            (var, var + '_xAxis') for var in self.variables))
+            (var, *(var + suffix for suffix in self.axis_suffixes)) for var in self.variables))
         dict_runUID = self.create_dict_runUID(variables=variables_with_axes)
 
         data = self.cached_read_files(data_type = self.data_type,
@@ -118,9 +115,13 @@ class HistoData(PARQUET):
             if df.empty:
                 continue
             if agg_requested:
-                dict_agg = {var:[a.value for a in agg],
-                            'Right': 'first'}
-                df = self._aggregate_df(df, by=['Left'], agg_=dict_agg)
+                aggregated = self._aggregate_bins(df, var, by=['Left'],
+                                                  firsts=['Right'], agg=agg)
+                if aggregated is None:
+                    dict_agg = {var:[a.value for a in agg],
+                                'Right': 'first'}
+                    aggregated = self._aggregate_df(df, by=['Left'], agg_=dict_agg)
+                df = aggregated
             else:
                 df = self._encode_run_uid(df)
 
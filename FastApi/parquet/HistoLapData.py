@@ -1,11 +1,11 @@
 from itertools import chain
-import json
 import logging
 import time
 
 import numpy as np
 import pandas as pd
 
+from cache.cache_decorator import aggregatecache
 from parquet.CatanaAggregationEnum import CatanaAggregationEnum
 from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
 from parquet.PARQUET import PARQUET
@@ -14,84 +14,81 @@ logger = logging.getLogger('main_log')
 
 
 class HistoLapData(PARQUET):
+    axis_suffixes = ('_xAxis',)
+
     def __init__(self, competition, variables, run_uid, years):
         data_type = CatanaDataTypeEnum.HISTOLAPDATA
         super().__init__(competition, variables, run_uid, years, data_type)
 
     def _process_variable(self, var: str, data: dict[str, pd.DataFrame], 
                      dict_runUID: dict[str, list[str]],
-                     agg_requested: bool) -> dict[str, np.ndarray]:
+                     agg_requested: bool) -> pd.DataFrame:
         """
         Process a variable from the given data.
 
+        The (runs x bins, laps) matrix is allocated once, filled with NaN
+        for the laps a run doesn't have, then each run fills its rows.
+        Only the laps chosen with select_laps are kept, if any.
+
         Args:
             var (str): The variable name.
             data (dict[str, object]): The data dictionary.
 
         Returns:
-            dict[str, object]: The processed variable data.
+            pd.DataFrame: The processed variable data, one column per lap.
 
         """
         t0 = time.time()
-        var_data = {}
-        data_len = 0
         has_data = []
-        max_lap_number = 0
+        tables = []
         for u in dict_runUID:
             if not var in data[u]:
                 continue
 
-            js = json.loads(data[u][var])
+            table = data[u][var]
 
-            if not js:
+            if self._is_empty(table):
                 continue
+            if self.laps is not None and not self.laps.get(u):
+                continue   # no lap selected, see select_laps
             has_data.append(u)
-            lap_count = len(js.keys())
-            if lap_count > max_lap_number:
-                max_lap_number = lap_count
-
-            if not var_data:  # une variable à toujours le même axis, pas besoin de le regarder à chaque fois
-                (x_left, x_right) = self._create_interval(
-                    data, u, var + '_xAxis')
-
-                data_len = len(x_left)
-                var_data['RunUID'] = np.empty(0, dtype=np.dtype('U36'))
-
-            var_data['RunUID'] = np.append(
-                var_data['RunUID'], np.full(data_len, u, dtype=np.dtype('U36')))
-            
-            for i in range(1, max_lap_number + 1):
-                lap_name = 'Lap' + str(i)
-                if lap_name in js:
-                    if i not in var_data:   # first time seeing this lap number
-                        nb_runs_before = len(has_data) - 1 # remove current run
-                        time_repeat = nb_runs_before * data_len
-                        var_data[i] = np.append(
-                            np.full(time_repeat, np.nan, dtype=float),
-                            list(js[lap_name].values()))
-                    else:
-                        var_data[i] = np.append(var_data[i], np.array(
-                            list(js[lap_name].values()), dtype=float))
-                else:  # lap number not in the current run
-                    var_data[i] = np.append(var_data[i],
-                                        np.full(data_len, np.nan, dtype=float))
-        if var_data:
-            times_to_add = len(has_data)
-
-            if not agg_requested:
-                uid_list = [u_ for u_ in has_data for _ in range(data_len)]
-                var_data['RunUID'] = np.array(uid_list, dtype=np.dtype('U36'))
-
-            var_data['Left'] = np.tile(x_left, times_to_add)
-            var_data['Right'] = np.tile(x_right, times_to_add)
-
-            # for key, el in var_data.items():
-            #     diff = max_len - el.size
-            #     """ Une colonne par tour : complète par des NaN si 
-            #     un run a moins de tours qu'un autre, pour la création de la df
-            #     """
-            #     if diff > 0:
-            #         var_data[key] = np.append(el, np.repeat(np.nan, diff))
+            tables.append(table)
+
+        if not has_data:
+            return pd.DataFrame()
+
+        axes = [self._get_axis(data, u, var + '_xAxis') for u in has_data]
+        same_axes = self._check_axes(var + '_xAxis', has_data, axes)
+        lengths = [len(axis) for axis in axes]
+        offsets = np.cumsum([0] + lengths)
+        max_lap_number = max(table.num_columns for table in tables)
+        lap_numbers = range(1, max_lap_number + 1)
+        if self.laps is not None:
+            selected = set(chain.from_iterable(self.laps[u] for u in has_data))
+            lap_numbers = [lap for lap in lap_numbers if lap in selected]
+        positions = {lap: position for position, lap in enumerate(lap_numbers)}
+
+        values = np.full((offsets[-1], len(lap_numbers)), np.nan,
+                         dtype=float)
+        for run_index, (u, table) in enumerate(zip(has_data, tables)):
+            rows = slice(offsets[run_index], offsets[run_index + 1])
+            run_laps = None if self.laps is None else set(self.laps[u])
+            for lap_name in table.column_names:
+                lap_number = int(lap_name[3:])   # 'Lap12' -> 12
+                if lap_number in positions and \
+                        (run_laps is None or lap_number in run_laps):
+                    values[rows, positions[lap_number]] = \
+                        self._column_values(table, lap_name)
+
+        var_data = pd.DataFrame(values, columns=lap_numbers, copy=False)
+        if same_axes:
+            var_data['Left'] = np.tile(axes[0].left, len(axes))
+            var_data['Right'] = np.tile(axes[0].right, len(axes))
+        else:   # each run keeps its own bins
+            var_data['Left'] = np.concatenate([axis.left for axis in axes])
+            var_data['Right'] = np.concatenate([axis.right for axis in axes])
+        if not agg_requested:
+            var_data['RunUID_index'] = self._run_index(has_data, lengths)
 
         t1 = time.time()
         limit, duration = 0.5, t1-t0
@@ -101,6 +98,43 @@ class HistoLapData(PARQUET):
 
         return var_data
 
+    def _aggregate_laps(self, df: pd.DataFrame,
+                        agg: list[CatanaAggregationEnum]) -> pd.DataFrame | None:
+        """
+        Aggregates each lap across the runs bin by bin, then each
+        aggregation function across the laps.
+
+        The runs are stacked in a (runs, bins, laps) array, without the
+        groupby on Left.
+
+        Args:
+            df (pd.DataFrame): The processed variable data, one column per lap.
+            agg (list[CatanaAggregationEnum]): The aggregation functions.
+
+        Returns:
+            pd.DataFrame | None: The aggregated data, or None if an
+            aggregation function is requested twice or the bins are
+            irregular.
+        """
+        names = [a.value for a in agg]
+        if len(set(names)) < len(names):
+            return None
+        stacked = self._stack_bins(df, by=['Left'], firsts=['Right'])
+        if stacked is None:
+            return None
+        nb_bins, order, edges = stacked
+
+        laps = df.columns[:-2]   # Left and Right are the last ones
+        values = df[laps].to_numpy(dtype=float).reshape(-1, nb_bins, len(laps))
+        aggregates = self._aggregate_runs(values, agg)
+        result = pd.DataFrame(edges)
+        result['RunUID_index'] = 0   # useless when aggregating
+        for name in names:
+            by_lap = pd.DataFrame(aggregates[name][order], columns=laps)
+            result[name] = by_lap.aggregate(name, axis='columns')
+        return result
+
+    @aggregatecache
     def process_data(self, update: bool,
                      agg: list[CatanaAggregationEnum]|CatanaAggregationEnum) -> dict[str, pd.DataFrame]:
         """
@@ -120,7 +154,7 @@ class HistoLapData(PARQUET):
             data = histo_lap_data.process_data(update=True)
         """
         variables_with_axes = list(chain.from_iterable(
-            (var, var + '_xAxis') for var in self.variables))
+            (var, *(var + suffix for suffix in self.axis_suffixes)) for var in self.variables))
         dict_runUID = self.create_dict_runUID(variables=variables_with_axes)
 
         data = self.cached_read_files(data_type = self.data_type,
@@ -137,22 +171,22 @@ class HistoLapData(PARQUET):
         
         res = {var: self._process_variable(var, data, dict_runUID, agg_requested)
                for var in self.variables}
-        res = {var: pd.DataFrame(res[var]) for var in res}
         for var, df in res.items():
             if df.empty:
                 continue
             
             if agg_requested:
-                laps = df.columns[1:-2]
-                for lap in laps:   # makes agg faster
-                    df[lap] = df[lap].astype(float)
-                agg_dict = {lap_num: agg_names for lap_num in laps}
-                agg_dict['Right'] = 'first'
-                df = self._aggregate_df(df, by=['Left'], agg_=agg_dict)
-                for a in agg_names:
-                    tmp = df[a]
-                    df = df.drop(columns=a)
-                    df[a] = tmp.aggregate(a, axis='columns')
+                aggregated = self._aggregate_laps(df, agg)
+                if aggregated is None:
+                    laps = df.columns[:-2]   # Left and Right are the last ones
+                    agg_dict = {lap_num: agg_names for lap_num in laps}
+                    agg_dict['Right'] = 'first'
+                    aggregated = self._aggregate_df(df, by=['Left'], agg_=agg_dict)
+                    for a in agg_names:
+                        tmp = aggregated[a]
+                        aggregated = aggregated.drop(columns=a)
+                        aggregated[a] = tmp.aggregate(a, axis='columns')
+                df = aggregated
 
             else:
                 df = self._encode_run_uid(df)
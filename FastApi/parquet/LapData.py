@@ -1,5 +1,3 @@
-import json
-
 import numpy as np
 import pandas as pd
 
@@ -31,11 +29,11 @@ class LapData(PARQUET):
         for var in variables:
             if not var in run_data:
                 continue
-            js = json.loads(run_data[var])
-            if not js:
+            table = run_data[var]
+            if self._is_empty(table):
                 continue
 
-            runvar[var] = np.array([js[i]['0'] for i in js], dtype=float)
+            runvar[var] = self._row_values(table)
             if runvar[var].size < l:
                 l = runvar[var].size
 
@@ -44,8 +42,12 @@ class LapData(PARQUET):
         for var in runvar:
             runvar[var] = runvar[var][:l]
 
-        runvar['RunUID'] = np.full(l, uid, dtype=np.dtype('U36'))
         runvar['LapCount'] = np.arange(1, l+1, dtype=int)
+        if self.laps is not None:   # see select_laps
+            keep = np.isin(runvar['LapCount'], self.laps.get(uid, []))
+            if not keep.any():
+                return
+            runvar = {var: values[keep] for var, values in runvar.items()}
         return runvar
 
     def process_data(self, update: bool = False) -> pd.DataFrame:
@@ -62,7 +64,10 @@ class LapData(PARQUET):
         if not any(processed_data):   # que des None ie. aucun return de runvar
             return pd.DataFrame(columns=['RunUID_index', 'LapCount'])
 
-        res = [pd.DataFrame(run) for run in processed_data if run is not None]
-        res = pd.concat(res).copy()
+        runs = [(uid, run) for uid, run in zip(self.run_uid, processed_data)
+                if run is not None]
+        res = pd.concat([pd.DataFrame(run) for _, run in runs]).copy()
+        res['RunUID_index'] = self._run_index(
+            [uid for uid, _ in runs], [run['LapCount'].size for _, run in runs])
         res = self._encode_run_uid(res)
         return res
@@ -0,0 +1,236 @@
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+import time
+from typing import Callable
+
+import pyarrow as pa
+
+
+class LocalMirror:
+    """Size-bounded copy of the recently read parquet files on a local disk.
+
+    Each file read from the network share is written once in the mirror
+    directory as an uncompressed Arrow IPC (Feather v2) file, named after
+    the hash of its path and its modification time, then memory-mapped
+    by the next reads. The modification time of the source is checked at
+    most once every revalidation_interval seconds: between two checks,
+    the reads don't touch the share. A file modified on the share gets a
+    new copy, the least recently used copies are deleted above max_bytes.
+
+    The directory is shared by the workers of the service: a copy written
+    by another worker is used instead of copying the file again. Each
+    worker keeps a running estimate of the size of the directory, listed
+    again when the estimate goes over max_bytes, before deleting copies,
+    or every revalidation_interval seconds, so that max_bytes bounds the
+    copies of every worker. A copy which can't be deleted yet
+    (memory-mapped, on Windows) stays counted and is deleted at a next
+    eviction. The copies left by a previous process are reused, from the
+    least recently modified.
+    """
+
+    suffix = '.arrow'
+    tmp_suffix = '.tmp'
+    # Age in seconds of the temporary files left by an interrupted copy,
+    # younger ones may be written by another worker.
+    tmp_max_age = 3600
+
+    def __init__(self, directory: str, max_bytes: int,
+                 revalidation_interval: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.revalidation_interval = revalidation_interval
+        self.size = 0
+        # local copy -> size, in the order of use
+        self._copies = OrderedDict()
+        # source path -> (local copy, time of the last check of the source)
+        self._sources = dict()
+        # local copy -> source path, for the copies read by this process
+        self._copy_sources = dict()
+        self._scanned_at = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._remove_tmp_files()
+        self._scan()
+
+    def _remove_tmp_files(self):
+        """Delete the temporary files of the copies interrupted by a crash."""
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            tmp_files = [entry.path for entry in entries
+                         if entry.name.endswith(self.tmp_suffix)
+                         and now - entry.stat().st_mtime > self.tmp_max_age]
+        for tmp_path in tmp_files:
+            self._remove_file(tmp_path)
+
+    @staticmethod
+    def _remove_file(path: str) -> bool:
+        """Delete a file, False if it can't be deleted yet (memory-mapped or
+        open, on Windows).
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return False
+        return True
+
+    def _forget(self, local: str):
+        """Forget a deleted copy, and the source it is the copy of. Called
+        with the lock held.
+        """
+        self.size -= self._copies.pop(local, 0)
+        path = self._copy_sources.pop(local, None)
+        if path is not None and self._sources.get(path, (None,))[0] == local:
+            del self._sources[path]
+
+    def _scan(self):
+        """List the copies of the directory, written by any worker.
+
+        The copies unknown to this process are added as the least recently
+        used, from the least recently modified, and the copies deleted by
+        another worker are forgotten.
+        """
+        scanned_at = time.monotonic()
+        copies = dict()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(self.suffix):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    copies[entry.path] = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            self._scanned_at = scanned_at
+            for local in [local for local in self._copies if local not in copies]:
+                self._forget(local)
+            unknown = sorted(((mtime, local, size) for local, (mtime, size) in copies.items()
+                              if local not in self._copies), reverse=True)
+            for _, local, size in unknown:
+                self._copies[local] = size
+                self._copies.move_to_end(local, last=False)
+                self.size += size
+
+    def _get_local_path(self, path: str, mtime_ns: int) -> str:
+        """Get the path of the copy of a version of a source file."""
+        name = hashlib.sha1(path.encode()).hexdigest()
+        return os.path.join(self.directory, f'{name}-{mtime_ns}{self.suffix}')
+
+    def _get_fresh_copy(self, path: str) -> str | None:
+        """Get the copy of a source file checked less than
+        revalidation_interval seconds ago, if any.
+        """
+        with self._lock:
+            source = self._sources.get(path)
+        if source is None:
+            return None
+        local, checked_at = source
+        if time.monotonic() - checked_at >= self.revalidation_interval:
+            return None
+        return local
+
+    def _open(self, local: str) -> pa.Table | None:
+        """Memory-map a copy and mark it as recently used, None if there is
+        no such copy. A copy written by another worker is added to the
+        copies of this process.
+        """
+        try:
+            with pa.memory_map(local) as source:
+                size = source.size()
+                table = pa.ipc.open_file(source).read_all()
+        except FileNotFoundError:   # not copied yet, or evicted by another worker
+            with self._lock:
+                self._forget(local)
+            return None
+        with self._lock:
+            if local not in self._copies:
+                self._copies[local] = size
+                self.size += size
+            self._copies.move_to_end(local)
+        return table
+
+    def _add(self, local: str, table: pa.Table):
+        """Write a copy without exposing a partial file, then evicts the
+        least recently used copies of the directory above max_bytes.
+
+        The directory is only listed when the estimated size goes over
+        max_bytes, or revalidation_interval seconds after the last
+        listing: filling the mirror doesn't list it at every copy.
+        """
+        tmp_path = f'{local}.{os.getpid()}.{threading.get_ident()}{self.tmp_suffix}'
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp_path, local)
+        except OSError:
+            self._remove_file(tmp_path)
+            raise
+        size = os.path.getsize(local)
+        with self._lock:
+            self.size += size - self._copies.pop(local, 0)
+            self._copies[local] = size
+            due = self.size > self.max_bytes \
+                or time.monotonic() - self._scanned_at >= self.revalidation_interval
+        if due:
+            self._evict()
+
+    def _evict(self):
+        """Delete the least recently used copies of the directory above
+        max_bytes, the most recently used copy being kept.
+
+        A copy which can't be deleted stays counted, at its place, and is
+        deleted at a next eviction. A deleted copy is forgotten with its
+        source.
+        """
+        self._scan()
+        with self._lock:
+            evicted, size = [], self.size
+            for local, local_size in self._copies.items():
+                if size <= self.max_bytes or len(evicted) == len(self._copies) - 1:
+                    break
+                evicted.append(local)
+                size -= local_size
+        for old in evicted:
+            if self._remove_file(old):
+                with self._lock:
+                    self._forget(old)
+
+    def read(self, path: str, read_function: Callable[[str], pa.Table]) -> pa.Table:
+        """Read a source file from its local copy, or from the share.
+
+        Args:
+            path: The parquet file on the share.
+            read_function: The function reading the file from the share.
+
+        Returns:
+            The data of the file.
+
+        Raises:
+            FileNotFoundError: The file doesn't exist on the share.
+        """
+        local = self._get_fresh_copy(path)
+        if local is not None:
+            table = self._open(local)
+            if table is not None:
+                return table
+
+        local = self._get_local_path(path, os.stat(path).st_mtime_ns)
+        table = self._open(local)
+        if table is None:
+            table = read_function(path)
+            try:
+                self._add(local, table)
+            except OSError:   # the local disk is full or not writable
+                return table
+            # served from the memory-mapped copy like the next reads
+            mapped = self._open(local)
+            if mapped is not None:
+                table = mapped
+        with self._lock:
+            self._sources[path] = (local, time.monotonic())
+            self._copy_sources[local] = path
+        return table
@@ -1,5 +1,3 @@
-import json
-
 import numpy as np
 import pandas as pd
 
@@ -24,27 +22,27 @@ class OtherData(PARQUET):
         Returns:
             dict: A dictionary containing the processed variable data. The dictionary has two keys:
                 - The variable name (var) as the key, and the processed data as the value.
-                - 'RunUID' as the key, and an array of run IDs corresponding to the processed data as the value.
+                - 'RunUID_index' as the key, and the index of the run of each processed value as the value.
         """
         var_data = {}
         for u in dict_runUID:
             if not var in data[u]:
                 continue
-            js = json.loads(data[u][var])
-            if not js:
+            table = data[u][var]
+            if self._is_empty(table):
                 continue
             if not var_data:
                 # initialisation des np.arrays
-                var_data[var] = np.array(list(js['Run'].values()), dtype=float)
-                var_data['RunUID'] = np.full(
-                    var_data[var].size, u, dtype=np.dtype('U36'))
+                var_data[var] = self._column_values(table, 'Run')
+                var_data['RunUID_index'] = self._run_index(
+                    [u], [var_data[var].size])
                 continue
 
-            var_run_data = np.array(list(js['Run'].values()), dtype=float)
+            var_run_data = self._column_values(table, 'Run')
             data_len = var_run_data.size
             var_data[var] = np.append(var_data[var], var_run_data)
-            var_data['RunUID'] = np.append(
-                var_data['RunUID'], np.full(data_len, u, dtype=np.dtype('U36')))
+            var_data['RunUID_index'] = np.append(
+                var_data['RunUID_index'], self._run_index([u], [data_len]))
         return var_data
 
     def process_data(self, update: bool) -> dict[str, pd.DataFrame]:
@@ -1,24 +1,230 @@
 import abc
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
-from multiprocessing import Pool
 import os
 import platform
+import threading
 import time
 import yaml
 
 
 from fastapi import HTTPException
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+from bdd.CATANA import CATANA
 from cache.cache_decorator import rediscache
+from parquet.AxisRegistry import Axis, AxisRegistry
+from parquet.CatanaAggregationEnum import CatanaAggregationEnum
 from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
+from parquet.LocalMirror import LocalMirror
 
 
 # Mount U : sudo mount -t drvfs U: /mnt/u/ (mkdir /mnt/u si existe pas)
 
 logger = logging.getLogger('main_log')
 
+script_dir = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(script_dir, 'parquet_conf.yml')) as file:
+    parquet_conf = yaml.safe_load(file)
+
+# Shared by every request of the process: pyarrow releases the GIL while
+# reading, threads avoid forking and pickling the tables back.
+io_pool = ThreadPoolExecutor(max_workers=parquet_conf['io_threads'],
+                             thread_name_prefix='parquet_io')
+# Histogram axes shared by every request.
+axis_registry = AxisRegistry(max_entries=parquet_conf['axis_registry_size'])
+# Bounds the concurrent reads on each mounted network drive.
+_disk_semaphores = {}
+_disk_semaphores_lock = threading.Lock()
+# Last time each drive was found mounted.
+_mount_checks = {}
+_mount_checks_lock = threading.Lock()
+# Local copies of the files read from the drives.
+local_mirror = None
+if parquet_conf['local_mirror_path']:
+    local_mirror = LocalMirror(parquet_conf['local_mirror_path'],
+                               parquet_conf['local_mirror_max_bytes'],
+                               parquet_conf['local_mirror_revalidation_interval'])
+
+
+def get_disk_semaphore(disk: str) -> threading.BoundedSemaphore:
+    """Get the semaphore bounding the concurrent reads on a disk.
+
+    Args:
+        disk: The mount point of the disk.
+
+    Returns:
+        The semaphore shared by every reader of the disk.
+    """
+    with _disk_semaphores_lock:
+        if disk not in _disk_semaphores:
+            _disk_semaphores[disk] = threading.BoundedSemaphore(
+                parquet_conf['max_reads_per_disk'])
+        return _disk_semaphores[disk]
+
+
+def is_mounted(disk: str) -> bool:
+    """Check if a drive is mounted.
+
+    A mounted drive is not checked again for mount_check_interval seconds,
+    an unmounted one is checked at every call.
+
+    Args:
+        disk: The mount point of the disk.
+
+    Returns:
+        True if the drive is mounted.
+    """
+    now = time.monotonic()
+    with _mount_checks_lock:
+        checked_at = _mount_checks.get(disk)
+    if checked_at is not None and \
+            now - checked_at < parquet_conf['mount_check_interval']:
+        return True
+    if not os.path.ismount(disk):
+        return False
+    with _mount_checks_lock:
+        _mount_checks[disk] = now
+    return True
+
+
+def read_table(path: str, columns: list[str] | None = None) -> pa.Table:
+    """Read a parquet file as an Arrow table.
+
+    The pandas index written with the file, if any, is dropped like
+    DataFrame.to_json did when the data was cached as JSON.
+
+    Args:
+        path: The parquet file path.
+        columns: The columns to read, all of them if None.
+
+    Returns:
+        The data of the file, without schema metadata.
+    """
+    table = pq.read_table(path, columns=columns, use_threads=False,
+                          pre_buffer=True)
+    return drop_pandas_index(table)
+
+
+def drop_pandas_index(table: pa.Table) -> pa.Table:
+    """Drop the pandas index written with a parquet file, and the schema
+    metadata.
+
+    Args:
+        table: Data read from a parquet file.
+
+    Returns:
+        The data without the index columns nor schema metadata.
+    """
+    pandas_metadata = table.schema.pandas_metadata or {}
+    index_columns = [col for col in pandas_metadata.get('index_columns', [])
+                     if isinstance(col, str) and col in table.column_names]
+    if index_columns:
+        table = table.drop_columns(index_columns)
+    return table.replace_schema_metadata(None)
+
+
+# Every variable of a run for one data type, in a single file of the data
+# type folder. Variables missing from it, or whose own file was written after
+# it, are still read from their own file.
+COMPACTED_FILE_NAME = '_run.parquet'
+# Key of the schema metadata holding the variable index of a compacted file.
+COMPACTED_INDEX_KEY = b'catana_variables'
+
+
+def compact_tables(tables: dict[str, pa.Table]) -> pa.Table:
+    """Merge the tables of the variables of a run in one wide table.
+
+    The column `col` of the variable `var` becomes the column `var/col`.
+    Shorter tables are padded with nulls, their number of rows and
+    columns are kept in the variable index of the schema metadata.
+
+    Args:
+        tables: A dict {variable: data of the variable}.
+
+    Returns:
+        The compacted table, ready to be written.
+    """
+    num_rows = max((table.num_rows for table in tables.values()), default=0)
+    index = {}
+    names = []
+    arrays = []
+    for var, table in tables.items():
+        index[var] = {'num_rows': table.num_rows,
+                      'columns': table.column_names}
+        for col, column in zip(table.column_names, table.columns):
+            array = column.combine_chunks()
+            if len(array) < num_rows:
+                array = pa.concat_arrays(
+                    [array, pa.nulls(num_rows - len(array), array.type)])
+            names.append(f'{var}/{col}')
+            arrays.append(array)
+    schema = pa.schema([pa.field(name, array.type)
+                        for name, array in zip(names, arrays)],
+                       metadata={COMPACTED_INDEX_KEY: json.dumps(index)})
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def read_compacted_table(path: str,
+                         variables: list[str]) -> dict[str, pa.Table]:
+    """Read some variables from a compacted file.
+
+    The folder of the file is listed once: a variable whose own file was
+    modified after the compaction is not read from the compacted file,
+    which is only rewritten when the compaction job is run again. The
+    file is opened once, only the columns of the requested variables
+    are read.
+
+    Args:
+        path: The compacted file path.
+        variables: The variables to read.
+
+    Returns:
+        A dict {variable: data of the variable} for the requested
+        variables present and up to date in the file, empty if there is
+        no compacted file.
+    """
+    directory, name = os.path.split(path)
+    names = {f'{var}.parquet' for var in variables}
+    modified_times = {}
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name == name or entry.name in names:
+                    modified_times[entry.name] = entry.stat().st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return {}
+    compacted_time = modified_times.get(name)
+    if compacted_time is None:
+        return {}
+    variables = [var for var in variables
+                 if modified_times.get(f'{var}.parquet', 0) <= compacted_time]
+
+    with pq.ParquetFile(path, pre_buffer=True) as parquet_file:
+        metadata = parquet_file.schema_arrow.metadata or {}
+        index = json.loads(metadata.get(COMPACTED_INDEX_KEY, b'{}'))
+        found = [var for var in variables if var in index]
+        columns = [f'{var}/{col}' for var in found
+                   for col in index[var]['columns']]
+        table = parquet_file.read(columns=columns, use_threads=False)
+
+    result = {}
+    for var in found:
+        var_columns = index[var]['columns']
+        if not var_columns:
+            result[var] = pa.table({})
+            continue
+        var_table = table.select([f'{var}/{col}' for col in var_columns])
+        var_table = var_table.rename_columns(var_columns)
+        result[var] = var_table.slice(
+            0, index[var]['num_rows']).replace_schema_metadata(None)
+    return result
+
+
 class PARQUET(metaclass=abc.ABCMeta):
     """An abstract class. Superclass of all data_type classes.
 
@@ -34,6 +240,9 @@ class PARQUET(metaclass=abc.ABCMeta):
         self.years = self._check_if_list(years)
         self.competition = competition
         self.data_type = data_type
+        # LapCounts of each run the lap-based data is restricted to, see
+        # select_laps
+        self.laps = None
 
         with open('parquet/disk_mapping.yml') as file:
             disk_mapping = yaml.safe_load(file)
@@ -53,7 +262,7 @@ class PARQUET(metaclass=abc.ABCMeta):
         if self.competition == 'F1' or self.competition == 'F1 LIVE':
             self.parquet_path = self.disk+"OUTILS_DP/CATANA_TEMP/OFFICIAL_PARQUETS/"
 
-        if not os.path.ismount(self.disk):
+        if not is_mounted(self.disk):
             msg = f' Check if {self.disk} drive is mounted.'
             logger.critical(msg + '\n')
             raise HTTPException(400, msg)
@@ -74,24 +283,53 @@ class PARQUET(metaclass=abc.ABCMeta):
     def process_data(self, update: bool = False):
         raise NotImplementedError
 
-    @staticmethod
-    def read_parquet_file(file: str) -> pd.DataFrame:
+    def read_parquet_file(self, file: tuple[str, str, str]) -> tuple[str, str, pa.Table]:
         """Retrive data from a parquet file.
 
         Args:
-            file: The parquet file path.
+            file: A 3-uplet (runUID, variable, file_path).
 
         Returns:
-            A dataframe containing the data from the parquet.
+            A 3-uplet (runUID, variable, data) where data is an Arrow
+            table containing the data from the parquet.
         """
         uid = file[0]
         var = file[1]
         path = file[2]
+
+        def read_from_disk(path: str) -> pa.Table:
+            with get_disk_semaphore(self.disk):
+                return read_table(path)
+
+        if local_mirror is not None:
+            try:
+                return uid, var, local_mirror.read(path, read_from_disk)
+            except FileNotFoundError:
+                return uid, var, pa.table({})
+
         if os.path.exists(path):
-            df = pd.read_parquet(path)
-            return uid, var, df
+            return uid, var, read_from_disk(path)
         
-        return uid, var, pd.DataFrame()
+        return uid, var, pa.table({})
+
+    def read_compacted_file(self, run: tuple[str, list[str], str]) -> tuple[str, dict[str, pa.Table]]:
+        """Retrive the data of several variables from the compacted file
+        of a run.
+
+        Args:
+            run: A 3-uplet (runUID, variables, file_path).
+
+        Returns:
+            A 2-uplet (runUID, data) where data is a dict {variable: Arrow
+            table} for the variables found up to date in the file. It is
+            empty if the run has not been compacted.
+        """
+        uid = run[0]
+        variables = run[1]
+        path = run[2]
+        with get_disk_semaphore(self.disk):
+            tables = read_compacted_table(path, variables)
+        return uid, tables
 
     @rediscache
     def cached_read_files(self, data_type: CatanaDataTypeEnum,
@@ -113,16 +351,15 @@ class PARQUET(metaclass=abc.ABCMeta):
 
         Returns:
             A dict where the keys are runUIDs and the values is a dict
-            with keys and the values are JSON of the DataFrame from the
+            with keys and the values are Arrow tables of the data from the
             read files.
         """
         return self.read_files(data_type=data_type, dict_runUID=dict_runUID,
-                               years=years, to_json=True)
+                               years=years)
 
     def read_files(self, data_type: CatanaDataTypeEnum | str,
                    dict_runUID: dict[str, list[str]],
-                   years: list[int],
-                   to_json: bool = False) -> dict[str, dict[str, list]]:
+                   years: list[int]) -> dict[str, dict[str, pa.Table]]:
         """Function to read all the parquet files requested. 
 
         Args:
@@ -132,38 +369,33 @@ class PARQUET(metaclass=abc.ABCMeta):
             a list of variables the data needs to be retrive from the files.
             years: a list contining the years of the runUIDs. Needs to be
             the same length as the keys of dict_runUID.
-            to_json: a boolean indicating if DataFrame returned by
-            read_parquet_file needs to be converted to JSON.
 
         Returns:
             A dict where the keys are runUIDs and the values is a dict with
-            keys and values are either JSON or the DataFrame from the read
+            keys and values are Arrow tables of the data from the read
             files.
         """
 
-        def parallel_read_parquet(files, num_processes):
-            """Multiprocess the file reading to make it faster !
+        def parallel_read_parquet(read_function, files):
+            """Read the files on the shared I/O thread pool.
 
             Args:
-                files: A list of 3-uplet (runUID, variable, file_path).
-                num_processes: The number of processes the function
-                read_parquet_file will be run on.
+                read_function: The function reading one file, either
+                read_parquet_file or read_compacted_file.
+                files: A list of the arguments of read_function.
 
             Returns:
-                A list of 3-uplet (runUID, variable, data) where data is
-                a DataFrame. 
+                A list of the outputs of read_function.
             """
             if not files:
                 return []
             
             nb_files = len(files)
-            num_processes = min(num_processes, nb_files)
 
             if nb_files >= 500:
                 logger.warning(f" {len(files)} files to load", stacklevel=6)
             t0 = time.time()
-            with Pool(num_processes) as pool:
-                dfs = pool.map(self.read_parquet_file, files)
+            dfs = list(io_pool.map(read_function, files))
             t1 = time.time()
 
             logger.info(f" {len(files)} files loaded [{t1-t0:.3f}s]",
@@ -177,15 +409,18 @@ class PARQUET(metaclass=abc.ABCMeta):
 
 
         result = {uid: {} for uid in dict_runUID}
-        files = self._get_files_names(data_type, dict_runUID, years)
-        num_processes = min(len(files), 6)   # arbitraire
-        dfs = parallel_read_parquet(files, num_processes)
-        if to_json:
-            for uid, var, data in dfs:
-                result[uid][var] = data.to_json()
-        else:
-            for uid, var, data in dfs:
-                result[uid][var] = data
+        runs = self._get_compacted_files_names(data_type, dict_runUID, years)
+        for uid, tables in parallel_read_parquet(self.read_compacted_file, runs):
+            result[uid].update(tables)
+
+        # runs not compacted yet, or variables added or updated since the
+        # compaction
+        files = [file for file in
+                 self._get_files_names(data_type, dict_runUID, years)
+                 if file[1] not in result[file[0]]]
+        dfs = parallel_read_parquet(self.read_parquet_file, files)
+        for uid, var, data in dfs:
+            result[uid][var] = data
         return result
 
     def list_variables(self) -> dict[str, list[str]]:
@@ -204,8 +439,9 @@ class PARQUET(metaclass=abc.ABCMeta):
                 d[uid] = []
                 continue
 
-            # retire '.parquet'
+            # retire '.parquet' and the compacted file
             variables = list(map(lambda x: x.split('.')[0], avaliable_data))
+            variables = [var for var in variables if not var.startswith('_')]
             if self.data_type is CatanaDataTypeEnum.HISTO or \
                     self.data_type is CatanaDataTypeEnum.HISTOLAPDATA or \
                     self.data_type is CatanaDataTypeEnum.HISTO2D:
@@ -215,8 +451,9 @@ class PARQUET(metaclass=abc.ABCMeta):
 
         return d
 
-    def _encode_run_uid(self, result: pd.DataFrame) -> pd.DataFrame:
-        """Encode runUIDs to reduce the size of the data then send to users.
+    def _run_index(self, uids: list[str],
+                   counts: list[int] | np.ndarray | None = None) -> np.ndarray:
+        """Integer-code runUIDs to reduce the size of the data.
 
         The convention is : runUID is encoded with its position in the
         list of runUIDs passend when creating the object.
@@ -224,29 +461,94 @@ class PARQUET(metaclass=abc.ABCMeta):
         positions in the list.
 
         Args:
-            result: a DataFrame containing the column RunUID to encode.
+            uids: The runUIDs to encode.
+            counts: The number of rows of each runUID, one by default.
 
         Returns:
-            The DataFrame with the column RunUID_index replacing the column
-            RunUID.
+            The RunUID_index column, as int32.
 
         Raises:
-            KeyError: The DataFrame result do not have a column named
-            'RunUID'. 
+            KeyError: A runUID was not passed when creating the object.
+        """
+        d = {u: i for i, u in enumerate(self.run_uid)}
+        index = np.array([d[uid] for uid in uids], dtype=np.int32)
+        if counts is None:
+            return index
+        return np.repeat(index, counts)
+
+    def _encode_run_uid(self, result: pd.DataFrame) -> pd.DataFrame:
+        """Attach the run lookup table to the data sent to users.
+
+        The processing classes build the integer RunUID_index column from
+        the start with _run_index: the runUIDs are only listed once, in
+        result.attrs['RunUID'], index i being the runUID at position i.
+        utils.serialization sends the list with the response, in the
+        'RunUID' field of the JSON documents or the 'RunUID' key of the
+        Arrow and parquet schema metadata.
+
+        Args:
+            result: a DataFrame containing the column RunUID_index.
+
+        Returns:
+            The same DataFrame.
         """
         if result.empty:
             return result
-        
-        d = {u: i for i, u in enumerate(
-            self.run_uid, 0)}
-        array = [d[uid] for uid in result['RunUID']]
-        result['RunUID_index'] = array
-        result = result.drop(columns='RunUID')
 
+        result.attrs['RunUID'] = list(self.run_uid)
         return result
 
     @staticmethod
-    def _create_interval(data: dict[str, dict[str, list]], uid: str, var: str) -> tuple[list, list]:
+    def _is_empty(table: pa.Table | None) -> bool:
+        """Check if a payload retrieved from the parquet files or the
+        cache contains no data (equivalent of an empty DataFrame).
+        """
+        return table is None or table.num_columns == 0
+
+    @staticmethod
+    def _column_values(table: pa.Table, column: str) -> np.ndarray:
+        """Get the values of a column of a payload as a float array.
+        Null values are converted to NaN.
+        """
+        return np.asarray(table.column(column).to_numpy(), dtype=float)
+
+    @staticmethod
+    def _row_values(table: pa.Table, row: int = 0,
+                    skip: int = 0) -> np.ndarray:
+        """Get the values of one row of a payload as a float array.
+
+        Args:
+            table: The payload.
+            row: The position of the row.
+            skip: The number of leading columns to ignore.
+        """
+        return np.array([col[row].as_py() for col in table.columns[skip:]],
+                        dtype=float)
+
+    @staticmethod
+    def _table_values(table: pa.Table, skip: int = 0) -> np.ndarray:
+        """Get the values of a payload as a (rows, columns) float matrix.
+        Null values are converted to NaN.
+
+        Args:
+            table: The payload.
+            skip: The number of leading columns to ignore.
+        """
+        columns = [np.asarray(col.to_numpy(), dtype=float)
+                   for col in table.columns[skip:]]
+        if not columns:
+            return np.empty((table.num_rows, 0), dtype=float)
+        return np.column_stack(columns)
+
+    @staticmethod
+    def _first_value(table: pa.Table, column: str):
+        """Get the first value of a column of a payload as a python
+        object.
+        """
+        return table.column(column)[0].as_py()
+
+    @staticmethod
+    def _create_interval(data: dict[str, dict[str, pa.Table]], uid: str, var: str) -> tuple[np.ndarray, np.ndarray]:
         """Given an 'Axis' variable, creates two lists the represent the
         interval.
         Exemple: if the 'Axis' data is [1,2,3,4] ->
@@ -257,28 +559,258 @@ class PARQUET(metaclass=abc.ABCMeta):
         Args:
             data: A dict containing the data retrived from the parquets
             files or the redis cache. Keys are RunUID and values are a
-            dict {variable: json_data}.
+            dict {variable: Arrow table}.
             uid: The RunUID the interval is created for.
             var: the variable passed to create the interval on.
 
         Return:
-            A 2-uplet of lists (left, right) where the first list contains
-            the left edges of the intervals and the second list contains
-            the right edges of the intervals.
+            A 2-uplet of arrays (left, right) where the first array contains
+            the left edges of the intervals and the second array contains
+            the right edges of the intervals. The arrays are read-only,
+            shared by every request through the axis registry.
 
         Raises:
             ValueError: The variable var passed to create an interval is
             not an Axis variable : it should ends with either 'x_Axis'
             or 'y_Axis'.
         """
+        axis = PARQUET._get_axis(data, uid, var)
+        return (axis.left, axis.right)
+
+    @staticmethod
+    def _get_axis(data: dict[str, dict[str, pa.Table]], uid: str, var: str) -> Axis:
+        """Get the axis of a run from the registry shared by the requests.
+
+        Args:
+            data: A dict containing the data retrived from the parquets
+            files or the redis cache. Keys are RunUID and values are a
+            dict {variable: Arrow table}.
+            uid: The RunUID the axis is read for.
+            var: the axis variable.
+
+        Returns:
+            The axis, with read-only left and right edges.
+
+        Raises:
+            ValueError: The variable var is not an Axis variable : it
+            should ends with either 'x_Axis' or 'y_Axis'.
+        """
         if not var.endswith('Axis'):
             raise ValueError(f'Should be an axis : {var}')
 
-        js = json.loads(data[uid][var])
-        var_axis = list(js['Value'].values())
-        left = var_axis[:-1]
-        right = var_axis[1:]
-        return (left, right)
+        return axis_registry.get_axis(
+            var, PARQUET._column_values(data[uid][var], 'Value'))
+
+    @staticmethod
+    def _check_axes(var: str, runs: list[str], axes: list[Axis]) -> bool:
+        """Checks that the runs of a variable have the same axis, and logs
+        the runs whose axis differs from the one of the first run.
+
+        Args:
+            var: the axis variable.
+            runs: the RunUIDs.
+            axes: the axis of each run.
+
+        Returns:
+            True if every run has the same axis.
+        """
+        different = [u for u, axis in zip(runs, axes) if axis.key != axes[0].key]
+        if different:
+            logger.warning(f""" The {var} axis of {len(different)} run(s) """
+                           f"""differs from the one of {runs[0]}: {different}""")
+        return not different
+
+    @staticmethod
+    def _stack_bins(df: pd.DataFrame, by: list[str],
+                    firsts: list[str]) -> tuple[int, np.ndarray, dict[str, np.ndarray]] | None:
+        """Checks that the runs of a histogram, one after the other in df,
+        all have the same bins.
+
+        Args:
+            df: The bins of every run one after the other, as built by
+            _process_variable.
+            by: the columns of the left edges of the bins.
+            firsts: the columns of the right edges of the bins.
+
+        Returns:
+            A 3-uplet (number of bins, order, edges) where order sorts the
+            bins of a run like the groupby on the by columns and edges maps
+            the by and firsts columns to the sorted edges. None if the bins
+            are irregular (missing edges, runs with other bins, bins
+            appearing twice in a run).
+        """
+        nb_rows = len(df)
+        keys = [df[col].to_numpy(dtype=float) for col in by]
+        if nb_rows == 0 or any(np.isnan(k).any() for k in keys):
+            return None
+        # the bins of the first run end where its first bin repeats
+        repeats = np.flatnonzero(np.logical_and.reduce([k == k[0] for k in keys]))
+        nb_bins = int(repeats[1]) if len(repeats) > 1 else nb_rows
+        nb_runs = nb_rows // nb_bins
+        if nb_rows % nb_bins or any(not np.array_equal(k, np.tile(k[:nb_bins], nb_runs))
+                                    for k in keys):
+            return None
+        order = np.lexsort([k[:nb_bins] for k in keys[::-1]])
+        edges = {col: k[:nb_bins][order] for col, k in zip(by, keys)}
+        if nb_bins > 1 and np.logical_and.reduce([e[1:] == e[:-1] for e in edges.values()]).any():
+            return None
+        for col in firsts:
+            edges[col] = df[col].to_numpy(dtype=float)[:nb_bins][order]
+            if np.isnan(edges[col]).any():
+                return None
+        return nb_bins, order, edges
+
+    @staticmethod
+    def _fold_runs(values: np.ndarray, mask: np.ndarray, with_sums: bool,
+                   with_moments: bool) -> tuple[np.ndarray | None, np.ndarray | None, np.ndarray | None]:
+        """Folds stacked runs one by one, in the order of the rows, NaN
+        being skipped.
+
+        The sums are Kahan-compensated and the moments follow Welford's
+        update: the same floating point operations as the pandas groupby.
+
+        Args:
+            values: A (runs, ...) array, the runs in the order of the rows.
+            mask: The values which are not NaN.
+            with_sums: Whether to compute the sums.
+            with_moments: Whether to compute the means and the sums of
+            squared deviations.
+
+        Returns:
+            A 3-uplet (sum, mean, sum of squared deviations), None for the
+            statistics not computed.
+        """
+        shape = values.shape[1:]
+        sum_, compensation = np.zeros(shape), np.zeros(shape)
+        mean, m2, count = np.zeros(shape), np.zeros(shape), np.zeros(shape, dtype=np.int64)
+        y, t, tmp = np.empty(shape), np.empty(shape), np.empty(shape)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for run_values, run_mask in zip(values, mask):
+                where = True if run_mask.all() else run_mask
+                if with_sums:
+                    # Kahan summation, as in the pandas groupby
+                    np.subtract(run_values, compensation, out=y)
+                    np.add(sum_, y, out=t)
+                    np.subtract(t, sum_, out=tmp)
+                    tmp -= y
+                    # an infinite value makes the compensation NaN instead of the sum
+                    tmp[np.isnan(tmp)] = 0.
+                    np.copyto(sum_, t, where=where)
+                    np.copyto(compensation, tmp, where=where)
+                if with_moments:
+                    # Welford's update
+                    count += run_mask
+                    np.subtract(run_values, mean, out=y)
+                    np.divide(y, count, out=t)
+                    t += mean
+                    np.copyto(mean, t, where=where)
+                    np.subtract(run_values, mean, out=tmp)
+                    tmp *= y
+                    np.add(m2, tmp, out=m2, where=where)
+        if not with_sums:
+            sum_ = None
+        if not with_moments:
+            mean, m2 = None, None
+        return sum_, mean, m2
+
+    @staticmethod
+    def _aggregate_runs(values: np.ndarray,
+                        agg: list[CatanaAggregationEnum]) -> dict[str, np.ndarray]:
+        """Aggregates stacked runs along the first axis, NaN being skipped,
+        with the results of the pandas groupby.
+
+        Args:
+            values: A (runs, ...) array, the runs in the order of the rows.
+            agg: the aggregation functions, NONE excluded.
+
+        Returns:
+            A dict {aggregation function name: array of the shape of a run}.
+        """
+        values = np.asarray(values, dtype=float)
+        mask = ~np.isnan(values)
+        count = mask.sum(axis=0)
+        has_values = count > 0
+        sum_, mean, m2 = PARQUET._fold_runs(
+            values, mask,
+            with_sums=any(a in (CatanaAggregationEnum.SUM, CatanaAggregationEnum.MEAN) for a in agg),
+            with_moments=any(a in (CatanaAggregationEnum.STDDEV, CatanaAggregationEnum.VARIANCE)
+                             for a in agg))
+        result = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for a in agg:
+                if a == CatanaAggregationEnum.SUM:
+                    result[a.value] = sum_
+                elif a == CatanaAggregationEnum.COUNT:
+                    result[a.value] = count
+                elif a == CatanaAggregationEnum.MIN:
+                    result[a.value] = np.fmin.reduce(values, axis=0)
+                elif a == CatanaAggregationEnum.MAX:
+                    result[a.value] = np.fmax.reduce(values, axis=0)
+                elif a == CatanaAggregationEnum.MEAN:
+                    result[a.value] = np.where(has_values, sum_ / count, np.nan)
+                elif a in (CatanaAggregationEnum.VARIANCE, CatanaAggregationEnum.STDDEV):
+                    variance = np.where(count > 1, m2 / (count - 1), np.nan)
+                    result[a.value] = np.sqrt(variance) if a == CatanaAggregationEnum.STDDEV else variance
+                elif a == CatanaAggregationEnum.MEDIAN:
+                    # the NaN are sorted last, the median is in the first count values
+                    ordered = np.sort(values, axis=0)
+                    low = np.take_along_axis(ordered, np.maximum((count - 1) // 2, 0)[np.newaxis], axis=0)[0]
+                    high = np.take_along_axis(ordered, (count // 2)[np.newaxis], axis=0)[0]
+                    result[a.value] = np.where(has_values, (low + high) / 2, np.nan)
+                elif a in (CatanaAggregationEnum.FIRST, CatanaAggregationEnum.LAST):
+                    run = mask.argmax(axis=0) if a == CatanaAggregationEnum.FIRST \
+                        else len(values) - 1 - mask[::-1].argmax(axis=0)
+                    found = np.take_along_axis(values, run[np.newaxis], axis=0)[0]
+                    result[a.value] = np.where(has_values, found, np.nan)
+                elif a == CatanaAggregationEnum.PRODUCT:
+                    result[a.value] = np.nanprod(values, axis=0)
+                elif a == CatanaAggregationEnum.ANY:
+                    result[a.value] = np.any(mask & (values != 0), axis=0)
+                elif a == CatanaAggregationEnum.ALL:
+                    result[a.value] = np.all(~mask | (values != 0), axis=0)
+                else:
+                    raise ValueError(f'Not an aggregation function: {a}')
+        return result
+
+    @staticmethod
+    def _aggregate_bins(df: pd.DataFrame, var: str, by: list[str],
+                        firsts: list[str],
+                        agg: list[CatanaAggregationEnum]) -> pd.DataFrame | None:
+        """Aggregates the runs of a histogram bin by bin.
+
+        Gives the same dataframe as _aggregate_df with the aggregation
+        functions on var and 'first' on the firsts columns, without the
+        groupby: the runs are stacked in a (runs, bins) array and
+        aggregated along the runs.
+
+        Args:
+            df: The bins of every run one after the other, as built by
+            _process_variable.
+            var: the variable to aggregate.
+            by: the columns of the left edges of the bins.
+            firsts: the columns of the right edges of the bins.
+            agg: the aggregation functions requested.
+
+        Returns:
+            The aggregated dataframe, or None if an aggregation function
+            is requested twice or the bins are irregular: the caller then
+            falls back to _aggregate_df.
+        """
+        names = [a.value for a in agg]
+        if len(set(names)) < len(names):
+            return None
+        stacked = PARQUET._stack_bins(df, by, firsts)
+        if stacked is None:
+            return None
+        nb_bins, order, edges = stacked
+
+        aggregates = PARQUET._aggregate_runs(
+            df[var].to_numpy(dtype=float).reshape(-1, nb_bins), agg)
+        result = {col: edges[col] for col in by}
+        result.update({name: aggregates[name][order] for name in names})
+        result.update({col: edges[col] for col in firsts})
+        result['RunUID_index'] = 0   # useless when aggregating
+        return pd.DataFrame(result)
 
     def _aggregate_df(self, df: pd.DataFrame, by= list[str],
                         agg_ = dict[str, list[str]|str]) -> pd.DataFrame:
@@ -288,7 +820,7 @@ class PARQUET(metaclass=abc.ABCMeta):
             the functions specified in the agg dict.
         """
         t0 = time.time()
-        df = df.groupby(by=by).agg(agg_)
+        df = df.groupby(by=by, observed=True).agg(agg_)
         t1 = time.time()
         limit, duration = 0.1, t1-t0
         if  duration > limit:
@@ -302,8 +834,6 @@ class PARQUET(metaclass=abc.ABCMeta):
                     else x[0] if isinstance(x, tuple)
                     else x)
         df['RunUID_index'] = 0   # useless when aggregating
-        if 'RunUID' in df.columns:
-            df = df.drop(columns='RunUID')
 
         df = df.reset_index()
         return df
@@ -354,6 +884,31 @@ class PARQUET(metaclass=abc.ABCMeta):
                 for uid, year in zip(dict_runUID, years) for var in dict_runUID[uid]
                 ]
 
+    def _get_compacted_files_names(self, data_type: CatanaDataTypeEnum | str, dict_runUID: dict[str, list[str]],
+                                   years: list[int]) -> list[tuple[str, list[str], str]]:
+        """Creates the list of the compacted file paths of the runs.
+
+        Args:
+            data_type: the data_type of the object, needed to get the correct folder.
+            dict_runUID: a dict {runUID: list(variables requested)}
+            years: a list containing the years of the RunUIDs. Should be in the same order as the RunUIDs.
+
+        Returns:
+            A list of 3-uplet (RunUID, variables, file_path), without the runs with no variable requested.
+
+        Raises:
+            HTTPException : caused by a KeyError if the data_type is unknown.
+        """
+        try:
+            folder = self.folder_datatype[data_type]
+        except KeyError:
+            raise HTTPException(
+                status_code=400, detail=f'Unknown data type: {data_type}')
+
+        return [(uid, dict_runUID[uid], f'{self.parquet_path}{str(year)}/{uid}/{folder}{COMPACTED_FILE_NAME}')
+                for uid, year in zip(dict_runUID, years) if dict_runUID[uid]
+                ]
+
     def create_dict_runUID(self, variables:list[str] = None) -> dict[str, list[str]]:
         """ Creates the dict to read the parquet files. Assert unicity of runUIDs.
 
@@ -381,3 +936,68 @@ class PARQUET(metaclass=abc.ABCMeta):
                 else:
                     dict_runUID[uid] = self.variables.copy()
         return dict_runUID
+
+    def _get_lap_windows(self, laps: list[int] | None = None,
+                         start_time: float | None = None,
+                         end_time: float | None = None) -> dict[str, list[tuple[int, float, float | None]]]:
+        """Get the time window of the laps of each run matching a filter.
+
+        The laps come from CATANA.lap_meta_get and are numbered by their
+        LapCount. A lap without EndTime lasts until the end of the run.
+
+        Args:
+            laps: The LapCounts to keep, all of them if None.
+            start_time: Only the laps ending after this time (in seconds)
+            if not None.
+            end_time: Only the laps starting before this time (in seconds)
+            if not None.
+
+        Returns:
+            A dict {runUID: list of (LapCount, start, end)}, the times in
+            seconds since epoch, clipped to [start_time, end_time].
+        """
+        windows = {uid: [] for uid in self.run_uid}
+        lap_meta = CATANA().lap_meta_get(list(windows))
+        if lap_meta.empty or 'LapCount' not in lap_meta.columns:
+            return windows
+
+        epoch = pd.Timestamp(0, tz='UTC')
+        starts = (pd.to_datetime(lap_meta['StartTime'], utc=True) - epoch) / pd.Timedelta(seconds=1)
+        ends = (pd.to_datetime(lap_meta['EndTime'], utc=True) - epoch) / pd.Timedelta(seconds=1)
+        run_uids = {uid.upper(): uid for uid in windows}   # lap_meta_get upper-cases the runUIDs
+        for uid, lap_count, start, end in zip(lap_meta['RunUID'], lap_meta['LapCount'], starts, ends):
+            if uid not in run_uids or (laps is not None and lap_count not in laps):
+                continue
+            end = None if pd.isna(end) else end
+            if start_time is not None:
+                if end is not None and end < start_time:
+                    continue
+                start = max(start, start_time)
+            if end_time is not None:
+                if start > end_time:
+                    continue
+                end = end_time if end is None else min(end, end_time)
+            windows[run_uids[uid]].append((int(lap_count), float(start), end))
+        return windows
+
+    def select_laps(self, laps: list[int] | int | None = None,
+                    start_time: float | None = None,
+                    end_time: float | None = None) -> None:
+        """Restrict the lap-based data to some laps, by LapCount or by time.
+
+        Without any filter, every lap is kept.
+
+        Args:
+            laps: The LapCounts to keep, all of them if None or empty.
+            start_time: Only the laps ending after this time (in seconds)
+            if not None.
+            end_time: Only the laps starting before this time (in seconds)
+            if not None.
+        """
+        laps = self._check_if_list(laps) if laps else None
+        if laps is None and start_time is None and end_time is None:
+            self.laps = None
+            return
+        windows = self._get_lap_windows(laps, start_time, end_time)
+        self.laps = {uid: [lap_count for lap_count, _, _ in run_windows]
+                     for uid, run_windows in windows.items()}
@@ -1,4 +1,3 @@
-import json
 import pandas as pd
 
 from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
@@ -25,14 +24,13 @@ class RunData(PARQUET):
         for var in self.variables:
             if not var in run_data:
                 continue
-            js = json.loads(run_data[var])
-            if not js:
+            table = run_data[var]
+            if self._is_empty(table):
                 continue
-            runvar[var] = js['Run']['0']
+            runvar[var] = self._first_value(table, 'Run')
             
         if not runvar:
             return
-        runvar['RunUID'] = uid
         return runvar
 
     def process_data(self, update: bool) -> pd.DataFrame:
@@ -53,14 +51,17 @@ class RunData(PARQUET):
                                       competition = self.competition)
 
         processed_data = []
+        processed_uids = []
         for uid in dict_runUID:
             processed_run = self._process_run(uid, data[uid])
             if processed_run:
                 processed_data.append(processed_run)
+                processed_uids.append(uid)
         
         if not processed_data:   # que des None ie. aucun return de runvar
             return pd.DataFrame(columns=['RunUID_index'])
 
         res = pd.DataFrame(processed_data)
+        res['RunUID_index'] = self._run_index(processed_uids)
         res = self._encode_run_uid(res)
         return res
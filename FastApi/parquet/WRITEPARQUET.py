@@ -1,7 +1,7 @@
 import os
 import pandas as pd
 
-from parquet.PARQUET import PARQUET
+from parquet.PARQUET import COMPACTED_FILE_NAME, PARQUET
 
 
 class WRITEPARQUET(PARQUET):
@@ -14,4 +14,8 @@ class WRITEPARQUET(PARQUET):
         directory = os.path.dirname(path)
         if not os.path.exists(directory):
             os.makedirs(directory)
-        data.to_parquet(path, index=False)
\ No newline at end of file
+        data.to_parquet(path, index=False)
+        # the run is read from its per-variable files until compacted again
+        compacted = os.path.join(directory, COMPACTED_FILE_NAME)
+        if os.path.exists(compacted):
+            os.remove(compacted)
\ No newline at end of file
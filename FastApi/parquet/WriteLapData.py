@@ -45,7 +45,7 @@ class WriteLapData(WRITEPARQUET):
                 # create new dataframe and add the current lap
                 df = self._add_none_missing_value(pd.DataFrame())
             else: 
-                df = already_written[run_uid][var]
+                df = already_written[run_uid][var].to_pandas()
                 df = self._add_none_missing_value(df)
                 
             lap_name = 'Lap'+str(self.lapNb)
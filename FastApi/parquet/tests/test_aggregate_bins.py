@@ -0,0 +1,47 @@
+import unittest
+import unittest.mock
+
+import numpy as np
+import pandas as pd
+
+from parquet.CatanaAggregationEnum import CatanaAggregationEnum
+from parquet.PARQUET import PARQUET
+
+
+class TestAggregateBins(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.values = rng.normal(size=(40, 6)) * 1000
+        self.values[rng.random(self.values.shape) < 0.2] = np.nan
+        self.values[:, 0] = np.nan
+        self.values[1:, 1] = np.nan
+        self.df = pd.DataFrame({'h': self.values.ravel(),
+                                'Left': np.tile(np.arange(6.), 40),
+                                'Right': np.tile(np.arange(1., 7.), 40)})
+
+    def test_same_as_groupby(self):
+        agg = [a for a in CatanaAggregationEnum if a != CatanaAggregationEnum.NONE]
+        result = PARQUET._aggregate_runs(self.values, agg)
+        grouped = self.df.groupby('Left')['h']
+        for a in agg:
+            expected = grouped.agg(a.value).to_numpy()
+            np.testing.assert_array_equal(result[a.value], expected, a.value)
+            self.assertEqual(result[a.value].dtype, expected.dtype, a.value)
+
+    def test_aggregate_bins(self):
+        agg = [a for a in CatanaAggregationEnum if a != CatanaAggregationEnum.NONE]
+        expected = PARQUET._aggregate_df(unittest.mock.Mock(), self.df, by=['Left'],
+                                         agg_={'h': [a.value for a in agg], 'Right': 'first'})
+        pd.testing.assert_frame_equal(
+            PARQUET._aggregate_bins(self.df, 'h', ['Left'], ['Right'], agg), expected)
+
+    def test_irregular_bins(self):
+        agg = [CatanaAggregationEnum.SUM]
+        self.assertIsNone(PARQUET._aggregate_bins(self.df.iloc[:-1], 'h', ['Left'], ['Right'], agg))
+        self.df.loc[3, 'Left'] = np.nan
+        self.assertIsNone(PARQUET._aggregate_bins(self.df, 'h', ['Left'], ['Right'], agg))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+from itertools import product
+import unittest
+
+import numpy as np
+
+from parquet.AxisRegistry import AxisRegistry
+
+
+class TestAxisRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = AxisRegistry(max_entries=2)
+
+    def test_get_axis(self):
+        axis = self.registry.get_axis('h_xAxis', np.array([0., 1., 3.]))
+        self.assertIs(axis, self.registry.get_axis('h_xAxis', np.array([0., 1., 3.])))
+        self.assertIsNot(axis, self.registry.get_axis('h_xAxis', np.array([0., 2., 3.])))
+        np.testing.assert_array_equal(axis.left, [0., 1.])
+        np.testing.assert_array_equal(axis.right, [1., 3.])
+        with self.assertRaises(ValueError):
+            axis.left[0] = 5.
+
+    def test_eviction(self):
+        axis = self.registry.get_axis('a_xAxis', np.arange(3.))
+        self.registry.get_axis('b_xAxis', np.arange(3.))
+        self.registry.get_axis('a_xAxis', np.arange(3.))   # 'b_xAxis' becomes the least recently used
+        self.registry.get_axis('c_xAxis', np.arange(3.))
+        self.assertIs(axis, self.registry.get_axis('a_xAxis', np.arange(3.)))
+        self.assertEqual(len(self.registry._axes), 2)
+
+    def test_get_grid(self):
+        y_axis = self.registry.get_axis('m_yAxis', np.array([0., 1., 2.]))
+        x_axis = self.registry.get_axis('m_xAxis', np.array([0., 10., 20., 30.]))
+        grid = self.registry.get_grid(y_axis, x_axis)
+        expected = np.array(list(product(zip(y_axis.left, y_axis.right),
+                                          zip(x_axis.left, x_axis.right))), dtype=float)
+        np.testing.assert_array_equal(grid, expected.reshape(len(expected), 4))
+        self.assertIs(grid, self.registry.get_grid(y_axis, x_axis))
+
+
+if __name__ == '__main__':
+    unittest.main()
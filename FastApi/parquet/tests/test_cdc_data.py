@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from parquet.CatanaDataTypeEnum import CatanaDataTypeEnum
+from parquet.CDCData import CDCData
+
+
+class TestCDCData(unittest.TestCase):
+
+    def setUp(self):
+        self.parquet = object.__new__(CDCData)
+        self.parquet.data_type = CatanaDataTypeEnum.CDCDATA
+        self.parquet.run_uid = ['R1', 'R2']
+        self.cdc_info = pd.DataFrame({
+            'Identifier': ['id1', 'id1', 'id1', 'id0'],
+            'CDCUID': ['zz', 'aa', 'mm', 'bb'],
+            'CDCLimitUID': ['l3', 'l1', 'l2', 'l0']})
+        self.data = {
+            'R1': {'zz': self.cdc_table([[1., 2.], [3., 4.]]),
+                   'aa': self.cdc_table([[5.], [6.]]),
+                   'bb': self.cdc_table([[7., 8., 9.], [1., 2., 3.]])},
+            'R2': {'mm': self.cdc_table([[2.], [1.]]),
+                   'zz': self.cdc_table([[3., 3.], [4., 4.]]),
+                   'aa': self.cdc_table([[1., 1.], [2., 2.]])}}
+
+    @staticmethod
+    def cdc_table(values: list[list[float]]) -> pa.Table:
+        """A CDC payload: Duration then Occurrences rows, one column per lap."""
+        columns = {'Name': ['Duration', 'Occurrences']}
+        columns.update({str(lap + 1): [row[lap] for row in values]
+                        for lap in range(len(values[0]))})
+        return pa.table(columns)
+
+    def string_rows(self) -> pd.DataFrame:
+        """The rows of the runs with the UIDs as strings."""
+        rows = []
+        for uid in self.parquet.run_uid:
+            for id_, var, limit in self.cdc_info.itertuples(index=False):
+                if var not in self.data[uid]:
+                    continue
+                table = self.data[uid][var].to_pandas().set_index('Name')
+                for lap, column in enumerate(table.columns):
+                    rows.append({'Duration': table.loc['Duration', column],
+                                 'Occurrences': table.loc['Occurrences', column],
+                                 'LapCount': float(lap + 1), 'Identifier': id_,
+                                 'CDCLimitUID': limit, 'CDCUID': var,
+                                 'RunUID_index': 0})
+        return pd.DataFrame(rows)
+
+    def test_aggregation_order(self):
+        res = pd.concat([pd.DataFrame(self.parquet._process_run(
+            self.cdc_info, uid, self.data[uid], agg_requested=True))
+            for uid in self.parquet.run_uid])
+        agg = {'Occurrences': 'sum', 'Duration': 'sum', 'CDCLimitUID': 'first'}
+        by = ['Identifier', 'CDCUID']
+        result = self.parquet._aggregate_df(res, by=by, agg_=agg)
+        expected = self.parquet._aggregate_df(self.string_rows(), by=by, agg_=agg)
+
+        self.assertEqual(result['CDCUID'].astype(str).tolist(),
+                         ['bb', 'aa', 'mm', 'zz'])
+        pd.testing.assert_frame_equal(result.astype({'CDCUID': str, 'CDCLimitUID': str}),
+                                      expected, check_dtype=False)
+
+    def test_rows(self):
+        runvar = self.parquet._process_run(self.cdc_info, 'R1', self.data['R1'],
+                                           agg_requested=True)
+        expected = self.string_rows().iloc[:6]
+        self.assertEqual(list(runvar['CDCUID'].astype(str)), expected['CDCUID'].tolist())
+        np.testing.assert_array_equal(runvar['Duration'], expected['Duration'])
+        np.testing.assert_array_equal(runvar['LapCount'], expected['LapCount'])
+
+
+if __name__ == '__main__':
+    unittest.main()
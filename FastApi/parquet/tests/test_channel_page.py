@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from fastapi import HTTPException
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from parquet.Channel import (ChannelData, get_pyramid_path, read_channel_page,
+                             select_pyramid_level)
+from parquet.Decimation import envelope_indices
+
+
+class TestChannelPage(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'channels', 'vCar.parquet')
+        os.makedirs(os.path.dirname(self.path))
+        self.table = pa.table({'Time': np.arange(1000) * 10,
+                               'vCar': np.arange(1000, dtype=float)})
+        pq.write_table(self.table, self.path, row_group_size=100)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_time_window(self):
+        table, next_offset = read_channel_page(self.path, 0, None,
+                                               [(2.0, 2.99), (7.5, 7.55)])
+        self.assertIsNone(next_offset)
+        self.assertEqual(table['vCar'].to_pylist(),
+                         list(np.arange(200., 300.)) + list(np.arange(750., 756.)))
+
+    def test_pages(self):
+        values = []
+        offset = 0
+        while offset is not None:
+            table, offset = read_channel_page(self.path, offset, 150, [(1.0, None)])
+            self.assertLessEqual(table.num_rows, 150)
+            values.extend(table['vCar'].to_pylist())
+        self.assertEqual(values, list(np.arange(100., 1000.)))
+
+    def test_pyramid_level(self):
+        for factor in (10, 100):
+            level = get_pyramid_path(self.path, factor)
+            os.makedirs(os.path.dirname(level))
+            pq.write_table(self.table.take(envelope_indices(
+                self.table['vCar'].to_numpy(), factor)), level)
+        self.assertEqual(select_pyramid_level(self.path, 20), get_pyramid_path(self.path, 100))
+        self.assertEqual(select_pyramid_level(self.path, 100), get_pyramid_path(self.path, 10))
+        self.assertEqual(select_pyramid_level(self.path, 500), self.path)
+        # the levels older than the channel are ignored
+        mtime = os.stat(self.path).st_mtime
+        os.utime(get_pyramid_path(self.path, 100), (mtime - 10, mtime - 10))
+        self.assertEqual(select_pyramid_level(self.path, 20), get_pyramid_path(self.path, 10))
+
+    def test_cursor(self):
+        cursor = ChannelData._encode_cursor({'R1': {'vCar': 150}},
+                                            {'R1': [(1.0, None)], 'R2': []}, 150)
+        page = ChannelData._decode_cursor(cursor)
+        self.assertEqual(page['Offsets'], {'R1': {'vCar': 150}})
+        self.assertEqual(page['Windows'], {'R1': [(1.0, None)]})
+        self.assertEqual(page['MaxRows'], 150)
+        with self.assertRaises(HTTPException):
+            ChannelData._decode_cursor('not a cursor')
+
+
+if __name__ == '__main__':
+    unittest.main()
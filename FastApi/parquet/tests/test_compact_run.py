@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from parquet.PARQUET import compact_tables, read_compacted_table
+
+
+class TestCompactRun(unittest.TestCase):
+
+    def setUp(self):
+        self.tables = {
+            'vCar': pa.table({'Lap1': [1.5], 'Lap2': [None], 'Lap3': [3.0]}),
+            'hist': pa.table({'Value': [1, 2, 3, 4], 'Name': ['a', 'b', 'c', 'd']}),
+            'hist_xAxis': pa.table({'Value': [0.0, 1.0, 2.0, 3.0, 4.0]}),
+            'empty': pa.table({'Value': pa.array([], pa.float64())}),
+        }
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, '_run.parquet')
+        pq.write_table(compact_tables(self.tables), self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        result = read_compacted_table(self.path, list(self.tables))
+        self.assertEqual(result.keys(), self.tables.keys())
+        for var, table in self.tables.items():
+            self.assertTrue(result[var].equals(table), var)
+
+    def test_projection(self):
+        result = read_compacted_table(self.path, ['hist', 'unknown'])
+        self.assertEqual(list(result), ['hist'])
+        pd.testing.assert_frame_equal(result['hist'].to_pandas(),
+                                      self.tables['hist'].to_pandas())
+
+    def test_updated_variable(self):
+        compacted_time = os.stat(self.path).st_mtime_ns
+        for var, table in self.tables.items():
+            path = os.path.join(self.directory.name, f'{var}.parquet')
+            pq.write_table(table, path)
+            os.utime(path, ns=(compacted_time, compacted_time))
+        # rewritten by the computations after the compaction
+        os.utime(os.path.join(self.directory.name, 'vCar.parquet'),
+                 ns=(compacted_time + 10**9, compacted_time + 10**9))
+
+        result = read_compacted_table(self.path, list(self.tables))
+        self.assertEqual(sorted(result), ['empty', 'hist', 'hist_xAxis'])
+
+    def test_not_compacted(self):
+        os.remove(self.path)
+        self.assertEqual(read_compacted_table(self.path, ['hist']), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
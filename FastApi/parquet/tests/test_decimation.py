@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from parquet.CatanaDecimationEnum import CatanaDecimationEnum
+from parquet.Decimation import decimate, lttb_indices, minmax_indices
+
+
+class TestDecimation(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.time = np.arange(10_000) / 1e3
+        self.values = np.sin(self.time * 5) + rng.normal(size=self.time.size)
+        self.values[rng.random(self.time.size) < 0.01] = np.nan
+
+    def test_max_points(self):
+        for decimation in CatanaDecimationEnum:
+            indices = decimate(self.time, self.values, 500, decimation)
+            self.assertLessEqual(indices.size, 500)
+            self.assertEqual((indices[0], indices[-1]), (0, self.time.size - 1))
+            self.assertTrue(np.all(np.diff(indices) > 0))
+        np.testing.assert_array_equal(
+            decimate(self.time, self.values, 20_000, CatanaDecimationEnum.LTTB),
+            np.arange(self.time.size))
+
+    def test_minmax_extrema(self):
+        kept = self.values[minmax_indices(self.values, 100)]
+        self.assertEqual(np.nanmax(kept), np.nanmax(self.values))
+        self.assertEqual(np.nanmin(kept), np.nanmin(self.values))
+
+    def test_lttb_peak(self):
+        values = np.zeros(self.time.size)
+        values[4321] = 10.
+        self.assertIn(4321, lttb_indices(self.time, values, 50))
+
+
+if __name__ == '__main__':
+    unittest.main()
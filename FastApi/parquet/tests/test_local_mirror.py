@@ -0,0 +1,135 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from parquet.LocalMirror import LocalMirror
+
+
+class TestLocalMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.share = tempfile.TemporaryDirectory()
+        self.local = tempfile.TemporaryDirectory()
+        self.reads = []
+
+    def tearDown(self):
+        self.share.cleanup()
+        self.local.cleanup()
+
+    def write_source(self, name: str, values: list) -> str:
+        path = os.path.join(self.share.name, name)
+        pq.write_table(pa.table({'Time': values, 'vCar': values}), path)
+        return path
+
+    def read_table(self, path: str) -> pa.Table:
+        self.reads.append(path)
+        return pq.read_table(path)
+
+    def test_read(self):
+        mirror = LocalMirror(self.local.name, 1 << 30, revalidation_interval=60)
+        path = self.write_source('vCar.parquet', [1, 2, 3])
+        self.assertEqual(mirror.read(path, self.read_table).column('vCar').to_pylist(), [1, 2, 3])
+        self.assertEqual(mirror.read(path, self.read_table).column('vCar').to_pylist(), [1, 2, 3])
+        self.assertEqual(self.reads, [path])
+
+        # the copies are reused by a new process
+        restarted = LocalMirror(self.local.name, 1 << 30, revalidation_interval=60)
+        self.assertEqual(restarted.size, mirror.size)
+        restarted.read(path, self.read_table)
+        self.assertEqual(self.reads, [path])
+
+    def test_modified_source(self):
+        mirror = LocalMirror(self.local.name, 1 << 30, revalidation_interval=0)
+        path = self.write_source('vCar.parquet', [1, 2, 3])
+        mirror.read(path, self.read_table)
+        stat = os.stat(path)
+        self.write_source('vCar.parquet', [4, 5])
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(mirror.read(path, self.read_table).column('vCar').to_pylist(), [4, 5])
+        self.assertEqual(self.reads, [path, path])
+
+        with self.assertRaises(FileNotFoundError):
+            mirror.read(os.path.join(self.share.name, 'missing.parquet'), self.read_table)
+
+    def test_eviction(self):
+        first = self.write_source('a.parquet', list(range(1000)))
+        second = self.write_source('b.parquet', list(range(1000)))
+        mirror = LocalMirror(self.local.name, 1 << 30, revalidation_interval=60)
+        mirror.read(first, self.read_table)
+        mirror.max_bytes = mirror.size
+        mirror.read(second, self.read_table)
+        self.assertEqual(len(os.listdir(self.local.name)), 1)
+        self.assertLessEqual(mirror.size, mirror.max_bytes)
+        self.assertEqual(list(mirror._sources), [second])
+
+        mirror.read(first, self.read_table)
+        self.assertEqual(self.reads, [first, second, first])
+
+    def test_listing(self):
+        paths = [self.write_source(f'{name}.parquet', list(range(1000))) for name in 'abcd']
+        mirror = LocalMirror(self.local.name, 1 << 30, revalidation_interval=60)
+        with patch.object(mirror, '_scan', wraps=mirror._scan) as scan:
+            # below max_bytes: the directory isn't listed at each copy
+            for path in paths[:3]:
+                mirror.read(path, self.read_table)
+            self.assertEqual(scan.call_count, 0)
+            # listed once the estimate goes over max_bytes
+            mirror.max_bytes = mirror.size
+            mirror.read(paths[3], self.read_table)
+            self.assertEqual(scan.call_count, 1)
+        self.assertEqual(len(os.listdir(self.local.name)), 3)
+        self.assertNotIn(paths[0], mirror._sources)
+
+    def test_shared_directory(self):
+        # two workers sharing the directory
+        first = self.write_source('a.parquet', list(range(1000)))
+        second = self.write_source('b.parquet', list(range(1000)))
+        worker = LocalMirror(self.local.name, 1 << 30, revalidation_interval=60)
+        other = LocalMirror(self.local.name, 1 << 30, revalidation_interval=60)
+        worker.read(first, self.read_table)
+        other.read(first, self.read_table)
+        self.assertEqual(self.reads, [first])
+        self.assertEqual(other.size, worker.size)
+
+        # the copies of both workers are bounded by max_bytes
+        worker.max_bytes = other.max_bytes = worker.size
+        other.read(second, self.read_table)
+        self.assertEqual(len(os.listdir(self.local.name)), 1)
+        worker.read(second, self.read_table)
+        self.assertEqual(self.reads, [first, second])
+        self.assertEqual(len(os.listdir(self.local.name)), 1)
+
+    def test_failed_removal(self):
+        first = self.write_source('a.parquet', list(range(1000)))
+        second = self.write_source('b.parquet', list(range(1000)))
+        third = self.write_source('c.parquet', list(range(1000)))
+        mirror = LocalMirror(self.local.name, 1 << 30, revalidation_interval=60)
+        mirror.read(first, self.read_table)
+        mirror.max_bytes = mirror.size
+        # the copy of the first file is still memory-mapped (Windows)
+        with patch('os.remove', side_effect=PermissionError):
+            mirror.read(second, self.read_table)
+        self.assertEqual(len(os.listdir(self.local.name)), 2)
+        self.assertEqual(mirror.size, 2 * mirror.max_bytes)
+
+        mirror.read(third, self.read_table)
+        self.assertEqual(len(os.listdir(self.local.name)), 1)
+        self.assertEqual(mirror.size, mirror.max_bytes)
+
+    def test_tmp_files(self):
+        old = os.path.join(self.local.name, 'old.arrow.1.2.tmp')
+        recent = os.path.join(self.local.name, 'recent.arrow.1.2.tmp')
+        for path in (old, recent):
+            open(path, 'wb').close()
+        os.utime(old, (time.time() - 2 * LocalMirror.tmp_max_age,) * 2)
+        LocalMirror(self.local.name, 1 << 30, revalidation_interval=60)
+        self.assertEqual(os.listdir(self.local.name), ['recent.arrow.1.2.tmp'])
+
+
+if __name__ == '__main__':
+    unittest.main()
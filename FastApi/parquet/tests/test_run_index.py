@@ -0,0 +1,29 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from parquet.RunData import RunData
+
+
+class TestRunIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.parquet = object.__new__(RunData)
+        self.parquet.run_uid = ['A', 'B', 'A', 'C']
+
+    def test_run_index(self):
+        index = self.parquet._run_index(['A', 'C', 'B'], [2, 0, 3])
+        np.testing.assert_array_equal(index, [2, 2, 1, 1, 1])
+        self.assertEqual(index.dtype, np.int32)
+        with self.assertRaises(KeyError):
+            self.parquet._run_index(['D'])
+
+    def test_encode_run_uid(self):
+        df = pd.DataFrame({'RunUID_index': self.parquet._run_index(['C'])})
+        self.assertEqual(self.parquet._encode_run_uid(df).attrs['RunUID'],
+                         ['A', 'B', 'A', 'C'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+import threading
+import time
+
+import numpy as np
+import yaml
+
+# Number of latencies kept to compute the percentiles of an executor.
+LATENCY_WINDOW = 1000
+
+
+class MonitoredExecutor:
+    """
+    Bounded thread pool running the blocking work of the endpoints off the
+    event loop.
+
+    Keeps the number of queued and running calls, and the time the last
+    calls waited in the queue and ran.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._waits = deque(maxlen=LATENCY_WINDOW)
+        self._durations = deque(maxlen=LATENCY_WINDOW)
+
+    def _call(self, submitted: float, func, *args, **kwargs):
+        """
+        Runs func in a worker thread and records its latencies.
+        """
+        start = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._waits.append(start - submitted)
+        failed = True
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._failed += failed
+                self._durations.append(time.monotonic() - start)
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Runs a blocking function in the executor without blocking the event
+        loop.
+
+        Args:
+            func: The blocking function.
+            *args, **kwargs: The arguments of func.
+
+        Returns:
+            The result of func.
+        """
+        with self._lock:
+            self._queued += 1
+        loop = asyncio.get_running_loop()
+        call = partial(self._call, time.monotonic(), func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    def stats(self) -> dict:
+        """
+        Gives the queue depth and latencies of the executor.
+
+        Returns:
+            dict: The counters, and the median, 95th percentile and maximum
+            of the queue waits and run durations of the last calls, in
+            seconds.
+        """
+        with self._lock:
+            waits = np.array(self._waits)
+            durations = np.array(self._durations)
+            stats = {'max_workers': self.max_workers,
+                     'queued': self._queued,
+                     'running': self._running,
+                     'completed': self._completed,
+                     'failed': self._failed}
+        for name, values in (('wait', waits), ('duration', durations)):
+            if values.size:
+                stats[name] = {'p50': float(np.percentile(values, 50)),
+                               'p95': float(np.percentile(values, 95)),
+                               'max': float(values.max())}
+            else:
+                stats[name] = None
+        return stats
+
+
+def run_in(executor: MonitoredExecutor):
+    """
+    Decorator running a blocking endpoint in an executor. The decorated
+    endpoint is a coroutine, so FastAPI awaits it on the event loop instead
+    of using its default thread pool.
+
+    Args:
+        executor (MonitoredExecutor): The executor of the blocking work.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await executor.run(func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+with open('./config/executors.yml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+# SQL Server queries, bounded by the connections of the engines
+sql_executor = MonitoredExecutor('sql', config['sql_workers'])
+# parquet files and Redis cache, then processing of the data
+disk_executor = MonitoredExecutor('disk', config['disk_workers'])
+
+executors = {executor.name: executor
+             for executor in (sql_executor, disk_executor)}
@@ -0,0 +1,496 @@
+import json
+import logging
+from json.encoder import encode_basestring_ascii
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cache.payload_codec import to_table
+
+logger = logging.getLogger('main_log')
+
+# Approximate number of values serialized in one chunk of a response.
+CHUNK_VALUES = 100000
+
+# Size of the beginning of a response serialized before the response
+# starts, so that most serialization errors are still sent as a 500.
+FIRST_CHUNK_SIZE = 1 << 16
+
+# The separators of the objects of a document: (item separator, key
+# separator), like the separators parameter of json.dumps. The lists
+# always keep the ', ' of json.dumps.
+DEFAULT_SEPARATORS = (', ', ': ')
+# The layout of the get_channels documents.
+COMPACT_SEPARATORS = (',', ':')
+
+# The field of the JSON documents, and the key of the Arrow and parquet
+# schema metadata, listing the runUIDs of the RunUID_index column.
+RUN_UID_KEY = 'RunUID'
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MEDIA_TYPE = 'application/vnd.apache.parquet'
+
+
+def _chunk_rows(df: pd.DataFrame) -> int:
+    """
+    Computes the number of rows serialized per chunk.
+
+    Args:
+        df (pd.DataFrame): The dataframe to serialize.
+
+    Returns:
+        int: A number of rows holding about CHUNK_VALUES values.
+    """
+    return max(1, CHUNK_VALUES // max(1, df.shape[1]))
+
+
+def _run_uids(df: pd.DataFrame) -> list[str] | None:
+    """
+    Gets the runUIDs the RunUID_index column of a dataframe refers to, set
+    by PARQUET._encode_run_uid, None for the aggregated data.
+    """
+    return df.attrs.get(RUN_UID_KEY)
+
+
+def _float_token(value: float) -> str:
+    """
+    Encodes a float like json.dumps.
+    """
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return 'Infinity' if value > 0 else '-Infinity'
+    return float.__repr__(value)
+
+
+def _value_token(value: Any) -> str:
+    """
+    Encodes a value of an object column like json.dumps.
+    """
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, int):
+        return int.__repr__(value)
+    if isinstance(value, float):
+        return _float_token(value)
+    return json.dumps(value)
+
+
+def _numeric_tokens(values: np.ndarray) -> list[str]:
+    """
+    Encodes numeric values like json.dumps(values.tolist()).
+    """
+    if values.dtype.kind != 'f':
+        return list(map(int.__repr__, values.tolist()))
+    tokens = list(map(float.__repr__, values.tolist()))
+    for i in np.flatnonzero(~np.isfinite(values)).tolist():
+        tokens[i] = _float_token(float(values[i]))
+    return tokens
+
+
+class _ColumnEncoder:
+    """
+    Encodes the values of a column like json.dumps(values.tolist()), by
+    slices of rows.
+
+    When most values repeat (the bins, the RunUID_index, the empty bins),
+    each distinct value of the column is encoded once.
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        self.tokens = None
+        self.inverse = None
+        kind = values.dtype.kind
+        if kind == 'b':
+            self.tokens = np.array(['false', 'true'], dtype=object)
+            self.inverse = values.view(np.int8)
+        elif kind in 'fiu':
+            self.values = np.ascontiguousarray(values)
+            # on the bits, to keep -0.0 apart from 0.0
+            bits = self.values.view(f'i{values.itemsize}') if kind == 'f' else self.values
+            unique, inverse = np.unique(bits, return_inverse=True)
+            if 2 * len(unique) <= len(values):
+                self.tokens = np.array(_numeric_tokens(unique.view(values.dtype)),
+                                       dtype=object)
+                self.inverse = inverse.reshape(-1)
+        elif pd.api.types.infer_dtype(values, skipna=False) == 'string':
+            # the RunUID or Name columns, with a few distinct values
+            inverse, unique = pd.factorize(values)
+            self.tokens = np.array(list(map(encode_basestring_ascii, unique)),
+                                   dtype=object)
+            self.inverse = inverse
+
+    def encode(self, start: int, stop: int) -> list[str]:
+        """
+        Encodes the values of the rows start to stop.
+
+        Returns:
+            list[str]: The JSON token of each value.
+        """
+        if self.tokens is not None:
+            return self.tokens[self.inverse[start:stop]].tolist()
+        if self.values.dtype.kind in 'fiu':
+            return _numeric_tokens(self.values[start:stop])
+        return [_value_token(v) for v in self.values[start:stop].tolist()]
+
+
+def _rows_json(columns: list[list[str]], nb_rows: int) -> str:
+    """
+    Joins the tokens of the columns in rows, like json.dumps of a list of
+    rows without its brackets.
+
+    Args:
+        columns (list[list[str]]): The tokens of each column.
+        nb_rows (int): The number of rows.
+
+    Returns:
+        str: The rows, separated by ', '.
+    """
+    if not columns:
+        return ', '.join(['[]'] * nb_rows)
+    nb_columns = len(columns)
+    columns[0] = list(map('['.__add__, columns[0]))
+    columns[-1] = [token + ']' for token in columns[-1]]
+    tokens = [None] * (nb_rows * nb_columns)
+    for j, column in enumerate(columns):
+        tokens[j::nb_columns] = column
+    return ', '.join(tokens)
+
+
+def iter_dataframe_json(df: pd.DataFrame,
+                        separators: tuple[str, str] = DEFAULT_SEPARATORS) -> Iterator[str]:
+    """
+    Serializes a dataframe by chunks of rows.
+
+    The layout is the one of json.dumps on the dict {'columns': list of
+    the columns, 'index': list of the row numbers, 'data':
+    df.values.tolist()}, byte for byte. The rows are built from the
+    tokens of each column, without the object matrix of df.values. The
+    dict ends with a 'RunUID' list when the RunUID_index column refers to
+    runUIDs, index i being the runUID at position i.
+
+    Args:
+        df (pd.DataFrame): The dataframe to serialize.
+        separators (tuple[str, str]): The separators of the dict.
+
+    Yields:
+        str: The next fragment of the JSON document.
+    """
+    nb_rows = df.shape[0]
+    step = _chunk_rows(df)
+    # the dtype df.values would convert every column to
+    dtype = df.iloc[:0].values.dtype
+    encoders = []
+    for j in range(df.shape[1]):
+        column = df.iloc[:, j]
+        if dtype == object and isinstance(column.dtype, np.dtype) and column.dtype.kind in 'biuf':
+            # df.values boxes these values in the Python types encoded the same way
+            encoders.append(_ColumnEncoder(column.to_numpy()))
+        else:
+            encoders.append(_ColumnEncoder(column.to_numpy(dtype=dtype)))
+    item_separator, key_separator = separators
+    yield ('{"columns"' + key_separator + json.dumps(list(df.columns))
+           + item_separator + '"index"' + key_separator + '[')
+    for start in range(0, nb_rows, step):
+        if start:
+            yield ', '
+        yield ', '.join(map(str, range(start, min(start + step, nb_rows))))
+    yield ']' + item_separator + '"data"' + key_separator + '['
+    for start in range(0, nb_rows, step):
+        if start:
+            yield ', '
+        stop = min(start + step, nb_rows)
+        columns = [encoder.encode(start, stop) for encoder in encoders]
+        yield _rows_json(columns, stop - start)
+    yield ']'
+    run_uids = _run_uids(df)
+    if run_uids is not None:
+        yield item_separator + json.dumps(RUN_UID_KEY) + key_separator + json.dumps(run_uids)
+    yield '}'
+
+
+def iter_split_json(df: pd.DataFrame, reencode: bool = False) -> Iterator[str]:
+    """
+    Serializes a dataframe by chunks of rows, in the split orient.
+
+    The concatenated chunks are the same as
+    df.to_json(orient="split", date_format="iso", default_handler=str),
+    followed by a 'RunUID' list like iter_dataframe_json.
+
+    Args:
+        df (pd.DataFrame): The dataframe to serialize.
+        reencode (bool): If True, the chunks are re-encoded like
+            json.dumps(json.loads(df.to_json(...))) of the endpoints
+            embedding the dataframe in a bigger document.
+
+    Yields:
+        str: The next fragment of the JSON document.
+    """
+    def to_json(data: pd.DataFrame | pd.Series, orient: str) -> str:
+        s = data.to_json(orient=orient, date_format="iso", default_handler=str)
+        return json.dumps(json.loads(s)) if reencode else s
+
+    separator = ', ' if reencode else ','
+    nb_rows = df.shape[0]
+    step = _chunk_rows(df)
+    columns = json.loads(df.iloc[:0].to_json(orient="split"))['columns']
+    if reencode:
+        yield '{"columns": ' + json.dumps(columns) + ', "index": ['
+    else:
+        yield '{"columns":' + json.dumps(columns, separators=(',', ':')) + ',"index":['
+    for start in range(0, nb_rows, step):
+        if start:
+            yield separator
+        index = pd.Series(df.index[start:start + step])
+        yield to_json(index, "values")[1:-1]
+    yield '], "data": [' if reencode else '],"data":['
+    for start in range(0, nb_rows, step):
+        if start:
+            yield separator
+        yield to_json(df.iloc[start:start + step], "values")[1:-1]
+    yield ']'
+    run_uids = _run_uids(df)
+    if run_uids is not None:
+        key_separator = ': ' if reencode else ':'
+        yield separator + json.dumps(RUN_UID_KEY) + key_separator \
+            + json.dumps(run_uids, separators=(separator, key_separator))
+    yield '}'
+
+
+def iter_json_object(items: dict[str, Iterable[str] | Any],
+                     separators: tuple[str, str] = DEFAULT_SEPARATORS) -> Iterator[str]:
+    """
+    Serializes a dict whose values are either JSON serializable or already
+    serialized by chunks.
+
+    Values given as iterators (the generators of this module) are streamed
+    as is, other values go through json.dumps. The layout is the one of
+    json.dumps.
+
+    Args:
+        items (dict[str, Iterable[str] | Any]): The dict to serialize.
+        separators (tuple[str, str]): The separators of the dict.
+
+    Yields:
+        str: The next fragment of the JSON document.
+    """
+    item_separator, key_separator = separators
+    yield '{'
+    for i, (key, value) in enumerate(items.items()):
+        if i:
+            yield item_separator
+        yield json.dumps(key) + key_separator
+        if isinstance(value, Iterator):
+            yield from value
+        else:
+            yield json.dumps(value)
+    yield '}'
+
+
+def iter_dataframes(result: dict[str, pd.DataFrame],
+                    separators: tuple[str, str] = DEFAULT_SEPARATORS) -> Iterator[str]:
+    """
+    Serializes the dataframes of each variable returned by process_data.
+
+    Each dataframe is serialized with iter_dataframe_json.
+
+    Args:
+        result (dict[str, pd.DataFrame]): The dataframes, by variable.
+        separators (tuple[str, str]): The separators of the dicts.
+
+    Yields:
+        str: The next fragment of the JSON document.
+    """
+    return iter_json_object({k: iter_dataframe_json(v, separators)
+                             for k, v in result.items()}, separators)
+
+
+def _error_marker(exc: Exception) -> str:
+    """
+    Encodes the error ending a JSON document whose serialization failed,
+    like the 500 responses of main.py, on a new line.
+    """
+    message = f"{exc.__class__.__name__} : {str(exc.args)}"
+    return '\n' + json.dumps({'status_code': 10500, 'message': message,
+                               'data': None})
+
+
+def iter_response(chunks: Iterator[str | bytes]) -> Iterator[str | bytes]:
+    """
+    Serializes the beginning of a document before its response starts.
+
+    The first FIRST_CHUNK_SIZE characters (or bytes) are serialized at
+    the call, so an error there is raised before the status of the
+    response is sent. An error in a JSON document after that is logged
+    and the document ends with the error encoded like the 500 responses,
+    on a new line: the document is no longer valid JSON. An error in a
+    binary document is raised, which closes the connection before the end
+    of the response.
+
+    Args:
+        chunks (Iterator[str | bytes]): The fragments of the document.
+
+    Returns:
+        Iterator[str | bytes]: The fragments to stream.
+    """
+    head, size = [], 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= FIRST_CHUNK_SIZE:
+            break
+    first = head[0][:0].join(head) if head else ''
+    return _iter_tail(first, chunks)
+
+
+def _iter_tail(first: str | bytes, chunks: Iterator[str | bytes]) -> Iterator[str | bytes]:
+    """
+    Streams the beginning serialized by iter_response, then the rest of
+    the document.
+    """
+    if first:
+        yield first
+    try:
+        yield from chunks
+    except Exception as exc:
+        logger.exception(' Serialization of a streamed response failed')
+        if isinstance(first, bytes):
+            raise
+        yield _error_marker(exc)
+
+
+class _ChunkSink:
+    """
+    File-like object keeping the bytes written by an Arrow writer until
+    they are sent.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def pop(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _to_batches(result: dict[str, pd.DataFrame] | pd.DataFrame) -> tuple[pa.Schema, list[tuple[pa.RecordBatch, dict]]]:
+    """
+    Converts the output of process_data to record batches sharing a schema.
+
+    A dict of dataframes gives one record batch per variable, with the
+    variable in a first 'Variable' column and in the custom metadata of
+    the batch. The schemas of the variables are unified, the columns
+    missing from a variable are null. The runUIDs of the RunUID_index
+    column are listed, as JSON, under the 'RunUID' key of the schema
+    metadata.
+
+    Args:
+        result (dict[str, pd.DataFrame] | pd.DataFrame): The processed data.
+
+    Returns:
+        tuple[pa.Schema, list[tuple[pa.RecordBatch, dict]]]: The schema and
+        the list of (record batch, custom metadata).
+    """
+    if isinstance(result, pd.DataFrame):
+        table = to_table(result)
+        table = table.replace_schema_metadata(_with_run_uids(table.schema, [result]).metadata)
+        return table.schema, [(_to_batch(table), None)]
+
+    tables = {var: to_table(df) for var, df in result.items()}
+    schema = pa.unify_schemas([pa.schema([])] + [table.schema for table in tables.values()],
+                              promote_options='permissive')
+    schema = schema.insert(0, pa.field('Variable', pa.string()))
+    schema = _with_run_uids(schema, result.values())
+    batches = []
+    for var, table in tables.items():
+        columns = [pa.array([var] * table.num_rows, pa.string())]
+        for field in list(schema)[1:]:
+            if field.name in table.column_names:
+                columns.append(table[field.name].cast(field.type))
+            else:
+                columns.append(pa.nulls(table.num_rows, field.type))
+        table = pa.Table.from_arrays(columns, schema=schema)
+        batches.append((_to_batch(table), {'variable': var}))
+    return schema, batches
+
+
+def _with_run_uids(schema: pa.Schema, dfs: Iterable[pd.DataFrame]) -> pa.Schema:
+    """
+    Lists the runUIDs of the RunUID_index column in the schema metadata,
+    the dataframes of a result sharing the runUIDs of the request.
+    """
+    for df in dfs:
+        run_uids = _run_uids(df)
+        if run_uids is not None:
+            return schema.with_metadata({RUN_UID_KEY: json.dumps(run_uids)})
+    return schema
+
+
+def _to_batch(table: pa.Table) -> pa.RecordBatch:
+    """
+    Converts a table to a single record batch, even without rows.
+    """
+    return pa.RecordBatch.from_arrays(
+        [column.combine_chunks() for column in table.columns],
+        schema=table.schema)
+
+
+def iter_arrow_stream(result: dict[str, pd.DataFrame] | pd.DataFrame) -> Iterator[bytes]:
+    """
+    Serializes the output of process_data as an Arrow IPC stream, with one
+    record batch per variable.
+
+    Args:
+        result (dict[str, pd.DataFrame] | pd.DataFrame): The processed data.
+
+    Yields:
+        bytes: The schema, then each record batch.
+    """
+    schema, batches = _to_batches(result)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema) as writer:
+        for batch, metadata in batches:
+            writer.write_batch(batch, custom_metadata=metadata)
+            yield sink.pop()
+    yield sink.pop()
+
+
+def to_parquet_bytes(result: dict[str, pd.DataFrame] | pd.DataFrame) -> bytes:
+    """
+    Serializes the output of process_data as a parquet file, with one row
+    group per variable.
+
+    Args:
+        result (dict[str, pd.DataFrame] | pd.DataFrame): The processed data.
+
+    Returns:
+        bytes: The parquet file.
+    """
+    schema, batches = _to_batches(result)
+    sink = pa.BufferOutputStream()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch, _ in batches:
+            writer.write_batch(batch, row_group_size=max(1, batch.num_rows))
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,37 @@
+import asyncio
+import unittest
+
+from utils.executors import MonitoredExecutor, run_in
+
+
+class TestExecutors(unittest.TestCase):
+
+    def test_run_in(self):
+        executor = MonitoredExecutor('test', 2)
+
+        @run_in(executor)
+        def blocking(x, y=1):
+            return x + y
+
+        async def main():
+            return await asyncio.gather(*(blocking(i, y=10) for i in range(5)))
+
+        self.assertEqual(asyncio.run(main()), [10, 11, 12, 13, 14])
+        stats = executor.stats()
+        self.assertEqual((stats['queued'], stats['running'], stats['completed']),
+                         (0, 0, 5))
+        self.assertIsNotNone(stats['wait'])
+
+    def test_failed(self):
+        executor = MonitoredExecutor('test', 1)
+
+        async def main():
+            await executor.run(int, 'not a number')
+
+        with self.assertRaises(ValueError):
+            asyncio.run(main())
+        self.assertEqual(executor.stats()['failed'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
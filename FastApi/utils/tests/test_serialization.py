@@ -0,0 +1,144 @@
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils import serialization
+from utils.serialization import (COMPACT_SEPARATORS, iter_arrow_stream,
+                                 iter_dataframe_json, iter_dataframes,
+                                 iter_json_object, iter_response,
+                                 iter_split_json, to_parquet_bytes)
+
+
+def split_dict(df: pd.DataFrame) -> dict:
+    return {'columns': list(df.columns),
+            'index': list(range(df.shape[0])),
+            'data': df.values.tolist()}
+
+
+class TestSerialization(unittest.TestCase):
+
+    def setUp(self):
+        self.dfs = [
+            pd.DataFrame({'Left': np.arange(23) / 3, 'sum': np.arange(23),
+                          'Name': ['a"é'] * 23,
+                          'Value': [None, 1.5] * 11 + [np.nan]}),
+            pd.DataFrame({'Lap1': [1.0, np.inf], 'Lap2': [-np.inf, 1e-7]},
+                         index=[4, 7]),
+            pd.DataFrame(columns=['RunUID_index', 'LapCount']),
+        ]
+        # several chunks per dataframe
+        patcher = patch.object(serialization, 'CHUNK_VALUES', 7)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_dataframe_json(self):
+        for df in self.dfs:
+            self.assertEqual(''.join(iter_dataframe_json(df)),
+                             json.dumps(split_dict(df)))
+        result = {'a': self.dfs[0], 'b': self.dfs[1]}
+        self.assertEqual(''.join(iter_dataframes(result)),
+                         json.dumps({k: split_dict(v) for k, v in result.items()}))
+
+    def test_compact_separators(self):
+        # the layout of get_channels: compact dicts, lists of json.dumps
+        result = {'a': self.dfs[0], 'b': self.dfs[2]}
+        expected = ','.join(
+            f'{json.dumps(k)}:{{"columns":{json.dumps(d["columns"])},'
+            f'"index":{json.dumps(d["index"])},"data":{json.dumps(d["data"])}}}'
+            for k, d in ((k, split_dict(v)) for k, v in result.items()))
+        self.assertEqual(''.join(iter_dataframes(result, COMPACT_SEPARATORS)),
+                         '{' + expected + '}')
+
+    def test_dataframe_json_dtypes(self):
+        # same bytes as json.dumps on df.values, whatever it is converted to
+        dfs = [
+            pd.DataFrame({'a': [-0.0, 0.0, np.nan, np.inf, -np.inf] * 4,
+                          'b': np.arange(20)}),
+            pd.DataFrame({'a': np.linspace(0, 1, 20, dtype=np.float32)}),
+            pd.DataFrame({'a': [True, False] * 10, 'b': np.arange(20)}),
+            pd.DataFrame({'a': ['x', 'y'] * 10, 'b': np.zeros(20)}),
+            pd.DataFrame({'a': [1, 1.0, True, 'x', None] * 4}),
+        ]
+        for df in dfs:
+            self.assertEqual(''.join(iter_dataframe_json(df)),
+                             json.dumps(split_dict(df)))
+
+    def test_split_json(self):
+        for df in self.dfs:
+            expected = df.to_json(orient="split", date_format="iso",
+                                  default_handler=str)
+            self.assertEqual(''.join(iter_split_json(df)), expected)
+            self.assertEqual(''.join(iter_split_json(df, reencode=True)),
+                             json.dumps(json.loads(expected)))
+
+    def test_json_object(self):
+        items = {'cdc_info': iter_dataframes({'a': self.dfs[1]}),
+                 'cdc_data': 'string'}
+        expected = {'cdc_info': {'a': split_dict(self.dfs[1])},
+                    'cdc_data': 'string'}
+        self.assertEqual(''.join(iter_json_object(items)), json.dumps(expected))
+
+    def test_response(self):
+        def failing(nb_chunks):
+            yield from ['{"a": ', '[1', ', 2'][:nb_chunks]
+            raise TypeError('not serializable')
+
+        with patch.object(serialization, 'FIRST_CHUNK_SIZE', 8):
+            # before the response starts: raised, sent as a 500
+            with self.assertRaises(TypeError):
+                iter_response(failing(1))
+            # after: the document ends with the error
+            chunks = list(iter_response(failing(3)))
+            self.assertEqual(chunks[:2], ['{"a": [1', ', 2'])
+            document, error = ''.join(chunks).split('\n')
+            self.assertEqual(document, '{"a": [1, 2')
+            self.assertEqual(json.loads(error)['status_code'], 10500)
+            # binary documents are cut
+            with self.assertRaises(TypeError):
+                list(iter_response(c.encode() for c in failing(3)))
+            self.assertEqual(list(iter_response(iter(['{', '}']))), ['{}'])
+
+    def test_run_uids(self):
+        df = pd.DataFrame({'Value': [1.5, 2.0, 3.0],
+                           'RunUID_index': np.array([1, 0, 1], dtype=np.int32)})
+        df.attrs['RunUID'] = ['A', 'B']
+        expected = dict(split_dict(df), RunUID=['A', 'B'])
+        self.assertEqual(''.join(iter_dataframe_json(df)), json.dumps(expected))
+        self.assertEqual(json.loads(''.join(iter_dataframes({'a': df}, COMPACT_SEPARATORS))),
+                         {'a': expected})
+        split = json.loads(df.to_json(orient="split"))
+        self.assertEqual(json.loads(''.join(iter_split_json(df))),
+                         dict(split, RunUID=['A', 'B']))
+        self.assertEqual(''.join(iter_split_json(df, reencode=True)),
+                         json.dumps(dict(split, RunUID=['A', 'B'])))
+
+        for result in (df, {'a': df, 'b': self.dfs[1]}):
+            schema = pa.ipc.open_stream(b''.join(iter_arrow_stream(result))).schema
+            self.assertEqual(json.loads(schema.metadata[b'RunUID']), ['A', 'B'])
+            schema = pq.read_schema(io.BytesIO(to_parquet_bytes(result)))
+            self.assertEqual(json.loads(schema.metadata[b'RunUID']), ['A', 'B'])
+        self.assertIsNone(pa.ipc.open_stream(b''.join(iter_arrow_stream(self.dfs[1]))).schema.metadata)
+
+    def test_arrow_stream(self):
+        result = {'a': self.dfs[0], 'b': self.dfs[1]}
+        reader = pa.ipc.open_stream(b''.join(iter_arrow_stream(result)))
+        for var, df in result.items():
+            batch = reader.read_next_batch_with_custom_metadata()
+            self.assertEqual(batch.custom_metadata[b'variable'], var.encode())
+            data = batch.batch.to_pandas()
+            self.assertEqual(set(data['Variable']), {var} if len(df) else set())
+            for col in df.columns:
+                np.testing.assert_array_equal(data[col].to_numpy(),
+                                              df[col].to_numpy())
+        with self.assertRaises(StopIteration):
+            reader.read_next_batch()
+
+
+if __name__ == "__main__":
+    unittest.main()